@@ -1,69 +1,356 @@
 import os, sqlite3
 from datetime import date
-from flask import Flask, g, render_template, request, redirect, url_for, flash
-
-import re
+from flask import Flask, Blueprint, current_app, g, render_template, request, redirect, url_for, flash
 
 from flask import send_file  # <-- añade esto
+from flask import jsonify, Response, stream_with_context
 import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import mm
-from reportlab.lib import colors
+import json
+import time
+import click
+from contextlib import contextmanager
 
 
 # --------- Validaciones comunes ----------
-def _not_empty(*vals):
-    return all(v is not None and str(v).strip() != "" for v in vals)
-
-def valid_dni(dni: str) -> bool:
-    return bool(re.fullmatch(r"\d{8}", dni or ""))
-
-def valid_telf(telf: str) -> bool:
-    return bool(re.fullmatch(r"\d{6,15}", telf or ""))  # ajusta rango si quieres
-
-def valid_email(email: str) -> bool:
-    return bool(re.fullmatch(r"[^@\s]+@[^@\s]+\.[^@\s]+", email or ""))
-
-def valid_ruc(ruc: str) -> bool:
-    return bool(re.fullmatch(r"\d{11}", ruc or ""))
-
-def valid_precio(precio: str) -> bool:
-    try:
-        return float(precio) >= 0
-    except:
-        return False
-
-def valid_unidad(unid: str) -> bool:
-    return len((unid or "").strip()) <= 10 and _not_empty(unid)
+from validaciones import _not_empty, valid_dni, valid_telf, valid_email, valid_precio, valid_unidad
 
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "facturacion.db")
 SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "schema.sql")
 IGV_TASA = 0.18  # 18% Perú
 
-app = Flask(__name__)
-app.secret_key = "cambia-esta-clave"
+# Rutas y comandos se declaran en el blueprint; create_app() arma cada aplicación.
+# cli_group=None: los comandos quedan como `flask archivar`, no `flask facturacion archivar`.
+bp = Blueprint("facturacion", __name__, cli_group=None)
+
+def create_app(config=None):
+    """Crea la aplicación. `config` (dict) pisa a los valores por defecto y al entorno.
+
+    Crearla es barato: la BD, las cachés y la cola se abren al primer uso, y
+    ReportLab/openpyxl se importan recién al dibujar un PDF o escribir un XLSX.
+    Con CALENTAR se adelanta ese trabajo (ver calentar()).
+        flask --app app run          # Flask encuentra create_app
+        gunicorn "app:create_app()"
+    """
+    app = Flask(__name__)
+    app.secret_key = "cambia-esta-clave"
+    app.config.setdefault("DB_PATH", DB_PATH)
+    app.config.setdefault("DB_POOL_MAX", 16)  # conexiones por proceso
+    app.config.setdefault("PDF_CACHE_DIR", os.path.join(os.path.dirname(__file__), "cache_pdf"))
+    app.config.setdefault("PDF_CACHE_MEMORIA", 32 * 1024 * 1024)   # bytes
+    app.config.setdefault("PDF_CACHE_DISCO", 512 * 1024 * 1024)    # bytes, por worker
+    app.config.setdefault("PDF_WORKERS", os.cpu_count() or 1)        # exportación por lotes
+    app.config.setdefault("METRICAS", True)            # medir rutas y SQL (/metrics)
+    app.config.setdefault("SLOW_REQUEST_MS", None)     # p. ej. 500: registra peticiones lentas con sus consultas
+    app.config.setdefault("N_MAS_1_UMBRAL", 10)        # misma sentencia N veces en una petición
+    app.config.setdefault("NFAC_BLOQUE", 1)            # >1: números reservados por bloques (puede dejar huecos)
+    app.config.setdefault("PAGINAS_CACHE", 16 * 1024 * 1024)  # bytes de HTML renderizado en memoria; 0 = sin caché
+    app.config.setdefault("TRABAJOS_DIR", os.path.join(os.path.dirname(__file__), "trabajos"))
+    app.config.setdefault("TRABAJOS_HILOS", 2)
+    app.config.setdefault("TRABAJOS_EN_PROCESO", True)  # False: los ejecuta solo `flask trabajos` (otro proceso)
+    app.config.setdefault("TRABAJOS_RETENCION_H", 24)   # horas que se guardan los resultados
+    app.config.setdefault("ARCHIVO_DIR", None)          # BD de años archivados; por defecto <dir de DB_PATH>/archivo
+    app.config.setdefault("ARCHIVO_ANIOS_ABIERTOS", 2)  # `flask archivar` deja en la BD activa el año actual y el anterior
+    app.config.setdefault("JINJA_CACHE_DIR", os.path.join(os.path.dirname(__file__), "cache_jinja"))  # None = sin caché
+    app.config.setdefault("CALENTAR", [])               # p. ej. ["plantillas", "bd", "pdf"] en los workers web
+    # Cualquiera de estas claves se puede fijar por entorno: FLASK_DB_PATH=..., FLASK_SLOW_REQUEST_MS=500,
+    # FLASK_CALENTAR='["plantillas", "bd"]'...
+    app.config.from_prefixed_env()
+    app.config.update(config or {})
+
+    if app.config["JINJA_CACHE_DIR"]:
+        # Plantillas ya compiladas en disco: un proceso nuevo no vuelve a compilarlas
+        from jinja2 import FileSystemBytecodeCache
+        os.makedirs(app.config["JINJA_CACHE_DIR"], exist_ok=True)
+        app.jinja_options = {**app.jinja_options,
+                             "bytecode_cache": FileSystemBytecodeCache(app.config["JINJA_CACHE_DIR"])}
+
+    app.extensions["facturacion"] = {"version_codigo": _version_codigo(app)}  # pool, cachés, cola: ver _estado()
+    app.register_blueprint(bp)
+    app.teardown_appcontext(close_db)
+    if app.config["CALENTAR"]:
+        calentar(app, app.config["CALENTAR"])
+    return app
+
+def _estado(clave, crear):
+    """Objeto propio de la aplicación actual (pool, cachés, cola...), creado al primer uso."""
+    estado = current_app.extensions["facturacion"]
+    obj = estado.get(clave)
+    if obj is None:
+        obj = estado[clave] = crear()
+    return obj
+
+# ---------- Calentamiento ----------
+CALENTADORES = {}  # nombre -> función(app); cada sección registra el suyo con @calentador
+
+def calentador(nombre):
+    def registrar(funcion):
+        CALENTADORES[nombre] = funcion
+        return funcion
+    return registrar
+
+def calentar(app, nombres=None):
+    """Adelanta lo que, si no, pagaría la primera petición de cada worker; devuelve {nombre: segundos}.
+
+    Se llama desde create_app (CALENTAR), desde `flask calentar` o desde un
+    hook del servidor, p. ej. post_worker_init de gunicorn.
+    """
+    nombres = list(CALENTADORES) if nombres is None else nombres
+    desconocidos = set(nombres) - set(CALENTADORES)
+    if desconocidos:
+        raise ValueError(f"Calentadores desconocidos: {sorted(desconocidos)} (hay: {sorted(CALENTADORES)})")
+    tiempos = {}
+    with app.app_context():
+        for nombre in nombres:
+            t0 = time.perf_counter()
+            CALENTADORES[nombre](app)
+            tiempos[nombre] = time.perf_counter() - t0
+    return tiempos
+
+@calentador("plantillas")
+def _calentar_plantillas(app):
+    # Compila (o lee de JINJA_CACHE_DIR) todas las plantillas y las deja en la caché del entorno
+    for nombre in app.jinja_env.list_templates(extensions=["html"]):
+        app.jinja_env.get_template(nombre)
+
+@bp.cli.command("calentar")
+@click.argument("nombres", nargs=-1)
+def calentar_cmd(nombres):
+    """Corre los calentadores (todos, o los NOMBRES dados) y muestra cuánto tarda cada uno.
+
+    De paso deja compiladas las plantillas en JINJA_CACHE_DIR para los workers.
+    """
+    try:
+        tiempos = calentar(current_app._get_current_object(), list(nombres) or None)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for nombre, seg in tiempos.items():
+        click.echo(f"{nombre:<12} {seg * 1000:8.1f} ms")
+
+@bp.cli.command("tiempos-arranque")
+@click.option("--top", default=15, show_default=True, help="Módulos a listar por fase.")
+@click.option("--calentar", "nombres", multiple=True, help="Calentadores a medir además (repetible).")
+def tiempos_arranque_cmd(top, nombres):
+    """Desglose del tiempo de arranque (python -X importtime en un proceso limpio)."""
+    import arranque
+    try:
+        res = arranque.medir(os.path.dirname(os.path.abspath(__file__)), nombres)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    for fase in res["fases"]:
+        click.echo(f"{fase['fase']}: {fase['segundos'] * 1000:.1f} ms "
+                   f"({fase['importacion'] * 1000:.1f} ms importando {fase['modulos']} módulos)")
+        for paquete, seg in fase["paquetes"][:top]:
+            click.echo(f"    {seg * 1000:8.1f} ms  {paquete}")
+    click.echo(f"Total: {res['total'] * 1000:.1f} ms")
 
 # ---------- DB helpers ----------
+from pool_db import PoolConexiones
+import reportes
+import busqueda
+import metricas
+import particiones
+
+def _iniciar_bd(db, nueva_bd, part):
+    # schema.sql es idempotente (IF NOT EXISTS): se aplica una vez por proceso,
+    # también en BD existentes para que reciban los índices nuevos
+    busqueda.migrar(db)
+    particiones.migrar(db)
+    with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
+        db.executescript(f.read())
+    if nueva_bd:
+        seed(db)
+    db.commit()
+    reportes.asegurar_resumenes(db, part.recorrer(db))
+    busqueda.asegurar_indices(db, part.recorrer(db))
+
+def get_pool():
+    # Las particiones se fijan aquí: la primera conexión puede abrirse en un hilo sin contexto de Flask
+    part = get_particiones()
+    return _estado("pool", lambda: PoolConexiones(
+        current_app.config["DB_PATH"], max_conexiones=current_app.config["DB_POOL_MAX"],
+        al_crear=lambda db, nueva_bd: _iniciar_bd(db, nueva_bd, part)))
+
+@calentador("bd")
+def _calentar_bd(app):
+    # Abre la primera conexión: schema, migraciones y resúmenes se verifican aquí y no en una petición
+    with _conexion_pool():
+        pass
+
 def get_db():
     db = getattr(g, "_db", None)
     if db is None:
-        need_init = not os.path.exists(DB_PATH)
-        db = g._db = sqlite3.connect(DB_PATH)
-        db.row_factory = sqlite3.Row
-        db.execute("PRAGMA foreign_keys = ON")
-        if need_init:
-            with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
-                db.executescript(f.read())
-            seed(db)
-            db.commit()
+        db = get_pool().obtener()
+        if current_app.config["METRICAS"]:
+            g._sql = []
+            db = metricas.ConexionMedida(db, g._sql, con_params=bool(current_app.config["SLOW_REQUEST_MS"]))
+        g._db = db
     return db
 
-@app.teardown_appcontext
+def get_particiones():
+    directorio = (current_app.config["ARCHIVO_DIR"]
+                  or os.path.join(os.path.dirname(os.path.abspath(current_app.config["DB_PATH"])), "archivo"))
+    return _estado("particiones", lambda: particiones.Particiones(directorio))
+
+def _esquemas(db, filtros=None, descendente=False):
+    """Particiones ("main", "hist_<año>") que cubren el rango desde/hasta de `filtros`, en orden de fecha."""
+    filtros = filtros or {}
+    return get_particiones().recorrer(db, filtros.get("desde") or None, filtros.get("hasta") or None, descendente)
+
+@contextmanager
+def _conexion_pool(pool=None):
+    """Conexión del pool fuera de una petición (hilos de trabajos, reservas).
+
+    Desde un hilo sin contexto de Flask hay que pasar el `pool` (get_pool() tomado antes).
+    """
+    pool = pool or get_pool()
+    db = pool.obtener()
+    try:
+        yield db
+    finally:
+        pool.devolver(db)
+
 def close_db(exception):
-    db = getattr(g, "_db", None)
-    if db: db.close()
+    db = g.pop("_db", None)
+    if db is not None:
+        get_pool().devolver(getattr(db, "conexion", db))
+
+# ---------- Métricas ----------
+_registro = metricas.Registro()
+M_LATENCIA = _registro.agregar(metricas.Histograma(
+    "facturacion_http_request_duration_seconds", "Latencia por ruta.", ("method", "route", "status")))
+M_SQL_SENTENCIAS = _registro.agregar(metricas.Histograma(
+    "facturacion_sql_statements_per_request", "Sentencias SQL por petición.", ("route",),
+    buckets=metricas.BUCKETS_CONTEO))
+M_SQL_SEGUNDOS = _registro.agregar(metricas.Histograma(
+    "facturacion_sql_seconds_per_request", "Tiempo en SQLite por petición.", ("route",)))
+M_N_MAS_1 = _registro.agregar(metricas.Contador(
+    "facturacion_sql_n_plus_one_total", "Peticiones con una misma sentencia repetida (N+1).", ("route",)))
+M_PDF = _registro.agregar(metricas.Histograma(
+    "facturacion_pdf_render_seconds", "Tiempo de dibujo de un PDF de factura."))
+_registro.agregar(metricas.Indicador(
+    "facturacion_db_pool", "Estado del pool de conexiones.",
+    lambda: {(k,): v for k, v in get_pool().resumen().items()}, ("campo",)))
+_registro.agregar(metricas.Indicador(
+    "facturacion_pdf_cache", "Estado de la caché de PDF.",
+    lambda: {(k,): v for k, v in get_cache_pdf().resumen().items()}, ("campo",)))
+_registro.agregar(metricas.Indicador(
+    "facturacion_paginas_cache", "Caché de páginas renderizadas (ETag).",
+    lambda: {(k,): v for k, v in (get_paginas().resumen() if get_paginas() else {}).items()}, ("campo",)))
+_registro.agregar(metricas.Indicador(
+    "facturacion_trabajos_en_curso", "Trabajos en segundo plano corriendo en este proceso.",
+    lambda: {(k,): v for k, v in _trabajos_en_curso().items()}, ("tipo",)))
+
+@bp.before_app_request
+def _inicio_peticion():
+    g._t0 = time.perf_counter()
+
+@bp.after_app_request
+def _fin_peticion(resp):
+    t0 = g.pop("_t0", None)
+    if t0 is None or not current_app.config["METRICAS"]:
+        return resp
+    dur = time.perf_counter() - t0
+    ruta = request.url_rule.rule if request.url_rule else "(sin ruta)"
+    M_LATENCIA.observar(dur, request.method, ruta, str(resp.status_code))
+    sql = g.get("_sql") or []
+    M_SQL_SENTENCIAS.observar(len(sql), ruta)
+    M_SQL_SEGUNDOS.observar(sum(s[1] for s in sql), ruta)
+    repetidas = metricas.repetidas(sql, current_app.config["N_MAS_1_UMBRAL"])
+    if repetidas:
+        M_N_MAS_1.inc(ruta)
+        for q, n in repetidas.items():
+            current_app.logger.warning("Posible N+1 en %s: %d veces %s", ruta, n, q[:200])
+    lento = current_app.config["SLOW_REQUEST_MS"]
+    if lento and dur * 1000 >= float(lento):
+        _log_peticion_lenta(ruta, dur, sql)
+    return resp
+
+def _log_peticion_lenta(ruta, dur, sql, top=5):
+    """Registra las consultas más caras de la petición con su EXPLAIN QUERY PLAN."""
+    lineas = [f"Petición lenta {request.method} {request.full_path} ({ruta}): {dur * 1000:.1f} ms, "
+              f"{len(sql)} sentencias, {sum(s[1] for s in sql) * 1000:.1f} ms en SQLite"]
+    db = g.get("_db")
+    for q, seg, params in sorted(sql, key=lambda s: -s[1])[:top]:
+        lineas.append(f"  {seg * 1000:.1f} ms  {metricas.normalizar_sql(q)[:300]}")
+        es_consulta = q.lstrip().upper().startswith(("SELECT", "WITH"))
+        if db is not None and es_consulta and (params is not None or "?" not in q):
+            try:
+                plan = db.conexion.execute("EXPLAIN QUERY PLAN " + q, params or ()).fetchall()
+                lineas.extend(f"      plan: {r[3]}" for r in plan)
+            except Exception as e:  # el log nunca debe romper la respuesta
+                lineas.append(f"      plan no disponible: {e}")
+    current_app.logger.warning("\n".join(lineas))
+
+@bp.get("/metrics")
+def metrics():
+    return Response(_registro.texto(), mimetype="text/plain; version=0.0.4")
+
+@bp.get("/db/stats")
+def db_stats():
+    return jsonify(get_pool().resumen())
+
+# ---------- Respuestas condicionales (ETag / 304) ----------
+import functools
+import glob
+import versiones
+from flask import session
+from markupsafe import Markup, escape
+from werkzeug.http import is_resource_modified
+
+def _version_codigo(app):
+    # Cambia con cada despliegue (cualquier módulo, schema o plantilla nuevos): invalida los ETag anteriores
+    raiz = os.path.dirname(os.path.abspath(__file__))
+    return versiones.etag(*sorted(
+        (os.path.relpath(r, raiz), os.path.getmtime(r), os.path.getsize(r))
+        for r in [*glob.glob(os.path.join(raiz, "*.py")), SCHEMA_PATH,
+                  *glob.glob(os.path.join(app.root_path, "templates", "*.html"))]))
+
+def get_paginas():
+    """Caché de HTML renderizado de la app, o None con PAGINAS_CACHE = 0."""
+    if not current_app.config["PAGINAS_CACHE"]:
+        return None
+    return _estado("paginas", lambda: versiones.CachePaginas(current_app.config["PAGINAS_CACHE"]))
+
+def condicional(*tablas):
+    """La vista depende solo de `tablas` y de la URL: responde 304 o sirve el HTML guardado.
+
+    Si hay mensajes flash pendientes la página cambia aunque los datos no, así
+    que esa respuesta se genera normal y no se guarda.
+    """
+    def decorador(vista):
+        @functools.wraps(vista)
+        def envuelta(*args, **kwargs):
+            if "_flashes" in session:
+                return vista(*args, **kwargs)
+            vers, modificado = versiones.leer(get_db(), tablas)
+            etag = versiones.etag(current_app.extensions["facturacion"]["version_codigo"], request.full_path, sorted(vers.items()))
+            # Con If-None-Match manda el ETag; Last-Modified (resolución de 1 s) es el respaldo
+            if not is_resource_modified(request.environ, etag=etag, last_modified=modificado):
+                resp = Response(status=304)
+            else:
+                paginas = get_paginas()
+                html = paginas.obtener(etag) if paginas else None
+                if html is not None:
+                    resp = Response(html, mimetype="text/html")
+                else:
+                    resp = current_app.make_response(vista(*args, **kwargs))
+                    if resp.status_code != 200 or "_flashes" in session:
+                        return resp
+                    if paginas:
+                        paginas.guardar(etag, resp.get_data())
+            resp.set_etag(etag)
+            resp.last_modified = modificado
+            resp.cache_control.private = True
+            resp.cache_control.no_cache = True  # el navegador guarda la página pero revalida siempre
+            return resp
+        return envuelta
+    return decorador
+
+@bp.get("/paginas/cache")
+def paginas_cache():
+    paginas = get_paginas()
+    return jsonify(paginas.resumen() if paginas else {"activa": False})
 
 def seed(db):
     # Datos de ejemplo 
@@ -86,22 +373,23 @@ def seed(db):
     ])
 
 # ---------- Rutas ----------
-@app.route("/")
+@bp.route("/")
 def index():
     db = get_db()
-    tot_clientes = db.execute("SELECT COUNT(*) c FROM CLIENTE").fetchone()["c"]
-    tot_productos = db.execute("SELECT COUNT(*) c FROM PRODUCTO").fetchone()["c"]
-    tot_facturas  = db.execute("SELECT COUNT(*) c FROM FACTURA").fetchone()["c"]
+    # Contadores mantenidos por triggers (RES_TOTALES), sin COUNT(*) por visita
+    tot = reportes.totales(db)
+    tot_clientes, tot_productos, tot_facturas = tot["CLIENTE"], tot["PRODUCTO"], tot["FACTURA"]
     return render_template("index.html", tot_clientes=tot_clientes, tot_productos=tot_productos, tot_facturas=tot_facturas)
 
 # --- Clientes ---
-@app.route("/clientes")
+@bp.route("/clientes")
+@condicional("CLIENTE")
 def clientes():
     db = get_db()
     rows = db.execute("SELECT * FROM CLIENTE ORDER BY CODI").fetchall()
     return render_template("clientes.html", rows=rows)
 
-@app.route("/clientes/nuevo", methods=["POST"])
+@bp.route("/clientes/nuevo", methods=["POST"])
 def clientes_nuevo():
     db = get_db()
     f = request.form
@@ -118,21 +406,21 @@ def clientes_nuevo():
 
     # Reglas mínimas
     if not _not_empty(CODI, DNI, NOMB, APEL):
-        flash("CODI, DNI, NOMB y APEL son obligatorios.", "warning"); return redirect(url_for("clientes"))
+        flash("CODI, DNI, NOMB y APEL son obligatorios.", "warning"); return redirect(url_for(".clientes"))
     if not valid_dni(DNI):
-        flash("DNI inválido (8 dígitos).", "warning"); return redirect(url_for("clientes"))
+        flash("DNI inválido (8 dígitos).", "warning"); return redirect(url_for(".clientes"))
     if TELF and not valid_telf(TELF):
-        flash("Teléfono inválido (6–15 dígitos).", "warning"); return redirect(url_for("clientes"))
+        flash("Teléfono inválido (6–15 dígitos).", "warning"); return redirect(url_for(".clientes"))
     if EMAIL and not valid_email(EMAIL):
-        flash("Email inválido.", "warning"); return redirect(url_for("clientes"))
+        flash("Email inválido.", "warning"); return redirect(url_for(".clientes"))
 
     # Unicidad
     if db.execute("SELECT 1 FROM CLIENTE WHERE DNI = ?", (DNI,)).fetchone():
-        flash("DNI ya registrado.", "warning"); return redirect(url_for("clientes"))
+        flash("DNI ya registrado.", "warning"); return redirect(url_for(".clientes"))
     if EMAIL and db.execute("SELECT 1 FROM CLIENTE WHERE EMAIL = ?", (EMAIL,)).fetchone():
-        flash("Email ya registrado.", "warning"); return redirect(url_for("clientes"))
+        flash("Email ya registrado.", "warning"); return redirect(url_for(".clientes"))
     if TELF and db.execute("SELECT 1 FROM CLIENTE WHERE TELF = ?", (TELF,)).fetchone():
-        flash("Teléfono ya registrado.", "warning"); return redirect(url_for("clientes"))
+        flash("Teléfono ya registrado.", "warning"); return redirect(url_for(".clientes"))
 
     try:
         db.execute("""INSERT INTO CLIENTE (CODI,DNI,NOMB,APEL,TELF,EMAIL,CALLE,DIST,CIUD)
@@ -143,17 +431,18 @@ def clientes_nuevo():
     except sqlite3.IntegrityError as e:
         # Plan B: si por carrera concurrente pega UNIQUE, avisa igual
         flash(f"Violación de unicidad: {e}", "danger")
-    return redirect(url_for("clientes"))
+    return redirect(url_for(".clientes"))
 
 
 # --- Vendedores ---
-@app.route("/vendedores")
+@bp.route("/vendedores")
+@condicional("VENDEDOR")
 def vendedores():
     db = get_db()
     rows = db.execute("SELECT * FROM VENDEDOR ORDER BY CODV").fetchall()
     return render_template("vendedores.html", rows=rows)
 
-@app.route("/vendedores/nuevo", methods=["POST"])
+@bp.route("/vendedores/nuevo", methods=["POST"])
 def vendedores_nuevo():
     db = get_db()
     f = request.form
@@ -164,16 +453,17 @@ def vendedores_nuevo():
         flash("Vendedor creado", "success")
     except sqlite3.IntegrityError as e:
         flash(f"Error: {e}", "danger")
-    return redirect(url_for("vendedores"))
+    return redirect(url_for(".vendedores"))
 
 # --- Productos ---
-@app.route("/productos")
+@bp.route("/productos")
+@condicional("PRODUCTO")
 def productos():
     db = get_db()
     rows = db.execute("SELECT * FROM PRODUCTO ORDER BY CODT").fetchall()
     return render_template("productos.html", rows=rows)
 
-@app.route("/productos/nuevo", methods=["POST"])
+@bp.route("/productos/nuevo", methods=["POST"])
 def productos_nuevo():
     db = get_db()
     f = request.form
@@ -184,17 +474,17 @@ def productos_nuevo():
     PREC = (f.get("PREC") or "").strip()
 
     if not _not_empty(CODT, NOMB, UNID, PREC):
-        flash("CODT, NOMB, UNID y PREC son obligatorios.", "warning"); return redirect(url_for("productos"))
+        flash("CODT, NOMB, UNID y PREC son obligatorios.", "warning"); return redirect(url_for(".productos"))
     if not valid_unidad(UNID):
-        flash("UNID inválida (1–10 caracteres).", "warning"); return redirect(url_for("productos"))
+        flash("UNID inválida (1–10 caracteres).", "warning"); return redirect(url_for(".productos"))
     if not valid_precio(PREC):
-        flash("PREC inválido (número ≥ 0).", "warning"); return redirect(url_for("productos"))
+        flash("PREC inválido (número ≥ 0).", "warning"); return redirect(url_for(".productos"))
 
     if db.execute("SELECT 1 FROM PRODUCTO WHERE NOMB = ? AND UNID = ?", (NOMB, UNID)).fetchone():
-        flash("Producto duplicado (Nombre + Unidad).", "warning"); return redirect(url_for("productos"))
+        flash("Producto duplicado (Nombre + Unidad).", "warning"); return redirect(url_for(".productos"))
     if db.execute("SELECT 1 FROM PRODUCTO WHERE lower(NOMB)=lower(?)", (NOMB,)).fetchone():
             flash("Ya existe un producto con ese nombre.", "warning")
-            return redirect(url_for("productos"))
+            return redirect(url_for(".productos"))
 
     try:
         db.execute("INSERT INTO PRODUCTO (CODT,NOMB,UNID,PREC) VALUES (?,?,?,?)",
@@ -203,54 +493,222 @@ def productos_nuevo():
         flash("Producto creado", "success")
     except sqlite3.IntegrityError as e:
         flash(f"Violación de unicidad: {e}", "danger")
-    return redirect(url_for("productos"))
+    return redirect(url_for(".productos"))
 
 
 # --- Facturas (listado) ---
-@app.route("/facturas")
+FACTURAS_POR_PAGINA = 50
+FACTURAS_MAX_PAGINA = 500
+
+def _filtros_facturas(args):
+    """Traduce los filtros del listado (querystring) a un WHERE con parámetros.
+
+    Devuelve (where_sql, params, filtros) donde `filtros` son los valores
+    normalizados, para volver a armar los enlaces de paginación.
+    """
+    filtros = {k: (args.get(k) or "").strip()
+               for k in ("desde", "hasta", "CODI", "CODV", "tmin", "tmax")}
+    conds, params = [], []
+    if filtros["desde"]:
+        conds.append("F.FECEM >= ?"); params.append(filtros["desde"])
+    if filtros["hasta"]:
+        conds.append("F.FECEM <= ?"); params.append(filtros["hasta"])
+    if filtros["CODI"]:
+        conds.append("F.CODI = ?"); params.append(filtros["CODI"])
+    if filtros["CODV"]:
+        conds.append("F.CODV = ?"); params.append(filtros["CODV"])
+    for k, op in (("tmin", ">="), ("tmax", "<=")):
+        if filtros[k]:
+            if valid_precio(filtros[k]):
+                conds.append(f"F.TOTFAC {op} ?"); params.append(float(filtros[k]))
+            else:
+                filtros[k] = ""  # se ignora un monto inválido
+    where = ("WHERE " + " AND ".join(conds)) if conds else ""
+    return where, params, filtros
+
+@bp.route("/facturas")
+@condicional("FACTURA", "CLIENTE", "VENDEDOR", "EMPRESA")
 def facturas():
     db = get_db()
-    q = """
+    where, params, filtros = _filtros_facturas(request.args)
+
+    try:
+        limite = int(request.args.get("limite") or FACTURAS_POR_PAGINA)
+    except ValueError:
+        limite = FACTURAS_POR_PAGINA
+    limite = max(1, min(limite, FACTURAS_MAX_PAGINA))
+
+    # Paginación por clave (keyset): "despues" = FECEM|NFAC de la última fila vista.
+    # Evita OFFSET, así el costo de cada página no depende de su posición.
+    despues = request.args.get("despues") or ""
+    rango = dict(filtros)
+    if "|" in despues:
+        c_fecem, c_nfac = despues.split("|", 1)
+        where += (" AND " if where else "WHERE ") + "(F.FECEM, F.NFAC) < (?, ?)"
+        params += [c_fecem, c_nfac]
+        if c_fecem and (not rango["hasta"] or c_fecem < rango["hasta"]):
+            rango["hasta"] = c_fecem  # las particiones posteriores al cursor ya se vieron
+    else:
+        despues = ""
+
+    q = f"""
     SELECT F.NFAC, F.FECEM, F.FECVEN, F."DESC", F.IGV, F.TOTFAC,
            C.NOMB||' '||C.APEL as cliente,
            V.NOMB||' '||V.APEL as vendedor,
            E.RAZS as empresa
-    FROM FACTURA F
+    FROM {{s}}.FACTURA F
     JOIN CLIENTE  C ON C.CODI=F.CODI
     JOIN VENDEDOR V ON V.CODV=F.CODV
     JOIN EMPRESA  E ON E.EMPR=F.EMPR
+    {where}
     ORDER BY F.FECEM DESC, F.NFAC DESC
+    LIMIT ?
     """
-    rows = db.execute(q).fetchall()
-    return render_template("facturas.html", rows=rows)
+    # Se pide una fila de más para saber si existe página siguiente. De la BD activa
+    # hacia los años archivados (más antiguos): solo se adjuntan si la página no se llenó.
+    rows = []
+    for esquema in _esquemas(db, rango, descendente=True):
+        rows += db.execute(q.format(s=esquema), params + [limite + 1 - len(rows)]).fetchall()
+        if len(rows) > limite:
+            break
+    siguiente = None
+    if len(rows) > limite:
+        rows = rows[:limite]
+        siguiente = f"{rows[-1]['FECEM'] or ''}|{rows[-1]['NFAC']}"
+
+    filtros = {k: v for k, v in filtros.items() if v}
+    if limite != FACTURAS_POR_PAGINA:
+        filtros["limite"] = limite
+    return render_template("facturas.html", rows=rows, filtros=filtros,
+                           despues=despues, siguiente=siguiente)
 
 # --- Nueva factura ---
-@app.route("/facturas/nueva")
+@bp.route("/facturas/nueva")
 def factura_nueva():
-    db = get_db()
-    clientes  = db.execute("SELECT CODI, NOMB||' '||APEL AS nom FROM CLIENTE ORDER BY nom").fetchall()
-    vendedores= db.execute("SELECT CODV, NOMB||' '||APEL AS nom FROM VENDEDOR ORDER BY nom").fetchall()
-    productos = db.execute("SELECT CODT, NOMB, UNID, PREC FROM PRODUCTO ORDER BY NOMB").fetchall()
-    return render_template("factura_nueva.html", hoy=date.today().isoformat(),
-                           clientes=clientes, vendedores=vendedores, productos=productos)
+    # Clientes, vendedores y productos se buscan desde el formulario (/buscar/...)
+    series = get_db().execute("SELECT SERIE, ULTIMO, ANCHO FROM SERIE ORDER BY SERIE").fetchall()
+    return render_template("factura_nueva.html", hoy=date.today().isoformat(), series=series)
 
-@app.post("/facturas/crear")
+@bp.get("/buscar/<entidad>")
+def buscar(entidad):
+    """JSON para autocompletar: ?q=texto&pagina=1&limite=20 (productos|clientes|vendedores|facturas).
+
+    Para facturas, ?orden=relevancia (bm25) o recientes.
+    """
+    pagina = max(1, request.args.get("pagina", 1, type=int))
+    limite = max(1, min(request.args.get("limite", 20, type=int), 100))
+    q = request.args.get("q", "")
+    if entidad == "facturas":
+        orden = request.args.get("orden", "relevancia")
+        if orden not in busqueda.ORDENES_FACTURA:
+            return jsonify({"error": f"Orden desconocido: {orden}"}), 400
+        filas, hay_mas = busqueda.buscar_facturas(get_db(), q, pagina, limite, orden, get_particiones())
+        for f in filas:
+            f["coincidencia"] = f["coincidencia"].replace("\x02", "[").replace("\x03", "]")
+    elif entidad in busqueda.ENTIDADES:
+        filas, hay_mas = busqueda.buscar(get_db(), entidad, q, pagina, limite)
+    else:
+        return jsonify({"error": f"Entidad desconocida: {entidad}"}), 404
+    return jsonify({"resultados": filas, "pagina": pagina, "hay_mas": hay_mas})
+
+@bp.get("/facturas/buscar")
+def facturas_buscar():
+    q = request.args.get("q", "").strip()
+    orden = request.args.get("orden", "relevancia")
+    if orden not in busqueda.ORDENES_FACTURA:
+        orden = "relevancia"
+    pagina = max(1, request.args.get("pagina", 1, type=int))
+    rows, hay_mas = (busqueda.buscar_facturas(get_db(), q, pagina, FACTURAS_POR_PAGINA, orden, get_particiones())
+                     if q else ([], False))
+    for r in rows:  # fragmento escapado, con las palabras halladas resaltadas
+        r["coincidencia"] = escape(r["coincidencia"]).replace("\x02", Markup("<mark>")).replace("\x03", Markup("</mark>"))
+    return render_template("facturas_buscar.html", q=q, orden=orden, rows=rows, pagina=pagina, hay_mas=hay_mas)
+
+@bp.cli.command("reindexar-busqueda")
+def reindexar_busqueda_cmd():
+    """Rehace los índices FTS (clientes, productos, vendedores y facturas). También tras un VACUUM."""
+    db = get_db()
+    t0 = time.perf_counter()
+    busqueda.reconstruir(db, _esquemas(db))
+    n = db.execute("SELECT COUNT(*) FROM FACTURA_FTS_docsize").fetchone()[0]
+    click.echo(f"Índices de búsqueda reconstruidos ({n} facturas) en {time.perf_counter() - t0:.2f}s")
+
+# --- Alta de factura ---
+from numeracion import Numerador
+from lote_facturas import calcular_totales
+
+def get_numerador():
+    pool = get_pool()
+    return _estado("numerador", lambda: Numerador(functools.partial(_conexion_pool, pool),
+                                                  tam_bloque=current_app.config["NFAC_BLOQUE"]))
+
+def _crear_factura(db, serie, fecem, fecven, codi, codv, des_pct, items):
+    """Emite la factura con el siguiente número de `serie`; devuelve (nfac, total).
+
+    `items` son pares (CODT, cantidad). Precios, número y cabecera+detalle se
+    leen y escriben en una sola transacción BEGIN IMMEDIATE (ver numeracion.py).
+    Lanza ValueError si alguna línea no tiene producto (o no existe), si no
+    queda ninguna línea válida o si el descuento no cuadra.
+    """
+    cants = {}
+    for codt, cant in items:
+        codt = (codt or "").strip()
+        if not codt:
+            raise ValueError("Hay una línea sin producto elegido.")
+        if cant > 0:
+            cants[codt] = cants.get(codt, 0) + cant
+
+    def insertar(db, nfac):
+        # Precios en una sola consulta (antes, una por línea)
+        precios = dict(db.execute("SELECT CODT, PREC FROM PRODUCTO WHERE CODT IN (SELECT value FROM json_each(?))",
+                                  (json.dumps(list(cants)),)).fetchall())
+        faltan = [codt for codt in cants if codt not in precios]
+        if faltan:
+            raise ValueError(f"Producto no encontrado: {', '.join(faltan)}.")
+        lineas = [(nfac, codt, cant, round(float(precios[codt]) * cant, 2))
+                  for codt, cant in cants.items()]
+        if not lineas:
+            raise ValueError("Debe agregar al menos un producto.")
+        subtot = sum(l[3] for l in lineas)
+        # Descuento (%) sobre el SUBTOTAL; IGV sobre la base ya descontada
+        desc_v, igv, tot = calcular_totales(subtot, des_pct, IGV_TASA)
+        if tot < 0:
+            raise ValueError("El descuento supera el subtotal.")
+        # DESC se almacena como monto en S/
+        db.execute("""INSERT INTO FACTURA
+                    (NFAC,FECEM,FECVEN,"DESC",IGV,TOTFAC,CODI,EMPR,CODV)
+                    VALUES (?,?,?,?,?,?,?,?,?)""",
+                (nfac, fecem, fecven, desc_v, igv, tot, codi, "E0001", codv))
+        db.executemany("""INSERT INTO DETALLE_FACTURA (NFAC,CODT,CANT,PRECLI)
+                        VALUES (?,?,?,?)""", lineas)
+        resultado["tot"] = tot
+
+    resultado = {}
+    nfac = get_numerador().emitir(db, serie, insertar)
+    return nfac, resultado["tot"]
+
+@bp.post("/facturas/crear")
 def facturas_crear():
     db = get_db()
     f = request.form
 
-    # Datos cabecera
-    nfac   = f["NFAC"]
+    # Datos cabecera (el número lo asigna el servidor según la serie)
+    serie  = f.get("SERIE") or "F"
     fecem  = f["FECEM"]
     fecven = f["FECVEN"]
     codi   = f["CODI"]
-    empr   = "E0001"
     codv   = f["CODV"]
+    if not _not_empty(codi, codv):
+        flash("Cliente y vendedor son obligatorios.", "warning")
+        return redirect(url_for(".factura_nueva"))
     # Leer % de descuento
-    des_pct = float(f.get("DESCPCT", "0") or 0)
+    try:
+        des_pct = float(f.get("DESCPCT", "0") or 0)
+    except ValueError:
+        des_pct = -1
     if des_pct < 0 or des_pct > 100:
         flash("Descuento (%) inválido. Debe estar entre 0 y 100.", "warning")
-        return redirect(url_for("factura_nueva"))
+        return redirect(url_for(".factura_nueva"))
 
     # Items dinámicos: vienen como listas paralelas
     codts  = request.form.getlist("CODT[]")
@@ -258,200 +716,719 @@ def facturas_crear():
 
     if not codts or not cants:
         flash("Debe agregar al menos un producto.", "warning")
-        return redirect(url_for("factura_nueva"))
-
-    # Subtotal de líneas
-    subtot = 0.0
-    lineas = []
-    for codt, cant_str in zip(codts, cants):
-        cant = int(cant_str or 0)
-        if cant <= 0:
-            continue
-        fila = db.execute("SELECT PREC FROM PRODUCTO WHERE CODT=?", (codt,)).fetchone()
-        if not fila:
-            continue
-        precio = float(fila["PREC"])
-        precli = round(precio * cant, 2)
-        subtot += precli
-        lineas.append((nfac, codt, cant, precli))
-
-    # Descuento (%) sobre el SUBTOTAL
-    des_pct = float(f.get("DESCPCT", "0") or 0)
-    if des_pct < 0 or des_pct > 100:
-        flash("Descuento (%) inválido. Debe estar entre 0 y 100.", "warning")
-        return redirect(url_for("factura_nueva"))
-
-    desc_v = round(max(0.0, subtot) * (des_pct / 100.0), 2)
-
-    # Base imponible luego del descuento
-    base = max(0.0, round(subtot - desc_v, 2))
-
-    # IGV sobre la BASE (ya descontada)
-    igv = round(base * IGV_TASA, 2)
-
-    # Total = base + IGV
-    tot = round(base + igv, 2)
-
-    if tot < 0:
-        flash("El descuento supera el subtotal.", "warning")
-        return redirect(url_for("factura_nueva"))
+        return redirect(url_for(".factura_nueva"))
+    try:
+        items = [(codt, int(cant or 0)) for codt, cant in zip(codts, cants)]
+    except ValueError:
+        flash("Cantidad inválida.", "warning")
+        return redirect(url_for(".factura_nueva"))
 
-    # Guardar (DESC se almacena como monto en S/)
-    db.execute("""INSERT INTO FACTURA
-                (NFAC,FECEM,FECVEN,"DESC",IGV,TOTFAC,CODI,EMPR,CODV)
-                VALUES (?,?,?,?,?,?,?,?,?)""",
-            (nfac, fecem, fecven, desc_v, igv, tot, codi, "E0001", codv))
-    db.executemany("""INSERT INTO DETALLE_FACTURA (NFAC,CODT,CANT,PRECLI)
-                    VALUES (?,?,?,?)""", lineas)
-    db.commit()
     try:
-        flash(f"Factura {nfac} creada. Total: {tot:.2f}", "success")
+        nfac, tot = _crear_factura(db, serie, fecem, fecven, codi, codv, des_pct, items)
+    except ValueError as e:
+        flash(str(e), "warning")
+        return redirect(url_for(".factura_nueva"))
     except sqlite3.IntegrityError as e:
         flash(f"Error: {e}", "danger")
-
-    return redirect(url_for("facturas"))
-
-@app.get("/facturas/<nfac>/pdf")
+        return redirect(url_for(".factura_nueva"))
+    except sqlite3.OperationalError as e:
+        current_app.logger.warning("Alta de factura sin completar: %s", e)
+        flash("El sistema está ocupado; la factura no se registró. Intente de nuevo.", "danger")
+        return redirect(url_for(".factura_nueva"))
+
+    flash(f"Factura {nfac} creada. Total: {tot:.2f}", "success")
+    return redirect(url_for(".facturas"))
+
+def _estres_proceso(args):
+    """Un proceso de `estres-facturas`: `hilos` hilos emitiendo `n` facturas cada uno."""
+    import random
+    from concurrent.futures import ThreadPoolExecutor
+    config, serie, n, hilos, semilla = args
+    app = create_app(config)  # proceso nuevo (spawn): su propia aplicación, con la BD del padre
+    rng = random.Random(semilla)
+    with app.app_context(), _conexion_pool() as db:
+        clientes = [r[0] for r in db.execute("SELECT CODI FROM CLIENTE LIMIT 200")]
+        vendedores = [r[0] for r in db.execute("SELECT CODV FROM VENDEDOR LIMIT 50")]
+        productos = [r[0] for r in db.execute("SELECT CODT FROM PRODUCTO LIMIT 200")]
+    hoy = date.today().isoformat()
+
+    def hilo(k):
+        emitidas, errores = [], []
+        r = random.Random(semilla * 1000 + k)
+        with app.app_context(), _conexion_pool() as db:
+            for _ in range(n):
+                items = [(r.choice(productos), r.randint(1, 5)) for _ in range(r.randint(1, 6))]
+                try:
+                    nfac, _ = _crear_factura(db, serie, hoy, hoy, rng.choice(clientes),
+                                             rng.choice(vendedores), 0, items)
+                    emitidas.append(nfac)
+                except (sqlite3.Error, ValueError) as e:
+                    errores.append(str(e))
+        return emitidas, errores
+
+    emitidas, errores = [], []
+    with ThreadPoolExecutor(hilos) as ex:
+        for e, err in ex.map(hilo, range(hilos)):
+            emitidas += e
+            errores += err
+    return emitidas, errores
+
+@bp.cli.command("estres-facturas")
+@click.option("--procesos", default=4, show_default=True)
+@click.option("--hilos", default=4, show_default=True, help="Hilos por proceso.")
+@click.option("--facturas", default=100, show_default=True, help="Facturas por hilo.")
+@click.option("--serie", default="F", show_default=True)
+def estres_facturas_cmd(procesos, hilos, facturas, serie):
+    """Emite facturas desde varios procesos e hilos a la vez y verifica la numeración.
+
+    Escribe en la BD (FLASK_DB_PATH): conviene usar una copia. Falla si hay
+    errores, números repetidos o perdidos, o huecos (con NFAC_BLOQUE=1).
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    db = get_db()
+    antes = db.execute("SELECT ULTIMO FROM SERIE WHERE SERIE = ?", (serie,)).fetchone()
+    if antes is None:
+        raise click.ClickException(f"Serie desconocida: {serie}")
+    db.commit()
+    config = {k: current_app.config[k] for k in ("DB_PATH", "ARCHIVO_DIR", "NFAC_BLOQUE")}
+    t0 = time.perf_counter()
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(procesos, mp_context=ctx) as ex:
+        partes = list(ex.map(_estres_proceso, [(config, serie, facturas, hilos, i) for i in range(procesos)]))
+    seg = time.perf_counter() - t0
+    emitidas = [n for e, _ in partes for n in e]
+    errores = [x for _, err in partes for x in err]
+    unicas = set(emitidas)
+    en_bd = db.execute("SELECT COUNT(*) FROM FACTURA WHERE NFAC IN (SELECT value FROM json_each(?))",
+                       (json.dumps(list(unicas)),)).fetchone()[0]
+    despues = db.execute("SELECT ULTIMO FROM SERIE WHERE SERIE = ?", (serie,)).fetchone()[0]
+    huecos = (despues - antes[0]) - len(unicas)  # números consumidos sin factura (saltos incluidos)
+
+    click.echo(f"{len(emitidas)} facturas en {seg:.2f}s ({len(emitidas) / seg:.0f} fact/s) "
+               f"con {procesos} procesos x {hilos} hilos")
+    click.echo(f"errores: {len(errores)}  repetidas: {len(emitidas) - len(unicas)}  "
+               f"perdidas: {len(unicas) - en_bd}  huecos: {huecos}  "
+               f"serie {serie}: {antes[0]} -> {despues}")
+    for e in sorted(set(errores))[:10]:
+        click.echo(f"  {e}", err=True)
+    huecos_malos = huecos if current_app.config["NFAC_BLOQUE"] <= 1 else 0
+    if errores or len(emitidas) != len(unicas) or en_bd != len(unicas) or huecos_malos:
+        raise SystemExit(1)
+
+
+# --- Carga masiva de facturas ---
+from lote_facturas import leer_archivo, importar_facturas
+
+def _formato_carga(nombre, mimetype):
+    if (nombre or "").lower().endswith(".csv") or "csv" in (mimetype or ""):
+        return "csv"
+    return "jsonl"
+
+@bp.post("/facturas/importar")
+def facturas_importar():
+    """Acepta un archivo (campo `archivo`) o el cuerpo crudo en JSON lines o CSV."""
+    db = get_db()
+    archivo = request.files.get("archivo")
+    if archivo:
+        formato = request.form.get("formato") or _formato_carga(archivo.filename, archivo.mimetype)
+        stream = archivo.stream
+    else:
+        formato = request.args.get("formato") or _formato_carga("", request.mimetype)
+        stream = request.stream
+    t0 = time.perf_counter()
+    res = importar_facturas(db, leer_archivo(stream, formato), IGV_TASA)
+    res["segundos"] = round(time.perf_counter() - t0, 3)
+    return jsonify(res), (200 if not res["errores"] else 207)
+
+@bp.cli.command("importar-facturas")
+@click.argument("archivo", type=click.Path(exists=True, dir_okay=False))
+@click.option("--formato", type=click.Choice(["jsonl", "csv"]), default=None,
+              help="Por defecto se deduce de la extensión.")
+@click.option("--lote", default=5000, show_default=True, help="Facturas por transacción.")
+def importar_facturas_cmd(archivo, formato, lote):
+    """Carga masiva de facturas desde un archivo JSON lines o CSV."""
+    formato = formato or _formato_carga(archivo, "")
+    db = get_db()
+    t0 = time.perf_counter()
+    with open(archivo, "r", encoding="utf-8-sig", newline="") as fh:
+        res = importar_facturas(db, leer_archivo(fh, formato), IGV_TASA, tam_lote=lote)
+    seg = time.perf_counter() - t0
+    for e in res["errores"]:
+        click.echo(f"línea {e['linea']} ({e['NFAC']}): {e['error']}", err=True)
+    click.echo(f"{res['insertadas']} facturas insertadas, {res['rechazadas']} rechazadas "
+               f"en {seg:.2f}s ({res['insertadas'] / seg if seg else 0:.0f} fact/s)")
+
+# --- PDF ---
+# pdf_factura y pdf_lote no importan ReportLab ni multiprocessing hasta dibujar el primer PDF
+from cache_pdf import CachePDF, firma_factura
+from pdf_factura import cargar_factura, dibujar_factura, dibujar_facturas, iterar_facturas, precargar as precargar_pdf
+from pdf_lote import renderizar, zip_stream
+
+def get_cache_pdf():
+    return _estado("cache_pdf", lambda: CachePDF(current_app.config["PDF_CACHE_DIR"],
+                                                 max_memoria=current_app.config["PDF_CACHE_MEMORIA"],
+                                                 max_disco=current_app.config["PDF_CACHE_DISCO"]))
+
+@calentador("pdf")
+def _calentar_pdf(app):
+    precargar_pdf()
+
+def _cargar_factura(db, nfac):
+    """Como cargar_factura, pero busca también en los años archivados."""
+    cab, det = cargar_factura(db, nfac)
+    if cab is None:
+        esquema = get_particiones().ubicar(db, nfac)
+        if esquema and esquema != "main":
+            cab, det = cargar_factura(db, nfac, esquema)
+    return cab, det
+
+@bp.get("/facturas/pdf/cache")
+def factura_pdf_cache():
+    return jsonify(get_cache_pdf().resumen())
+
+@bp.get("/facturas/<nfac>/pdf")
 def factura_pdf(nfac):
     db = get_db()
 
-    # Cabecera de factura: FACTURA + CLIENTE + EMPRESA + VENDEDOR
-    cab = db.execute("""
-        SELECT F.NFAC, F.FECEM, F.FECVEN, F."DESC" AS DESC_M, F.IGV, F.TOTFAC,
-               C.CODI, C.NOMB||' '||C.APEL AS cliente, C.DNI, C.CALLE AS c_calle, C.DIST AS c_dist, C.CIUD AS c_ciud,
-               E.EMPR, E.RAZS, E.RUC, E.CALLE AS e_calle, E.DIST AS e_dist, E.CIUD AS e_ciud,
-               V.CODV, V.NOMB||' '||V.APEL AS vendedor
-        FROM FACTURA F
-        JOIN CLIENTE  C ON C.CODI=F.CODI
-        JOIN VENDEDOR V ON V.CODV=F.CODV
-        JOIN EMPRESA  E ON E.EMPR=F.EMPR
-        WHERE F.NFAC=?
-    """, (nfac,)).fetchone()
-
+    cab, det = _cargar_factura(db, nfac)
     if not cab:
         flash("Factura no encontrada", "warning")
-        return redirect(url_for("facturas"))
-
-    # Detalle de líneas
-    det = db.execute("""
-        SELECT D.NFAC, D.CODT, P.NOMB AS producto, D.CANT, D.PRECLI
-        FROM DETALLE_FACTURA D
-        JOIN PRODUCTO P ON P.CODT = D.CODT
-        WHERE D.NFAC=?
-        ORDER BY P.NOMB
-    """, (nfac,)).fetchall()
-
-    # Subtotal calculado a partir de PRECLI (coherente con el almacenamiento)
-    subtot = sum(float(r["PRECLI"]) for r in det)
-    desc_m = float(cab["DESC_M"])  # monto de descuento guardado
-    igv    = float(cab["IGV"])
-    total  = float(cab["TOTFAC"])
-    base   = max(0.0, round(subtot - desc_m, 2))   # descuento sobre subtotal, IGV sobre base
-
-    # --- Componer PDF ---
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    W, H = A4
-    x_m, y = 20*mm, H - 20*mm
-
-    def txt(txt, x, y, size=10, bold=False):
-        c.setFont("Helvetica-Bold" if bold else "Helvetica", size)
-        c.drawString(x, y, txt)
-
-    def right(txt_str, x, y, size=10, bold=False):
-        c.setFont("Helvetica-Bold" if bold else "Helvetica", size)
-        c.drawRightString(x, y, txt_str)
-
-    def money(v):  # S/ con 2 decimales
-        return f"S/ {float(v):,.2f}".replace(",", "_").replace(".", ",").replace("_",".")
-
-    # Encabezado empresa
-    txt(cab["RAZS"], x_m, y, 14, True); y -= 6*mm
-    txt(f"RUC: {cab['RUC']}", x_m, y); y -= 5*mm
-    txt(f"Dirección: {cab['e_calle']}, {cab['e_dist']} - {cab['e_ciud']}", x_m, y); y -= 10*mm
-
-    # Título y datos de factura
-    txt(f"FACTURA N° {cab['NFAC']}", x_m, y, 13, True); y -= 6*mm
-    txt(f"Fecha de emisión: {cab['FECEM'] or ''}", x_m, y); y -= 5*mm
-    if cab["FECVEN"]:
-        txt(f"Fecha de vencimiento: {cab['FECVEN']}", x_m, y); y -= 6*mm
-    else:
-        y -= 3*mm
-
-    # Datos del cliente
-    txt("Cliente:", x_m, y, 10, True); y -= 5*mm
-    txt(f"{cab['cliente']}  (DNI: {cab['DNI']})", x_m, y); y -= 5*mm
-    txt(f"Dirección: {cab['c_calle']}, {cab['c_dist']} - {cab['c_ciud']}", x_m, y); y -= 8*mm
-
-    # Vendedor
-    txt("Vendedor:", x_m, y, 10, True); y -= 5*mm
-    txt(f"{cab['vendedor']}  (Código: {cab['CODV']})", x_m, y); y -= 8*mm
-
-    # === Guías de columnas ===
-    TABLE_L = x_m                  # borde izquierdo del cuadro
-    TABLE_R = W - x_m              # borde derecho del cuadro
-    PAD     = 4*mm                 # padding interno
-
-    X_COD   = TABLE_L + PAD
-    X_PROD  = TABLE_L + 30*mm
-    X_CANT  = TABLE_R - 62*mm      # columna numérica 1 (derecha)
-    X_PUNIT = TABLE_R - 36*mm      # columna numérica 2 (derecha)
-    X_SUBT  = TABLE_R - PAD        # >>> columna final (derecha absoluta)
-
-    # Columnas de totales (etiqueta y valor)
-    LBL_X = X_PUNIT - 10*mm        # etiquetas de totales
-    VAL_X = X_SUBT                 # importes de totales (misma X que Subtotal de la tabla)
-
-    # --- Cabecera de tabla ---
-    c.rect(TABLE_L, y-6*mm, TABLE_R - TABLE_L, 8*mm, stroke=1, fill=0)
-    txt("Código",    X_COD,  y-2*mm, 10, True)
-    txt("Producto",  X_PROD, y-2*mm, 10, True)
-    right("Cant.",   X_CANT, y-2*mm, 10, True)
-    right("P. Unit", X_PUNIT,y-2*mm, 10, True)
-    right("Subtotal",X_SUBT, y-2*mm, 10, True)
-    y -= 10*mm
-
-    # --- Filas de detalle ---
-    for r in det:
-        cant   = int(r["CANT"])
-        precli = float(r["PRECLI"])
-        punit  = (precli / cant) if cant else 0.0
-
-        txt(r["CODT"], X_COD, y)
-        txt((r["producto"] or "")[:60], X_PROD, y)
-        right(str(cant),     X_CANT,  y)
-        right(money(punit),  X_PUNIT, y)
-        right(money(precli), X_SUBT,  y)
-
-        y -= 6*mm
-        if y < 45*mm:
-            c.showPage()
-            y = H - 30*mm
-
-    # --- Totales ---
-    y -= 2*mm 
-
-    SEP_GAP = 3.5*mm      # distancia entre la línea y el primer renglón de texto
-    c.setLineWidth(0.6)   # línea más delgada
-    c.line(LBL_X, y + SEP_GAP, X_SUBT, y + SEP_GAP)  # no cruza el texto
-
-    # ahora imprime los totales (todos alineados con VAL_X)
-    txt("Subtotal:",  LBL_X, y);               right(money(subtot), VAL_X, y); y -= 5*mm
-    txt("Descuento:", LBL_X, y);               right(money(desc_m), VAL_X, y); y -= 5*mm
-    txt("Base:",      LBL_X, y);               right(money(base),   VAL_X, y); y -= 5*mm
-    txt(f"IGV ({int(IGV_TASA*100)}%):", LBL_X, y); right(money(igv), VAL_X, y); y -= 6*mm
-
-    txt("TOTAL:", LBL_X, y, 12, True)
-    right(money(total), VAL_X, y, 12, True)
-
-        # --- Cerrar y enviar PDF ---
-    c.showPage()
-    c.save()
-    buffer.seek(0)
+        return redirect(url_for(".facturas"))
+
+    # Una factura emitida no cambia: si ya se dibujó con estos mismos datos, se envía tal cual.
+    # La firma de los datos es también el ETag: si el navegador ya la tiene, 304 sin dibujar ni leer caché.
     filename = f"Factura_{cab['NFAC']}.pdf"
-    return send_file(buffer, as_attachment=True, download_name=filename, mimetype="application/pdf")
+    firma = firma_factura(cab, det, IGV_TASA)
+    _, modificado = versiones.leer(db, versiones.TABLAS)
+    if not is_resource_modified(request.environ, etag=firma, last_modified=modificado):
+        resp = Response(status=304)
+        resp.set_etag(firma)
+        resp.last_modified = modificado
+        return resp
+
+    cache = get_cache_pdf()
+    pdf = cache.obtener(nfac, firma)
+    if pdf is None:
+        t0 = time.perf_counter()
+        pdf = dibujar_factura(cab, det, IGV_TASA)
+        M_PDF.observar(time.perf_counter() - t0)
+        cache.guardar(nfac, firma, pdf)
+    if isinstance(pdf, bytes):
+        pdf = io.BytesIO(pdf)
+    # Si vino de disco es un archivo ya abierto: send_file lo cierra al terminar la respuesta
+    resp = send_file(pdf, as_attachment=True, download_name=filename, mimetype="application/pdf",
+                     etag=firma, last_modified=modificado)
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    return resp
+
+
+
+# --- PDF por lotes (ZIP) ---
+def _pdf_desde_cache(cab, det):
+    guardado = get_cache_pdf().obtener(cab["NFAC"], firma_factura(cab, det, IGV_TASA))
+    if guardado is None or isinstance(guardado, bytes):
+        return guardado
+    with guardado:
+        return guardado.read()
+
+def _pdf_a_cache(cab, det, pdf):
+    get_cache_pdf().guardar(cab["NFAC"], firma_factura(cab, det, IGV_TASA), pdf)
+
+def _zip_facturas(db, where, params, esquemas, workers, stats):
+    pdfs = renderizar(iterar_facturas(db, where, params, esquemas=esquemas), IGV_TASA, workers=workers,
+                      buscar=_pdf_desde_cache, guardar=_pdf_a_cache)
+    return zip_stream(pdfs, stats)
+
+@bp.get("/facturas/pdf/lote")
+def facturas_pdf_lote():
+    """ZIP con los PDF de las facturas que cumplen los filtros del listado."""
+    db = get_db()
+    where, params, filtros = _filtros_facturas(request.args)
+    workers = request.args.get("workers", type=int) or current_app.config["PDF_WORKERS"]
+    stats = {}
+
+    def generar():
+        yield from _zip_facturas(db, where, params, _esquemas(db, filtros), workers, stats)
+        current_app.logger.info("Lote PDF: %s facturas en %ss (%s fact/s)",
+                        stats["facturas"], stats["segundos"], stats["facturas_por_segundo"])
+
+    return Response(stream_with_context(generar()), mimetype="application/zip",
+                    headers={"Content-Disposition": "attachment; filename=facturas.zip"})
+
+def _impresion(db, where, params, esquemas, destino, avance=None):
+    """Un solo PDF con las facturas del filtro (tirada para imprimir); devuelve cuántas tiene."""
+    n = 0
+
+    def contar(k):
+        nonlocal n
+        n = k
+        if avance:
+            avance(k)
+
+    dibujar_facturas(iterar_facturas(db, where, params, esquemas=esquemas), IGV_TASA, destino, contar)
+    return n
+
+@bp.get("/facturas/pdf/impresion")
+def facturas_pdf_impresion():
+    """Un solo PDF con las facturas del listado filtrado; para tiradas grandes, el trabajo pdf_impresion."""
+    db = get_db()
+    where, params, filtros = _filtros_facturas(request.args)
+    fd, ruta = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        n = _impresion(db, where, params, _esquemas(db, filtros), ruta)
+    except Exception:
+        os.remove(ruta)
+        raise
+    if not n:
+        os.remove(ruta)
+        return jsonify({"error": "Ninguna factura cumple los filtros."}), 404
+    return Response(_archivo_por_trozos(ruta), mimetype="application/pdf",
+                    headers={"Content-Disposition": "attachment; filename=facturas.pdf"})
+
+@bp.cli.command("exportar-pdf")
+@click.argument("salida", type=click.Path(dir_okay=False, writable=True))
+@click.option("--desde", help="Fecha de emisión inicial (AAAA-MM-DD).")
+@click.option("--hasta", help="Fecha de emisión final (AAAA-MM-DD).")
+@click.option("--cliente", "CODI", help="CODI del cliente.")
+@click.option("--vendedor", "CODV", help="CODV del vendedor.")
+@click.option("--workers", type=int, default=None, help="Procesos de dibujo (por defecto, PDF_WORKERS).")
+def exportar_pdf_cmd(salida, workers, **filtros):
+    """Exporta los PDF de las facturas del periodo: un ZIP, o un solo PDF si SALIDA termina en .pdf."""
+    where, params, filtros = _filtros_facturas(filtros)
+    stats = {}
+    db = get_db()
+    if salida.lower().endswith(".pdf"):
+        t0 = time.perf_counter()
+        n = _impresion(db, where, params, _esquemas(db, filtros), salida)
+        seg = time.perf_counter() - t0
+        click.echo(f"{n} facturas en {seg:.2f}s ({n / seg if seg else 0:.1f} fact/s) -> {salida}")
+        return
+    with open(salida, "wb") as fh:
+        for parte in _zip_facturas(db, where, params, _esquemas(db, filtros),
+                                   workers or current_app.config["PDF_WORKERS"], stats):
+            fh.write(parte)
+    click.echo(f"{stats['facturas']} facturas en {stats['segundos']}s "
+               f"({stats['facturas_por_segundo']} fact/s) -> {salida}")
+
+
+# --- Carga masiva de clientes, productos y vendedores ---
+import lote_maestros
+
+def _importar_maestros(entidad):
+    """Acepta un archivo (campo `archivo`) o el cuerpo crudo en CSV o JSON lines."""
+    db = get_db()
+    archivo = request.files.get("archivo")
+    if archivo:
+        formato = request.form.get("formato") or _formato_carga(archivo.filename, archivo.mimetype)
+        stream = archivo.stream
+    else:
+        formato = request.args.get("formato") or _formato_carga("", request.mimetype)
+        stream = request.stream
+    t0 = time.perf_counter()
+    res = lote_maestros.importar(db, entidad, lote_maestros.leer_archivo(stream, formato))
+    res["segundos"] = round(time.perf_counter() - t0, 3)
+    return jsonify(res), (200 if not res["errores"] else 207)
+
+for _entidad in lote_maestros.ENTIDADES:
+    bp.add_url_rule(f"/{_entidad}/importar", f"{_entidad}_importar", _importar_maestros,
+                     methods=["POST"], defaults={"entidad": _entidad})
+
+@bp.cli.command("importar-maestros")
+@click.argument("entidad", type=click.Choice(sorted(lote_maestros.ENTIDADES)))
+@click.argument("archivo", type=click.Path(exists=True, dir_okay=False))
+@click.option("--formato", type=click.Choice(["jsonl", "csv"]), default=None,
+              help="Por defecto se deduce de la extensión.")
+@click.option("--lote", default=10000, show_default=True, help="Filas por transacción.")
+@click.option("--rechazos", type=click.Path(dir_okay=False, writable=True),
+              help="CSV con las filas rechazadas (línea, clave, motivo).")
+def importar_maestros_cmd(entidad, archivo, formato, lote, rechazos):
+    """Carga masiva de clientes, productos o vendedores."""
+    formato = formato or _formato_carga(archivo, "")
+    db = get_db()
+    t0 = time.perf_counter()
+    with open(archivo, "r", encoding="utf-8-sig", newline="") as fh:
+        res = lote_maestros.importar(db, entidad, lote_maestros.leer_archivo(fh, formato), tam_lote=lote)
+    seg = time.perf_counter() - t0
+    if rechazos:
+        import csv
+        with open(rechazos, "w", encoding="utf-8", newline="") as out:
+            w = csv.DictWriter(out, fieldnames=["linea", "clave", "error"])
+            w.writeheader()
+            w.writerows(res["errores"])
+    else:
+        for e in res["errores"]:
+            click.echo(f"línea {e['linea']} ({e['clave']}): {e['error']}", err=True)
+    click.echo(f"{res['insertados']} {entidad} insertados, {res['rechazados']} rechazados en {seg:.2f}s")
+
+
+# --- Exportación CSV / XLSX ---
+import exportar
+import tempfile
 
+def _archivo_por_trozos(ruta, tam=64 * 1024):
+    """Envía un archivo temporal por partes y lo borra al terminar."""
+    try:
+        with open(ruta, "rb") as fh:
+            while True:
+                trozo = fh.read(tam)
+                if not trozo:
+                    break
+                yield trozo
+    finally:
+        os.remove(ruta)
+
+@bp.get("/facturas/exportar/<tipo>.<formato>")
+def facturas_exportar(tipo, formato):
+    """tipo = facturas | lineas; formato = csv | xlsx; mismos filtros que el listado."""
+    if tipo not in exportar.CONSULTAS or formato not in ("csv", "xlsx"):
+        return jsonify({"error": "Exportación no disponible."}), 404
+    db = get_db()
+    where, params, filtros = _filtros_facturas(request.args)
+    filas = exportar.filas(db, tipo, where, params, _esquemas(db, filtros))
+    nombre = f"{tipo}_{date.today().isoformat()}.{formato}"
+    cabeceras = {"Content-Disposition": f"attachment; filename={nombre}"}
+
+    if formato == "csv":
+        # BOM y encabezados salen de inmediato; luego trozos por bloque o por tiempo
+        return Response(stream_with_context(exportar.csv_stream(filas)),
+                        mimetype="text/csv", headers=cabeceras)
+
+    # XLSX es un ZIP: openpyxl (write_only) lo arma en un archivo temporal y se envía por partes
+    fd, ruta = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        exportar.escribir_xlsx(filas, ruta, titulo=tipo.capitalize())
+    except ImportError:
+        os.remove(ruta)
+        return jsonify({"error": "Instale openpyxl para exportar a XLSX."}), 501
+    except Exception:
+        os.remove(ruta)
+        raise
+    return Response(_archivo_por_trozos(ruta), headers=cabeceras,
+                    mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+@bp.cli.command("exportar-facturas")
+@click.argument("salida", type=click.Path(dir_okay=False, writable=True))
+@click.option("--tipo", type=click.Choice(sorted(exportar.CONSULTAS)), default="facturas", show_default=True)
+@click.option("--desde", help="Fecha de emisión inicial (AAAA-MM-DD).")
+@click.option("--hasta", help="Fecha de emisión final (AAAA-MM-DD).")
+@click.option("--cliente", "CODI", help="CODI del cliente.")
+@click.option("--vendedor", "CODV", help="CODV del vendedor.")
+@click.option("--tmin", help="Total mínimo.")
+@click.option("--tmax", help="Total máximo.")
+def exportar_facturas_cmd(salida, tipo, **filtros):
+    """Exporta facturas o líneas a CSV o XLSX (según la extensión de SALIDA)."""
+    where, params, filtros = _filtros_facturas(filtros)
+    db = get_db()
+    filas = exportar.filas(db, tipo, where, params, _esquemas(db, filtros))
+    t0 = time.perf_counter()
+    if salida.lower().endswith(".xlsx"):
+        exportar.escribir_xlsx(filas, salida, titulo=tipo.capitalize())
+    else:
+        with open(salida, "wb") as fh:
+            for trozo in exportar.csv_stream(filas):
+                fh.write(trozo)
+    click.echo(f"{tipo} exportadas a {salida} en {time.perf_counter() - t0:.2f}s")
+
+
+# --- Datos sintéticos (pruebas de carga) ---
+import datos_sinteticos
+
+@bp.cli.command("generar-datos")
+@click.option("--escala", type=float, default=1.0, show_default=True,
+              help="1 = 10 000 facturas; 100 = 1 millón.")
+@click.option("--semilla", type=int, default=42, show_default=True)
+@click.option("--dias", type=int, default=730, show_default=True, help="Días de historia.")
+def generar_datos_cmd(escala, semilla, dias):
+    """Llena la BD (FLASK_DB_PATH) con clientes, productos y facturas sintéticos."""
+    db = get_db()
+    t0 = time.perf_counter()
+    res = datos_sinteticos.generar(db, escala, semilla, dias, IGV_TASA, avance=click.echo)
+    # La carga fue sin los triggers de datos derivados: se recalculan resúmenes, índices y versiones
+    versiones.invalidar(db)
+    reportes.reconstruir(db, _esquemas(db))
+    busqueda.asegurar_indices(db, _esquemas(db))
+    db.execute("ANALYZE")
+    click.echo(f"{res} en {time.perf_counter() - t0:.1f}s")
+
+
+# --- Reportes ---
+@bp.route("/reportes")
+def reportes_ventas():
+    db = get_db()
+    desde = request.args.get("desde") or None
+    hasta = request.args.get("hasta") or None
+    return render_template("reportes.html", desde=desde or "", hasta=hasta or "",
+                           diario=reportes.ventas_diarias(db, desde, hasta),
+                           por_vendedor=reportes.ventas_por(db, "vendedor", desde, hasta),
+                           por_cliente=reportes.ventas_por(db, "cliente", desde, hasta, limite=20),
+                           por_producto=reportes.ventas_por(db, "producto", desde, hasta, limite=20))
+
+@bp.get("/reportes/<dim>")
+def reportes_json(dim):
+    """JSON: dim = dia | vendedor | cliente | producto; filtros desde/hasta/limite."""
+    db = get_db()
+    desde = request.args.get("desde") or None
+    hasta = request.args.get("hasta") or None
+    if dim == "dia":
+        return jsonify(reportes.ventas_diarias(db, desde, hasta))
+    if dim not in reportes.DIMENSIONES:
+        return jsonify({"error": f"Dimensión desconocida: {dim}"}), 404
+    limite = max(1, min(request.args.get("limite", 50, type=int), 1000))
+    return jsonify(reportes.ventas_por(db, dim, desde, hasta, limite))
+
+@bp.cli.command("reconstruir-resumenes")
+def reconstruir_resumenes_cmd():
+    """Recalcula las tablas RES_* desde las tablas base."""
+    t0 = time.perf_counter()
+    db = get_db()
+    reportes.reconstruir(db, _esquemas(db))
+    click.echo(f"Resúmenes reconstruidos en {time.perf_counter() - t0:.2f}s")
+
+@bp.cli.command("conciliar-resumenes")
+@click.option("--reparar", is_flag=True, help="Reconstruir si hay diferencias.")
+def conciliar_resumenes_cmd(reparar):
+    """Verifica que las tablas RES_* cuadren con FACTURA y DETALLE_FACTURA."""
+    db = get_db()
+    difs = reportes.conciliar(db, esquemas=_esquemas(db))
+    if not difs:
+        click.echo("Resúmenes conciliados: sin diferencias.")
+        return
+    for dim, filas in difs.items():
+        click.echo(f"{dim}: {len(filas)} diferencia(s)")
+        for f in filas[:10]:
+            click.echo(f"  {f}")
+    if reparar:
+        reportes.reconstruir(db, _esquemas(db))
+        click.echo("Resúmenes reconstruidos.")
+    else:
+        raise SystemExit(1)
+
+# --- Archivo de años cerrados ---
+@bp.get("/particiones")
+def particiones_lista():
+    """Años archivados con sus conteos, totales y tamaño del archivo."""
+    return jsonify(get_particiones().resumen(get_db()))
+
+@bp.cli.command("archivar")
+@click.option("--anio", type=int, multiple=True,
+              help="Año a archivar (repetible). Por defecto, todos los cerrados según ARCHIVO_ANIOS_ABIERTOS.")
+@click.option("--vacuum", is_flag=True, help="Compactar la BD activa al terminar (y rehacer los índices de búsqueda).")
+def archivar_cmd(anio, vacuum):
+    """Mueve las facturas de años cerrados a una BD por año (ARCHIVO_DIR) y las quita de la activa."""
+    db = get_db()
+    hoy = date.today().year
+    if anio:
+        anios = sorted(set(anio))
+        abiertos = [a for a in anios if a >= hoy]
+        if abiertos:
+            raise click.ClickException(f"El año en curso no se puede archivar: {abiertos}")
+    else:
+        primera = db.execute("SELECT MIN(FECEM) FROM FACTURA").fetchone()[0]
+        ultimo = hoy - current_app.config["ARCHIVO_ANIOS_ABIERTOS"]
+        anios = [a for a in range(int(primera[:4]), ultimo + 1)
+                 if db.execute("SELECT 1 FROM FACTURA WHERE FECEM BETWEEN ? AND ? LIMIT 1",
+                               (f"{a}-01-01", f"{a}-12-31")).fetchone()] if primera else []
+        if not anios:
+            click.echo(f"No hay facturas de años cerrados (hasta {ultimo}) en la BD activa.")
+    part = get_particiones()
+    t0 = time.perf_counter()
+    for a in anios:
+        try:
+            facturas, total, lineas, _ = part.archivar(db, a, avance=click.echo)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"{a}: {facturas} facturas, {lineas} líneas, total {total:.2f}")
+    if vacuum:
+        db.execute("VACUUM")
+        busqueda.reconstruir(db, _esquemas(db))  # VACUUM puede renumerar los rowid que usa FACTURA_FTS
+        click.echo("BD activa compactada.")
+    click.echo(f"Archivo terminado en {time.perf_counter() - t0:.2f}s ({part.directorio})")
+
+# --- Trabajos en segundo plano ---
+from trabajos import ColaTrabajos
+
+def _trabajo_pdf(db, t):
+    nfac = t.params.get("NFAC") or ""
+    cab, det = _cargar_factura(db, nfac)
+    if not cab:
+        raise ValueError(f"Factura no encontrada: {nfac}")
+    ruta = t.archivo(f"Factura_{nfac}.pdf")
+    pdf = _pdf_desde_cache(cab, det)
+    if pdf is None:
+        t0 = time.perf_counter()
+        pdf = dibujar_factura(cab, det, IGV_TASA)
+        M_PDF.observar(time.perf_counter() - t0)
+        _pdf_a_cache(cab, det, pdf)
+    with open(ruta, "wb") as fh:
+        fh.write(pdf)
+    return ruta
+
+def _trabajo_pdf_lote(db, t):
+    where, params, filtros = _filtros_facturas(t.params)
+    total = sum(db.execute(f"SELECT COUNT(*) FROM {s}.FACTURA F {where}", params).fetchone()[0]
+                for s in _esquemas(db, filtros))
+    ruta = t.archivo("facturas.zip")
+    stats = {}
+    with open(ruta, "wb") as fh:
+        # zip_stream entrega un trozo por factura y uno final (directorio central)
+        for n, parte in enumerate(_zip_facturas(db, where, params, _esquemas(db, filtros),
+                                                   current_app.config["PDF_WORKERS"], stats)):
+            fh.write(parte)
+            t.avance(min(n + 1, total), total, f"{min(n + 1, total)}/{total} facturas")
+    return ruta
+
+def _trabajo_pdf_impresion(db, t):
+    where, params, filtros = _filtros_facturas(t.params)
+    total = sum(db.execute(f"SELECT COUNT(*) FROM {s}.FACTURA F {where}", params).fetchone()[0]
+                for s in _esquemas(db, filtros))
+    ruta = t.archivo("facturas.pdf")
+    _impresion(db, where, params, _esquemas(db, filtros), ruta,
+               lambda n: t.avance(n, total, f"{n}/{total} facturas"))
+    return ruta
+
+def _trabajo_exportar(db, t):
+    tipo, formato = t.params.get("tipo", "facturas"), t.params.get("formato", "csv")
+    if tipo not in exportar.CONSULTAS or formato not in ("csv", "xlsx"):
+        raise ValueError("Exportación no disponible.")
+    where, params, filtros = _filtros_facturas(t.params)
+
+    n = 0
+
+    def contadas():
+        nonlocal n
+        for fila in exportar.filas(db, tipo, where, params, _esquemas(db, filtros)):
+            if n % 1000 == 0:
+                t.avance(0, None, f"{n} filas")
+            n += 1
+            yield fila
+
+    ruta = t.archivo(f"{tipo}_{date.today().isoformat()}.{formato}")
+    if formato == "xlsx":
+        exportar.escribir_xlsx(contadas(), ruta, titulo=tipo.capitalize())
+    else:
+        with open(ruta, "wb") as fh:
+            for trozo in exportar.csv_stream(contadas()):
+                fh.write(trozo)
+    t.avance(1, 1, f"{n - 1} filas")  # sin la fila de encabezados
+    return ruta
+
+def _trabajo_resumenes(db, t):
+    reportes.reconstruir(db, _esquemas(db))
+
+def _en_app(app, funcion):
+    """Los hilos de la cola no tienen contexto de Flask: cada trabajo corre en el de su aplicación."""
+    def envuelta(db, t):
+        with app.app_context():
+            return funcion(db, t)
+    return envuelta
+
+def _crear_cola():
+    app = current_app._get_current_object()
+    cola = ColaTrabajos(functools.partial(_conexion_pool, get_pool()), app.config["TRABAJOS_DIR"],
+                        hilos=app.config["TRABAJOS_HILOS"],
+                        retencion=app.config["TRABAJOS_RETENCION_H"] * 3600)
+    # Prioridad: lo que alguien espera en pantalla primero; lo masivo después
+    cola.registrar("pdf", _en_app(app, _trabajo_pdf), concurrencia=2, prioridad=10)
+    cola.registrar("pdf_lote", _en_app(app, _trabajo_pdf_lote), concurrencia=1, reintentos=2)
+    cola.registrar("pdf_impresion", _en_app(app, _trabajo_pdf_impresion), concurrencia=1, reintentos=2)
+    cola.registrar("exportar", _en_app(app, _trabajo_exportar), concurrencia=2, reintentos=2)
+    cola.registrar("resumenes", _en_app(app, _trabajo_resumenes), concurrencia=1, reintentos=1, prioridad=-10)
+    return cola
+
+def get_cola():
+    cola = _estado("cola", _crear_cola)
+    if current_app.config["TRABAJOS_EN_PROCESO"]:
+        cola.iniciar()
+    return cola
+
+def _trabajos_en_curso():
+    # Para /metrics: no crea la cola (ni arranca sus hilos) si nadie la usó
+    cola = current_app.extensions["facturacion"].get("cola")
+    return cola.resumen()["en_curso"] if cola else {}
+
+def _trabajo_json(trabajo):
+    resultado = trabajo.pop("resultado")
+    trabajo["url"] = url_for(".trabajo_estado", id=trabajo["id"])
+    if trabajo["estado"] == "hecho" and resultado:
+        trabajo["resultado_url"] = url_for(".trabajo_resultado", id=trabajo["id"])
+    return trabajo
+
+@bp.post("/trabajos/<tipo>")
+def trabajo_encolar(tipo):
+    """Encola un trabajo; los parámetros van en JSON, en el formulario o en la query."""
+    cola = get_cola()
+    if tipo not in cola.tipos:
+        return jsonify({"error": f"Tipo de trabajo desconocido: {tipo}", "tipos": cola.tipos}), 404
+    params = request.get_json(silent=True)
+    if params is None:
+        params = {k: v for k, v in request.values.items()}
+    elif not isinstance(params, dict):
+        return jsonify({"error": "Los parámetros deben ser un objeto JSON."}), 400
+    prioridad = params.pop("prioridad", None)
+    if prioridad is not None:
+        try:
+            prioridad = int(prioridad)
+        except (TypeError, ValueError):
+            return jsonify({"error": f"Prioridad inválida: {prioridad!r} (debe ser un entero)."}), 400
+    db = get_db()
+    id = cola.encolar(db, tipo, params, prioridad)
+    resp = jsonify(_trabajo_json(cola.estado(db, id)))
+    resp.status_code = 202
+    resp.headers["Location"] = url_for(".trabajo_estado", id=id)
+    return resp
+
+@bp.get("/trabajos")
+def trabajos_lista():
+    limite = max(1, min(request.args.get("limite", 50, type=int), 500))
+    filas = get_cola().listar(get_db(), request.args.get("estado") or None, limite)
+    return jsonify([_trabajo_json(f) for f in filas])
+
+@bp.get("/trabajos/<int:id>")
+def trabajo_estado(id):
+    trabajo = get_cola().estado(get_db(), id)
+    if trabajo is None:
+        return jsonify({"error": "Trabajo no encontrado."}), 404
+    return jsonify(_trabajo_json(trabajo))
+
+@bp.get("/trabajos/<int:id>/resultado")
+def trabajo_resultado(id):
+    trabajo = get_cola().estado(get_db(), id)
+    if trabajo is None:
+        return jsonify({"error": "Trabajo no encontrado."}), 404
+    if trabajo["estado"] != "hecho":
+        resp = jsonify({"error": "El trabajo aún no termina.", "estado": trabajo["estado"]})
+        resp.status_code = 409
+        resp.headers["Retry-After"] = "2"
+        return resp
+    ruta = trabajo["resultado"]
+    if not ruta or not os.path.exists(ruta):
+        return jsonify({"error": "El trabajo no dejó archivo (o ya se purgó)."}), 410
+    nombre = os.path.basename(ruta).split("-", 1)[-1]
+    return send_file(ruta, as_attachment=True, download_name=nombre)
+
+@bp.cli.command("trabajos")
+@click.option("--hilos", type=int, default=None, help="Por defecto, TRABAJOS_HILOS.")
+def trabajos_cmd(hilos):
+    """Ejecuta la cola de trabajos en este proceso hasta Ctrl-C."""
+    import logging
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(threadName)s %(message)s")
+    current_app.config["TRABAJOS_EN_PROCESO"] = False
+    cola = get_cola()
+    if hilos:
+        cola.hilos = hilos
+    cola.iniciar()
+    click.echo(f"Atendiendo trabajos ({', '.join(cola.tipos)}) con {cola.hilos} hilos. Ctrl-C para salir.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        click.echo("Esperando a que terminen los trabajos en curso...")
+        cola.detener()
 
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
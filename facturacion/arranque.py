@@ -0,0 +1,77 @@
+"""Medición del arranque de un proceso de la aplicación (`flask tiempos-arranque`).
+
+Corre en un intérprete nuevo `import app`, `create_app()` y los calentadores
+pedidos, con `python -X importtime`, y reparte el tiempo de importación por
+fase y por paquete. Tiene que ser otro proceso: en este ya está todo importado.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+_MARCA = "fase-arranque: "
+
+_GUION = """
+import json, sys, time
+def fase(nombre):
+    sys.stderr.write(%(marca)r + nombre + "\\n")
+    sys.stderr.flush()
+tiempos = []
+fase("import app")
+t0 = time.perf_counter()
+import app
+tiempos.append(("import app", time.perf_counter() - t0))
+fase("create_app")
+t0 = time.perf_counter()
+a = app.create_app({"CALENTAR": []})
+tiempos.append(("create_app", time.perf_counter() - t0))
+for nombre in %(calentar)r:
+    fase("calentar " + nombre)
+    tiempos += [("calentar " + n, s) for n, s in app.calentar(a, [nombre]).items()]
+print(json.dumps(tiempos))
+"""
+
+
+def desglose(lineas):
+    """Agrupa la salida de -X importtime por fase: [{fase, importacion, modulos, paquetes}].
+
+    `importacion` suma el tiempo acumulado de las importaciones de primer nivel;
+    `paquetes` es [(paquete, segundos propios)] de mayor a menor.
+    """
+    fases, actual = [], None
+    for linea in lineas:
+        if linea.startswith(_MARCA) or actual is None:
+            actual = {"fase": linea[len(_MARCA):].strip() if linea.startswith(_MARCA) else "intérprete",
+                      "importacion": 0.0, "modulos": 0, "paquetes": {}}
+            fases.append(actual)
+            if linea.startswith(_MARCA):
+                continue
+        if not linea.startswith("import time:") or "imported package" in linea:
+            continue
+        propio, acumulado, nombre = linea[len("import time:"):].split("|", 2)
+        paquete = nombre.strip().split(".")[0]
+        actual["modulos"] += 1
+        actual["paquetes"][paquete] = actual["paquetes"].get(paquete, 0.0) + int(propio) / 1e6
+        if nombre[1:] == nombre.lstrip():  # sin sangría: importado directamente en esa fase
+            actual["importacion"] += int(acumulado) / 1e6
+    for f in fases:
+        f["paquetes"] = sorted(f["paquetes"].items(), key=lambda p: -p[1])
+    return fases
+
+
+def medir(directorio, calentar=(), python=sys.executable):
+    """Arranca un proceso en `directorio` y devuelve {"total": s, "fases": [...]} (ver desglose)."""
+    guion = _GUION % {"marca": _MARCA, "calentar": list(calentar)}
+    t0 = time.perf_counter()
+    proc = subprocess.run([python, "-X", "importtime", "-c", guion], cwd=directorio,
+                          capture_output=True, text=True, env=os.environ.copy())
+    total = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError("El proceso de medición falló:\n" + "\n".join(
+            l for l in proc.stderr.splitlines() if not l.startswith("import time:"))[-2000:])
+    segundos = dict(json.loads(proc.stdout.strip().splitlines()[-1]))
+    fases = desglose(proc.stderr.splitlines())
+    for f in fases:
+        f["segundos"] = segundos.get(f["fase"], f["importacion"])
+    return {"total": total, "fases": fases}
@@ -0,0 +1,276 @@
+"""Pruebas de carga reproducibles sobre una BD generada con `flask generar-datos`.
+
+Mide las rutas principales (listado, alta de factura, PDF, altas de clientes y
+productos) con dos conductores:
+  - cliente: el cliente de pruebas de Flask, en proceso y secuencial;
+  - http: peticiones reales con N hilos concurrentes, contra --url o contra un
+    servidor werkzeug levantado aquí mismo.
+Guarda p50/p95/p99, throughput y memoria máxima en JSON y, con --base,
+compara contra una corrida anterior.
+
+    flask --app app generar-datos --escala 10        # FLASK_DB_PATH=/tmp/bench.db
+    python benchmark.py --db /tmp/bench.db --salida antes.json
+    python benchmark.py --db /tmp/bench.db --base antes.json --salida despues.json
+
+Las altas escriben en la BD: conviene correr sobre una copia.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+
+def _percentil(valores, p):
+    if not valores:
+        return None
+    orden = sorted(valores)
+    k = min(len(orden) - 1, max(0, round(p / 100 * len(orden) + 0.5) - 1))
+    return orden[k]
+
+
+def _rss_max_mb():
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(r / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# ---------- Escenarios ----------
+class Muestras:
+    """Claves existentes tomadas al azar de la BD y generador de claves nuevas."""
+
+    def __init__(self, ruta, semilla):
+        rng = random.Random(semilla)
+        db = sqlite3.connect(ruta)
+        try:
+            def tomar(sql):
+                filas = [r[0] for r in db.execute(sql)]
+                if not filas:
+                    raise SystemExit(f"BD sin datos para: {sql} (¿corriste generar-datos?)")
+                rng.shuffle(filas)
+                return filas
+            self.facturas = tomar("SELECT NFAC FROM FACTURA ORDER BY random() LIMIT 1000")
+            self.clientes = tomar("SELECT CODI FROM CLIENTE ORDER BY random() LIMIT 500")
+            self.vendedores = tomar("SELECT CODV FROM VENDEDOR")
+            self.productos = tomar("SELECT CODT FROM PRODUCTO ORDER BY random() LIMIT 500")
+        finally:
+            db.close()
+        self.marca = f"{int(time.time()) % 100000:05d}"  # distingue las claves de cada corrida
+        self._n = 0
+        self._lock = threading.Lock()
+
+    def siguiente(self):
+        with self._lock:
+            self._n += 1
+            return self._n
+
+    def elegir(self, lista, i):
+        return lista[i % len(lista)]
+
+
+def _factura_nueva(m, i):
+    hoy = date.today()
+    items = [m.elegir(m.productos, i * 7 + k) for k in range(1 + i % 6)]
+    return "POST", "/facturas/crear", {
+        "SERIE": "F",
+        "FECEM": hoy.isoformat(),
+        "FECVEN": (hoy + timedelta(days=30)).isoformat(),
+        "CODI": m.elegir(m.clientes, i),
+        "CODV": m.elegir(m.vendedores, i),
+        "DESCPCT": "0",
+        "CODT[]": items,
+        "CANT[]": [str(1 + k % 3) for k in range(len(items))],
+    }
+
+
+def _cliente_nuevo(m, i):
+    n = m.siguiente()
+    unico = int(m.marca) * 10000 + n
+    return "POST", "/clientes/nuevo", {
+        "CODI": f"B{m.marca}{n:04d}", "DNI": f"{10000000 + unico % 90000000}",
+        "NOMB": "Carga", "APEL": f"Prueba {n}", "TELF": f"{800000000 + unico % 100000000}",
+        "EMAIL": f"carga{m.marca}.{n}@bench.pe", "CALLE": "Av. Prueba 1", "DIST": "Cercado", "CIUD": "Arequipa",
+    }
+
+
+def _producto_nuevo(m, i):
+    n = m.siguiente()
+    return "POST", "/productos/nuevo", {
+        "CODT": f"B{m.marca}{n:04d}", "NOMB": f"Producto carga {m.marca}-{n}", "UNID": "pza", "PREC": "9.90",
+    }
+
+
+ESCENARIOS = {
+    "inicio": lambda m, i: ("GET", "/", None),
+    "facturas": lambda m, i: ("GET", "/facturas", None),
+    "facturas_filtro": lambda m, i: ("GET", "/facturas?CODI=" + m.elegir(m.clientes, i), None),
+    "factura_nueva": lambda m, i: ("GET", "/facturas/nueva", None),
+    "factura_crear": _factura_nueva,
+    "factura_pdf": lambda m, i: ("GET", f"/facturas/{m.elegir(m.facturas, i)}/pdf", None),
+    "cliente_nuevo": _cliente_nuevo,
+    "producto_nuevo": _producto_nuevo,
+}
+
+
+# ---------- Conductores ----------
+def _pedir_cliente(cliente, metodo, ruta, datos):
+    r = cliente.open(ruta, method=metodo, data=datos)
+    r.get_data()
+    return r.status_code
+
+
+class _SinRedireccion(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *a, **kw):
+        return None
+
+
+_opener = urllib.request.build_opener(_SinRedireccion)
+
+
+def _pedir_http(base, metodo, ruta, datos):
+    cuerpo = urllib.parse.urlencode(datos, doseq=True).encode() if datos is not None else None
+    try:
+        with _opener.open(urllib.request.Request(base + ruta, data=cuerpo, method=metodo), timeout=60) as r:
+            r.read()
+            return r.status
+    except urllib.error.HTTPError as e:  # 3xx (sin seguir) y errores
+        e.read()
+        return e.code
+
+
+def _medir(pedir, escenario, m, n, concurrencia):
+    tiempos, errores = [], 0
+
+    def una(i):
+        metodo, ruta, datos = escenario(m, i)
+        t0 = time.perf_counter()
+        estado = pedir(metodo, ruta, datos)
+        return time.perf_counter() - t0, estado
+
+    t0 = time.perf_counter()
+    if concurrencia <= 1:
+        resultados = [una(i) for i in range(n)]
+    else:
+        with ThreadPoolExecutor(concurrencia) as ex:
+            resultados = list(ex.map(una, range(n)))
+    total = time.perf_counter() - t0
+    for t, estado in resultados:
+        tiempos.append(t)
+        errores += estado >= 400
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        "n": n, "errores": errores, "concurrencia": concurrencia,
+        "p50_ms": ms(_percentil(tiempos, 50)), "p95_ms": ms(_percentil(tiempos, 95)),
+        "p99_ms": ms(_percentil(tiempos, 99)), "media_ms": ms(statistics.fmean(tiempos)),
+        "rps": round(n / total, 1) if total else None,
+    }
+
+
+def _servidor_local(flask_app):
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # sin una línea de log por petición
+    srv = make_server("127.0.0.1", 0, flask_app, threaded=True)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f"http://127.0.0.1:{srv.server_port}"
+
+
+# ---------- Informe ----------
+def _comparar(actual, base):
+    print(f"\n{'escenario':<28}{'p50':>18}{'p95':>18}{'rps':>18}")
+    for clave, r in actual["resultados"].items():
+        b = base.get("resultados", {}).get(clave)
+        if not b:
+            continue
+
+        def delta(campo):
+            if not b.get(campo) or r.get(campo) is None:
+                return f"{r.get(campo)}"
+            return f"{r[campo]} ({(r[campo] - b[campo]) / b[campo] * 100:+.0f}%)"
+        print(f"{clave:<28}{delta('p50_ms'):>18}{delta('p95_ms'):>18}{delta('rps'):>18}")
+    print(f"{'rss_max_mb':<28}{actual['rss_max_mb']:>18} (base {base.get('rss_max_mb')})")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    p.add_argument("--db", help="BD a usar (por defecto la de app.py; mejor una copia generada)")
+    p.add_argument("--url", help="Servidor ya levantado, p. ej. http://127.0.0.1:8000 (si no, uno local)")
+    p.add_argument("-n", "--n", type=int, default=200, help="Peticiones por escenario")
+    p.add_argument("-c", "--concurrencia", type=int, default=8, help="Hilos del conductor http")
+    p.add_argument("--escenarios", help="Lista separada por comas (por defecto todos): " + ",".join(ESCENARIOS))
+    p.add_argument("--conductores", default="cliente,http", help="cliente,http")
+    p.add_argument("--semilla", type=int, default=42)
+    p.add_argument("--salida", help="Guardar resultados en este JSON")
+    p.add_argument("--base", help="JSON de una corrida anterior para comparar")
+    a = p.parse_args(argv)
+
+    nombres = a.escenarios.split(",") if a.escenarios else list(ESCENARIOS)
+    desconocidos = set(nombres) - set(ESCENARIOS)
+    if desconocidos:
+        p.error(f"escenarios desconocidos: {', '.join(sorted(desconocidos))}")
+    conductores = a.conductores.split(",")
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as modulo_app
+
+    # Caché de PDF vacía y propia: mide el dibujo, no una caché que dejó otra corrida
+    config = {"PDF_CACHE_DIR": tempfile.mkdtemp(prefix="bench_pdf_")}
+    if a.db:
+        config["DB_PATH"] = a.db
+    flask_app = modulo_app.create_app(config)
+    muestras = Muestras(flask_app.config["DB_PATH"], a.semilla)
+
+    srv = None
+    resultados = {}
+    for conductor in conductores:
+        if conductor == "cliente":
+            cliente = flask_app.test_client()
+            pedir, conc = (lambda met, ruta, d: _pedir_cliente(cliente, met, ruta, d)), 1
+        elif conductor == "http":
+            base_url = a.url
+            if not base_url:
+                srv, base_url = _servidor_local(flask_app)
+            base_url = base_url.rstrip("/")
+            pedir, conc = (lambda met, ruta, d, u=base_url: _pedir_http(u, met, ruta, d)), a.concurrencia
+        else:
+            p.error(f"conductor desconocido: {conductor}")
+        for nombre in nombres:
+            _medir(pedir, ESCENARIOS[nombre], muestras, min(5, a.n), conc)  # calentamiento
+            r = _medir(pedir, ESCENARIOS[nombre], muestras, a.n, conc)
+            resultados[f"{conductor}/{nombre}"] = r
+            print(f"{conductor + '/' + nombre:<28} p50 {r['p50_ms']:>8} ms  p95 {r['p95_ms']:>8} ms  "
+                  f"p99 {r['p99_ms']:>8} ms  {r['rps']:>8} req/s  errores {r['errores']}")
+    if srv:
+        srv.shutdown()
+
+    salida = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "db": flask_app.config["DB_PATH"],
+        "n": a.n,
+        "rss_max_mb": _rss_max_mb(),
+        "resultados": resultados,
+    }
+    if a.salida:
+        with open(a.salida, "w", encoding="utf-8") as f:
+            json.dump(salida, f, ensure_ascii=False, indent=2)
+    if a.base:
+        with open(a.base, encoding="utf-8") as f:
+            _comparar(salida, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
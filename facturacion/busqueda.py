@@ -0,0 +1,226 @@
+"""Búsqueda por prefijo de productos, clientes, vendedores y facturas (FTS5).
+
+Sirve al formulario de factura: en vez de incrustar todo el catálogo en la
+página, el navegador pide aquí unas pocas coincidencias mientras se escribe.
+Las facturas se buscan por un documento desnormalizado (FACTURA_FTS) con el
+cliente, el vendedor y los productos de sus líneas; los triggers solo anotan
+qué facturas cambiaron (FACTURA_FTS_PEND) y sus documentos se arman por lote
+justo antes de buscar.
+
+Las facturas de años archivados (particiones.py) conservan su documento con
+rowid negativo, fuera del rango de FACTURA: se buscan igual y sus datos se
+leen de la BD histórica del año. Como esos años ya no cambian, su documento
+queda con los datos de los maestros al momento de archivar (o de la última
+reconstrucción).
+"""
+import json
+import logging
+import re
+import sqlite3
+
+from numeracion import transaccion_inmediata
+
+log = logging.getLogger(__name__)
+
+ENTIDADES = {
+    "productos": {
+        "fts": "PRODUCTO_FTS", "tabla": "PRODUCTO",
+        "campos": "T.CODT AS codigo, T.NOMB AS nombre, T.UNID, T.PREC",
+        "orden": "T.NOMB",
+    },
+    "clientes": {
+        "fts": "CLIENTE_FTS", "tabla": "CLIENTE",
+        "columnas": ["CODI", "DNI", "NOMB", "APEL", "EMAIL", "CALLE", "DIST"],
+        "campos": "T.CODI AS codigo, T.NOMB||' '||T.APEL AS nombre, T.DNI",
+        "orden": "T.NOMB, T.APEL",
+    },
+    "vendedores": {
+        "fts": "VENDEDOR_FTS", "tabla": "VENDEDOR",
+        "campos": "T.CODV AS codigo, T.NOMB||' '||T.APEL AS nombre",
+        "orden": "T.NOMB, T.APEL",
+    },
+}
+
+
+# Documento de factura; se le agrega un WHERE para armar solo algunas.
+# {rowid}: F.rowid en la BD activa; para un año archivado, negativos correlativos.
+SQL_DOC = """
+INSERT INTO FACTURA_FTS (rowid, NFAC, CLIENTE, VENDEDOR, PRODUCTOS)
+SELECT {rowid}, F.NFAC,
+       C.NOMB||' '||C.APEL||' '||C.DNI||' '||COALESCE(C.EMAIL,'')||' '||COALESCE(C.CALLE,'')||' '||COALESCE(C.DIST,''),
+       V.NOMB||' '||V.APEL,
+       (SELECT group_concat(P.NOMB, ' ') FROM {s}.DETALLE_FACTURA D JOIN main.PRODUCTO P ON P.CODT = D.CODT
+         WHERE D.NFAC = F.NFAC)
+  FROM {s}.FACTURA F
+  LEFT JOIN main.CLIENTE C ON C.CODI = F.CODI
+  LEFT JOIN main.VENDEDOR V ON V.CODV = F.CODV
+"""
+SQL_DOC_FACTURA = SQL_DOC.format(rowid="F.rowid", s="main")
+
+# Peso de cada columna de FACTURA_FTS en bm25: NFAC, CLIENTE, VENDEDOR, PRODUCTOS
+PESOS_FACTURA = (10.0, 4.0, 1.0, 1.0)
+ORDENES_FACTURA = {
+    "relevancia": "bm25(FACTURA_FTS, %s), S.rowid DESC" % ", ".join(map(str, PESOS_FACTURA)),
+    # Sin ranking FTS5 recorre el índice por rowid y se detiene en LIMIT: rápido aunque haya
+    # millones de coincidencias (rowid sigue el orden de alta)
+    "recientes": "S.rowid DESC",
+}
+
+
+def consulta_fts(texto):
+    """'cuad a4' -> '"cuad"* "a4"*' (todas las palabras, cada una como prefijo)."""
+    palabras = re.findall(r"\w+", texto or "")
+    return " ".join(f'"{p}"*' for p in palabras)
+
+
+def buscar(db, entidad, texto, pagina=1, limite=20):
+    """Devuelve (filas, hay_mas). Sin texto, lista por nombre."""
+    e = ENTIDADES[entidad]
+    offset = (max(pagina, 1) - 1) * limite
+    match = consulta_fts(texto)
+    if match:
+        q = f"""SELECT {e['campos']}
+                FROM {e['fts']} S JOIN {e['tabla']} T ON T.rowid = S.rowid
+                WHERE {e['fts']} MATCH ?
+                ORDER BY S.rank
+                LIMIT ? OFFSET ?"""
+        params = (match, limite + 1, offset)
+    else:
+        q = f"SELECT {e['campos']} FROM {e['tabla']} T ORDER BY {e['orden']} LIMIT ? OFFSET ?"
+        params = (limite + 1, offset)
+    filas = [dict(r) for r in db.execute(q, params)]
+    return filas[:limite], len(filas) > limite
+
+
+def buscar_facturas(db, texto, pagina=1, limite=20, orden="relevancia", particiones=None):
+    """Facturas cuyo documento contiene todas las palabras. Devuelve (filas, hay_mas).
+
+    `coincidencia` trae un fragmento con las palabras halladas entre \x02 y \x03.
+    Con `particiones` (particiones.Particiones) también se devuelven las de
+    años archivados, leídas de su BD histórica.
+    """
+    match = consulta_fts(texto)
+    if not match:
+        return [], False
+    sincronizar_facturas(db)
+    offset = (max(pagina, 1) - 1) * limite
+    # F.NFAC = S.NFAC descarta documentos cuyo rowid ya no corresponde (p. ej. tras un VACUUM)
+    archivadas = "P.ANIO IS NOT NULL" if particiones else "0"
+    q = f"""SELECT S.NFAC, F.FECEM, F.TOTFAC, F.CODI, F.CODV, P.ANIO, P.ARCHIVO,
+                   S.CLIENTE AS cliente, S.VENDEDOR AS vendedor,
+                   snippet(FACTURA_FTS, -1, char(2), char(3), '…', 10) AS coincidencia
+            FROM FACTURA_FTS S
+            LEFT JOIN FACTURA F ON S.rowid > 0 AND F.rowid = S.rowid AND F.NFAC = S.NFAC
+            LEFT JOIN FACTURA_ARCHIVADA A ON S.rowid < 0 AND A.NFAC = S.NFAC
+            LEFT JOIN PARTICION P ON P.ANIO = A.ANIO AND P.ESTADO = 'archivada'
+            WHERE FACTURA_FTS MATCH ? AND (F.NFAC IS NOT NULL OR {archivadas})
+            ORDER BY {ORDENES_FACTURA[orden]}
+            LIMIT ? OFFSET ?"""
+    filas = [dict(r) for r in db.execute(q, (match, limite + 1, offset))]
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+    # Las de años archivados: una consulta por año a su BD histórica
+    por_anio = {}
+    for f in filas:
+        anio, archivo = f.pop("ANIO"), f.pop("ARCHIVO")
+        if anio is not None:
+            por_anio.setdefault((anio, archivo), {})[f["NFAC"]] = f
+    for (anio, archivo), suyas in por_anio.items():
+        esquema = particiones.adjuntar(db, anio, archivo)
+        for r in db.execute(f"SELECT NFAC, FECEM, TOTFAC, CODI, CODV FROM {esquema}.FACTURA "
+                            "WHERE NFAC IN (SELECT value FROM json_each(?))", (json.dumps(list(suyas)),)):
+            suyas[r["NFAC"]].update(r)
+    return filas, hay_mas
+
+
+def migrar(db):
+    """Quita índices FTS creados con otras columnas (y sus triggers); schema.sql los recrea."""
+    for e in ENTIDADES.values():
+        if "columnas" not in e:
+            continue
+        actuales = [r[1] for r in db.execute(f"PRAGMA table_info({e['fts']})")]
+        if actuales and actuales != e["columnas"]:
+            triggers = [r[0] for r in db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND sql LIKE ?", (f"%{e['fts']}%",))]
+            for t in triggers:
+                db.execute(f"DROP TRIGGER {t}")
+            db.execute(f"DROP TABLE {e['fts']}")
+    db.commit()
+
+
+def _sincronizar(db):
+    db.execute("DELETE FROM FACTURA_FTS WHERE rowid IN "
+               "(SELECT F.rowid FROM FACTURA_FTS_PEND P JOIN FACTURA F ON F.NFAC = P.NFAC)")
+    n = db.execute(SQL_DOC_FACTURA + " WHERE F.NFAC IN (SELECT NFAC FROM FACTURA_FTS_PEND)").rowcount
+    db.execute("DELETE FROM FACTURA_FTS_PEND")
+    return n
+
+
+def sincronizar_facturas(db):
+    """Arma los documentos de las facturas anotadas en FACTURA_FTS_PEND; devuelve cuántas.
+
+    Si la BD está ocupada escribiendo se busca con el índice tal como está
+    (lo pendiente se arma en la siguiente búsqueda).
+    """
+    if not db.execute("SELECT 1 FROM FACTURA_FTS_PEND LIMIT 1").fetchone():
+        return 0
+    try:
+        return transaccion_inmediata(db, _sincronizar, intentos=2)
+    except sqlite3.OperationalError as e:
+        log.warning("No se pudo actualizar el índice de facturas: %s", e)
+        return 0
+
+
+def indexar_archivadas(db, esquema="main", where="", params=()):
+    """Agrega con rowid negativo los documentos de facturas de `esquema` (un año archivado,
+    o el que se está archivando en la BD activa). Devuelve cuántas indexó.
+    """
+    base = min(0, db.execute("SELECT COALESCE(MIN(rowid), 0) FROM FACTURA_FTS").fetchone()[0])
+    sql = SQL_DOC.format(rowid=f"{base} - ROW_NUMBER() OVER (ORDER BY F.NFAC)", s=esquema)
+    return db.execute(f"{sql} {where}", tuple(params)).rowcount
+
+
+def reconstruir_facturas(db, esquemas=("main",)):
+    """Rehace FACTURA_FTS desde FACTURA, DETALLE_FACTURA y los maestros.
+
+    `esquemas` como en particiones.recorrer: "main" y los años archivados.
+    """
+    db.execute("DELETE FROM FACTURA_FTS")
+    db.execute("DELETE FROM FACTURA_FTS_PEND")
+    for s in esquemas:
+        if s == "main":
+            db.execute(SQL_DOC_FACTURA)
+        else:
+            indexar_archivadas(db, s)
+    db.execute("INSERT INTO FACTURA_FTS (FACTURA_FTS) VALUES ('optimize')")
+    db.commit()
+
+
+def reconstruir(db, esquemas=("main",)):
+    """Rehace todos los índices de búsqueda (también corrige rowid movidos por VACUUM)."""
+    for e in ENTIDADES.values():
+        db.execute(f"INSERT INTO {e['fts']} ({e['fts']}) VALUES ('rebuild')")
+        db.execute(f"INSERT INTO {e['fts']} ({e['fts']}) VALUES ('optimize')")
+    db.commit()
+    reconstruir_facturas(db, esquemas)
+
+
+def asegurar_indices(db, esquemas=("main",)):
+    """Llena los índices FTS si no cubren la tabla base (BD existente o recién migrada).
+
+    `esquemas` se recorre solo si hay que reconstruir el de facturas.
+    """
+    for e in ENTIDADES.values():
+        fts, tabla = e["fts"], e["tabla"]
+        indexadas = db.execute(f"SELECT COUNT(*) FROM {fts}_docsize").fetchone()[0]
+        filas = db.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+        if indexadas != filas:
+            db.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+    db.commit()
+    activas, archivadas = db.execute("SELECT COUNT(*) FILTER (WHERE id > 0), COUNT(*) FILTER (WHERE id < 0) "
+                                     "FROM FACTURA_FTS_docsize").fetchone()
+    if (activas != db.execute("SELECT COUNT(*) FROM FACTURA").fetchone()[0]
+            or archivadas != db.execute("SELECT COUNT(*) FROM FACTURA_ARCHIVADA").fetchone()[0]):
+        reconstruir_facturas(db, esquemas)
+    else:
+        sincronizar_facturas(db)
@@ -0,0 +1,153 @@
+"""Caché de PDFs de facturas direccionada por contenido.
+
+La clave es un hash del NFAC más las filas de cabecera y detalle que se
+dibujan, así que cualquier cambio en CLIENTE, EMPRESA, VENDEDOR, PRODUCTO o
+DETALLE_FACTURA produce otra clave y la entrada anterior queda invalidada.
+Dos niveles: LRU en memoria y archivos en disco con tope de tamaño.
+
+Los topes y la contabilidad son de cada proceso: con varios workers
+compartiendo `directorio`, el disco puede llegar a N veces `max_disco`
+(cada worker solo recorta los archivos que conoce). Dimensione
+PDF_CACHE_DISCO como límite por worker.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+VERSION_DIBUJO = "2"  # subir cuando cambie el diseño del PDF
+
+
+def _valores(fila):
+    return tuple(fila.values()) if isinstance(fila, dict) else tuple(fila)
+
+
+def firma_factura(cab, det, *extra):
+    """Hash estable de lo que se va a dibujar (dict, sqlite3.Row o tuplas)."""
+    h = hashlib.sha256(VERSION_DIBUJO.encode())
+    for parte in (_valores(cab), *(_valores(r) for r in det), extra):
+        h.update(repr(parte).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class CachePDF:
+    def __init__(self, directorio, max_memoria=32 * 1024 * 1024, max_disco=512 * 1024 * 1024,
+                 max_facturas=100_000):
+        self.directorio = directorio
+        self.max_memoria = max_memoria
+        self.max_disco = max_disco
+        self.max_facturas = max_facturas
+        self._lock = threading.Lock()
+        self._mem = OrderedDict()    # clave -> bytes
+        self._mem_bytes = 0
+        self._disco = OrderedDict()  # clave -> tamaño, del menos al más usado
+        self._disco_bytes = 0
+        self._por_nfac = OrderedDict()  # nfac -> clave vigente, LRU con tope max_facturas
+        self.stats = {"aciertos_memoria": 0, "aciertos_disco": 0, "fallos": 0,
+                      "desalojos_memoria": 0, "desalojos_disco": 0, "invalidaciones": 0}
+        os.makedirs(directorio, exist_ok=True)
+        # Recuperar lo que ya estaba en disco (más antiguo primero)
+        archivos = []
+        for nombre in os.listdir(directorio):
+            if nombre.endswith(".pdf"):
+                st = os.stat(os.path.join(directorio, nombre))
+                archivos.append((st.st_mtime, nombre[:-4], st.st_size))
+        for _, clave, tam in sorted(archivos):
+            self._disco[clave] = tam
+            self._disco_bytes += tam
+        self._recortar_disco()
+
+    @staticmethod
+    def clave(nfac, firma):
+        return hashlib.sha256(f"{nfac}\x00{firma}".encode("utf-8")).hexdigest()
+
+    def ruta(self, clave):
+        return os.path.join(self.directorio, clave + ".pdf")
+
+    def obtener(self, nfac, firma):
+        """Devuelve bytes (memoria), un archivo ya abierto en modo binario (disco) o None.
+
+        El archivo se abre bajo el lock: aunque otro hilo lo desaloje o
+        invalide justo después, el descriptor abierto sigue siendo legible.
+        Quien lo recibe debe cerrarlo.
+        """
+        clave = self.clave(nfac, firma)
+        with self._lock:
+            self._reemplazar(nfac, clave)
+            if clave in self._mem:
+                self._mem.move_to_end(clave)
+                self.stats["aciertos_memoria"] += 1
+                return self._mem[clave]
+            if clave in self._disco:
+                try:
+                    fh = open(self.ruta(clave), "rb")
+                except FileNotFoundError:
+                    self._disco_bytes -= self._disco.pop(clave)  # lo borró otro proceso
+                else:
+                    self._disco.move_to_end(clave)
+                    self.stats["aciertos_disco"] += 1
+                    return fh
+            self.stats["fallos"] += 1
+            return None
+
+    def guardar(self, nfac, firma, datos):
+        clave = self.clave(nfac, firma)
+        tmp = self.ruta(clave) + f".{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(datos)
+        os.replace(tmp, self.ruta(clave))  # atómico: nunca se sirve un PDF a medias
+        with self._lock:
+            self._reemplazar(nfac, clave)
+            if clave not in self._disco:
+                self._disco[clave] = len(datos)
+                self._disco_bytes += len(datos)
+            self._recortar_disco()
+            if len(datos) <= self.max_memoria and clave not in self._mem:
+                self._mem[clave] = datos
+                self._mem_bytes += len(datos)
+                while self._mem_bytes > self.max_memoria:
+                    _, viejo = self._mem.popitem(last=False)
+                    self._mem_bytes -= len(viejo)
+                    self.stats["desalojos_memoria"] += 1
+
+    def _reemplazar(self, nfac, clave):
+        """Si los datos de la factura cambiaron, descarta la versión anterior."""
+        previa = self._por_nfac.get(nfac)
+        self._por_nfac[nfac] = clave
+        self._por_nfac.move_to_end(nfac)
+        if len(self._por_nfac) > self.max_facturas:
+            # Se olvida la factura menos consultada: su entrada, si la hay, sale por LRU
+            self._por_nfac.popitem(last=False)
+        if previa is None or previa == clave:
+            return
+        self.stats["invalidaciones"] += 1
+        datos = self._mem.pop(previa, None)
+        if datos is not None:
+            self._mem_bytes -= len(datos)
+        if previa in self._disco:
+            self._disco_bytes -= self._disco.pop(previa)
+            self._borrar(previa)
+
+    def _recortar_disco(self):
+        while self._disco_bytes > self.max_disco and self._disco:
+            clave, tam = self._disco.popitem(last=False)
+            self._disco_bytes -= tam
+            self.stats["desalojos_disco"] += 1
+            self._borrar(clave)
+
+    def _borrar(self, clave):
+        try:
+            os.remove(self.ruta(clave))
+        except OSError:
+            pass
+
+    def resumen(self):
+        with self._lock:
+            s = dict(self.stats)
+            s.update(entradas_memoria=len(self._mem), bytes_memoria=self._mem_bytes,
+                     entradas_disco=len(self._disco), bytes_disco=self._disco_bytes,
+                     max_memoria=self.max_memoria, max_disco=self.max_disco)
+        consultas = s["aciertos_memoria"] + s["aciertos_disco"] + s["fallos"]
+        s["tasa_aciertos"] = round((consultas - s["fallos"]) / consultas, 4) if consultas else 0.0
+        return s
@@ -0,0 +1,168 @@
+"""Generador de datos sintéticos para pruebas de carga.
+
+Con escala 1: 1 000 clientes, 500 productos, 20 vendedores y 10 000 facturas
+(~5,5 líneas por factura). Todo crece linealmente con la escala (escala 100
+= 1 millón de facturas). Distribuciones:
+  - clientes y productos con popularidad tipo Zipf (pocos concentran mucho),
+  - fechas en `dias` días hacia atrás, con menos ventas el fin de semana,
+  - 1 a 12 líneas por factura (la mayoría entre 2 y 6),
+  - descuento 0 % en el 80 % de las facturas, 5/10/15 % en el resto.
+La misma semilla produce siempre los mismos datos. Los códigos continúan
+tras los que ya generó una corrida anterior, así que se puede volver a
+correr sobre la misma BD para sumar más datos.
+"""
+import os
+import random
+import re
+from bisect import bisect
+from datetime import date, timedelta
+from itertools import accumulate
+
+from lote_facturas import calcular_totales
+
+_B36 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+NOMBRES = ("Ana", "Luis", "María", "Jorge", "Rosa", "Carlos", "Lucía", "Pedro", "Elena", "José",
+           "Carmen", "Miguel", "Julia", "Raúl", "Sofía", "Diego", "Teresa", "Andrés", "Paula", "Óscar")
+APELLIDOS = ("Pérez", "Soto", "Quispe", "Mamani", "Flores", "Rojas", "Torres", "Huamán", "Vargas",
+             "Chávez", "Ramos", "Castillo", "Mendoza", "Gutiérrez", "Salazar", "Cáceres")
+CALLES = ("Av. Ejército", "Calle Mercaderes", "Av. Goyeneche", "Jr. Unión", "Av. Parra", "Calle Jerusalén")
+DISTRITOS = ("Cercado", "Cayma", "Yanahuara", "Miraflores", "Paucarpata", "Cerro Colorado")
+ARTICULOS = ("Cuaderno", "Folder", "Archivador", "Lapicero", "Lápiz", "Borrador", "Plumón", "Resaltador",
+             "Regla", "Tijera", "Goma", "Cartulina", "Papel bond", "Sobre", "Corrector", "Grapas")
+VARIANTES = ("A4", "A5", "oficio", "azul", "negro", "rojo", "x12", "x24", "100 hojas", "50 hojas",
+             "escolar", "profesional", "metálico", "plástico", "reciclado")
+UNIDADES = ("pza", "caja", "paq", "doc", "millar")
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "schema.sql")
+
+# Triggers de datos derivados (resúmenes, conteos, FTS, versiones): se
+# recalculan en bloque al final. Los de años cerrados se quedan puestos.
+_DERIVADOS = re.compile(r"_(RES|CNT|FTS|FACFTS|VER)_")
+
+
+def _codigo(prefijo, n, ancho):
+    s = ""
+    while True:
+        n, r = divmod(n, 36)
+        s = _B36[r] + s
+        if not n:
+            break
+    return prefijo + s.rjust(ancho, "0")
+
+
+def _desde(db, tabla, columna, prefijo, ancho):
+    """Primer número libre tras los códigos `prefijo` + `ancho` dígitos base 36 ya usados."""
+    ultimo = db.execute(f"SELECT MAX({columna}) FROM {tabla} WHERE {columna} GLOB ?",
+                        (prefijo + "[0-9A-Z]" * ancho,)).fetchone()[0]
+    return int(ultimo[len(prefijo):], 36) + 1 if ultimo else 0
+
+
+def _zipf(n, s=1.1):
+    """Pesos acumulados tipo Zipf para elegir con bisect en O(log n)."""
+    return list(accumulate(1.0 / (i + 1) ** s for i in range(n)))
+
+
+def _elegir(rng, acumulados):
+    return bisect(acumulados, rng.random() * acumulados[-1])
+
+
+def _por_bloques(gen, tam):
+    bloque = []
+    for x in gen:
+        bloque.append(x)
+        if len(bloque) >= tam:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+
+def generar(db, escala=1.0, semilla=42, dias=730, igv_tasa=0.18, tam_bloque=20000, avance=None):
+    """Llena la BD abierta en `db`. Devuelve un dict con los conteos insertados.
+
+    Para cargas grandes se quitan los triggers de datos derivados durante la
+    inserción y al final (también si algo falla) se recrean con schema.sql;
+    quien llama debe reconstruir resúmenes e índices FTS (lo hace el comando
+    `generar-datos` de app.py). Las fechas no entran en años ya cerrados.
+    """
+    rng = random.Random(semilla)
+    n_cli = max(10, int(1000 * escala))
+    n_prod = max(10, int(500 * escala))
+    n_vend = max(2, int(20 * escala))
+    n_fac = max(10, int(10000 * escala))
+    avance = avance or (lambda msg: None)
+
+    # Corridas anteriores: se sigue numerando desde donde quedaron
+    ini_cli = _desde(db, "CLIENTE", "CODI", "K", 5)
+    ini_prod = _desde(db, "PRODUCTO", "CODT", "Q", 5)
+    ini_vend = _desde(db, "VENDEDOR", "CODV", "S", 4)
+    ini_fac = max(_desde(db, "FACTURA", "NFAC", "G", 9), _desde(db, "FACTURA_ARCHIVADA", "NFAC", "G", 9))
+
+    clientes = [_codigo("K", i, 5) for i in range(ini_cli, ini_cli + n_cli)]
+    db.executemany("INSERT INTO CLIENTE (CODI,DNI,NOMB,APEL,TELF,EMAIL,CALLE,DIST,CIUD) VALUES (?,?,?,?,?,?,?,?,?)",
+                   ((c, str(20000000 + i), rng.choice(NOMBRES), f"{rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}",
+                     str(900000000 + i), f"cliente{i}@demo.pe", f"{rng.choice(CALLES)} {rng.randint(1, 999)}",
+                     rng.choice(DISTRITOS), "Arequipa") for i, c in enumerate(clientes, start=ini_cli)))
+    vendedores = [_codigo("S", i, 4) for i in range(ini_vend, ini_vend + n_vend)]
+    db.executemany("INSERT INTO VENDEDOR (CODV,NOMB,APEL) VALUES (?,?,?)",
+                   ((v, rng.choice(NOMBRES), rng.choice(APELLIDOS)) for v in vendedores))
+    productos, precios = [], []
+    filas = []
+    for i in range(ini_prod, ini_prod + n_prod):
+        codt = _codigo("Q", i, 5)
+        prec = round(rng.lognormvariate(1.6, 0.9), 1) + 0.5  # mayoría entre S/ 2 y S/ 20
+        productos.append(codt)
+        precios.append(prec)
+        filas.append((codt, f"{rng.choice(ARTICULOS)} {rng.choice(VARIANTES)} {codt}", rng.choice(UNIDADES), prec))
+    db.executemany("INSERT INTO PRODUCTO (CODT,NOMB,UNID,PREC) VALUES (?,?,?,?)", filas)
+    db.commit()
+    avance(f"{n_cli} clientes, {n_prod} productos, {n_vend} vendedores")
+
+    pesos_cli, pesos_prod = _zipf(n_cli, 0.9), _zipf(n_prod)
+    hoy = date.today()
+    cerrado = db.execute("SELECT MAX(HASTA) FROM PARTICION").fetchone()[0]
+    fechas = [f for f in (hoy - timedelta(days=d) for d in range(dias))
+              if cerrado is None or f.isoformat() > cerrado] or [hoy]
+    pesos_fecha = list(accumulate(0.4 if f.weekday() >= 5 else 1.0 for f in fechas))
+    lineas_por_fac = list(accumulate((2, 6, 10, 12, 12, 10, 8, 6, 4, 3, 2, 1)))
+
+    def facturas():
+        for i in range(ini_fac, ini_fac + n_fac):
+            fec = fechas[_elegir(rng, pesos_fecha)]
+            n_lin = _elegir(rng, lineas_por_fac) + 1
+            cants = {}
+            for _ in range(n_lin):
+                p = _elegir(rng, pesos_prod)
+                cants[p] = cants.get(p, 0) + rng.choice((1, 1, 1, 2, 2, 3, 5, 10))
+            nfac = _codigo("G", i, 9)
+            lineas = [(nfac, productos[p], c, round(precios[p] * c, 2)) for p, c in cants.items()]
+            subtot = sum(l[3] for l in lineas)
+            pct = 0 if rng.random() < 0.8 else rng.choice((5, 10, 15))
+            desc_v, igv, tot = calcular_totales(subtot, pct, igv_tasa)
+            fecven = (fec + timedelta(days=rng.choice((0, 7, 15, 30)))).isoformat()
+            cab = (nfac, fec.isoformat(), fecven, desc_v, igv, tot,
+                   clientes[_elegir(rng, pesos_cli)], "E0001", vendedores[rng.randrange(n_vend)])
+            yield cab, lineas
+
+    triggers = [r[0] for r in db.execute("SELECT name FROM sqlite_master WHERE type='trigger'")
+                if _DERIVADOS.search(r[0])]
+    for t in triggers:
+        db.execute(f"DROP TRIGGER {t}")
+    db.commit()
+    n_lin = 0
+    try:
+        for n, bloque in enumerate(_por_bloques(facturas(), tam_bloque), start=1):
+            db.executemany('INSERT INTO FACTURA (NFAC,FECEM,FECVEN,"DESC",IGV,TOTFAC,CODI,EMPR,CODV) '
+                           'VALUES (?,?,?,?,?,?,?,?,?)', (c for c, _ in bloque))
+            lineas = [l for _, ls in bloque for l in ls]
+            db.executemany("INSERT INTO DETALLE_FACTURA (NFAC,CODT,CANT,PRECLI) VALUES (?,?,?,?)", lineas)
+            db.commit()
+            n_lin += len(lineas)
+            avance(f"{min(n * tam_bloque, n_fac)}/{n_fac} facturas")
+    finally:
+        db.commit()
+        with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
+            db.executescript(f.read())
+    return {"clientes": n_cli, "productos": n_prod, "vendedores": n_vend,
+            "facturas": n_fac, "lineas": n_lin, "triggers_quitados": len(triggers)}
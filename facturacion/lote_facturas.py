@@ -0,0 +1,223 @@
+"""Carga masiva de facturas (JSON lines o CSV) para los terminales POS.
+
+Formato JSON lines, una factura por línea:
+    {"NFAC": "F000000101", "FECEM": "2025-09-10", "FECVEN": "2025-09-20",
+     "CODI": "C00001", "CODV": "V0001", "DESCPCT": 5,
+     "items": [{"CODT": "P00001", "CANT": 2}, ...]}
+
+Formato CSV, una línea de detalle por fila (las filas de una misma factura
+van seguidas):
+    NFAC,FECEM,FECVEN,CODI,CODV,DESCPCT,CODT,CANT
+"""
+import csv
+import io
+import json
+import math
+import sqlite3
+from datetime import date
+from itertools import islice
+
+TAM_LOTE = 5000  # facturas por transacción
+
+
+def calcular_totales(subtot, des_pct, igv_tasa):
+    """Misma regla que el formulario: descuento (%) sobre el subtotal, IGV sobre la base."""
+    desc_v = round(max(0.0, subtot) * (des_pct / 100.0), 2)
+    base = max(0.0, round(subtot - desc_v, 2))
+    igv = round(base * igv_tasa, 2)
+    tot = round(base + igv, 2)
+    return desc_v, igv, tot
+
+
+# ---------- Lectores ----------
+def leer_jsonl(stream):
+    """Genera (nro_linea, registro) desde un stream de texto JSON lines."""
+    for n, linea in enumerate(stream, start=1):
+        linea = linea.strip()
+        if not linea:
+            continue
+        try:
+            reg = json.loads(linea)
+        except ValueError as e:
+            yield n, {"_error": f"JSON inválido: {e}"}
+            continue
+        if not isinstance(reg, dict):
+            reg = {"_error": "Se esperaba un objeto JSON por línea."}
+        yield n, reg
+
+
+def leer_csv(stream):
+    """Genera (nro_linea, registro) agrupando filas consecutivas con el mismo NFAC."""
+    actual, inicio = None, None
+    for n, fila in enumerate(csv.DictReader(stream), start=2):
+        fila = {k.strip(): (v or "").strip() for k, v in fila.items() if k}
+        if actual is not None and fila.get("NFAC") == actual["NFAC"]:
+            actual["items"].append({"CODT": fila.get("CODT"), "CANT": fila.get("CANT")})
+            continue
+        if actual is not None:
+            yield inicio, actual
+        inicio = n
+        actual = {k: fila.get(k) for k in ("NFAC", "FECEM", "FECVEN", "CODI", "CODV", "DESCPCT")}
+        actual["items"] = [{"CODT": fila.get("CODT"), "CANT": fila.get("CANT")}]
+    if actual is not None:
+        yield inicio, actual
+
+
+def leer_archivo(stream, formato):
+    """`stream` binario o de texto; `formato` es 'jsonl' o 'csv'."""
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if formato == "csv":
+        return leer_csv(stream)
+    return leer_jsonl(stream)
+
+
+# ---------- Validación e inserción ----------
+def _existentes(db, sql, claves):
+    """Consulta por conjunto (una sola sentencia) vía json_each, sin límite de parámetros."""
+    if not claves:
+        return {}
+    return {r[0]: r for r in db.execute(sql, (json.dumps(list(claves)),))}
+
+
+def _validar(reg, precios, clientes, vendedores, ya_existen, vistos, igv_tasa):
+    """Devuelve (fila_factura, lineas) o lanza ValueError con el motivo."""
+    if "_error" in reg:
+        raise ValueError(reg["_error"])
+    nfac = str(reg.get("NFAC") or "").strip()
+    if not nfac or len(nfac) > 10:
+        raise ValueError("NFAC obligatorio (máx. 10 caracteres).")
+    if nfac in vistos:
+        raise ValueError(f"NFAC {nfac} repetido en el lote.")
+    if nfac in ya_existen:
+        raise ValueError(f"NFAC {nfac} ya registrado.")
+
+    fecem = str(reg.get("FECEM") or "").strip() or date.today().isoformat()
+    fecven = str(reg.get("FECVEN") or "").strip() or None
+    try:
+        # Se guarda la forma canónica: fromisoformat también acepta
+        # "20260915" o "2025-W01-1", que romperían el orden por fecha.
+        fecem = date.fromisoformat(fecem).isoformat()
+        if fecven:
+            fecven = date.fromisoformat(fecven).isoformat()
+    except ValueError:
+        raise ValueError("Fecha inválida (use AAAA-MM-DD).")
+
+    codi = str(reg.get("CODI") or "").strip()
+    codv = str(reg.get("CODV") or "").strip()
+    if codi not in clientes:
+        raise ValueError(f"Cliente {codi!r} no existe.")
+    if codv not in vendedores:
+        raise ValueError(f"Vendedor {codv!r} no existe.")
+
+    try:
+        des_pct = float(reg.get("DESCPCT") or 0)
+    except (TypeError, ValueError):
+        raise ValueError("DESCPCT inválido.")
+    if not math.isfinite(des_pct) or des_pct < 0 or des_pct > 100:
+        raise ValueError("Descuento (%) inválido. Debe estar entre 0 y 100.")
+
+    items = reg.get("items") or []
+    if not isinstance(items, list) or not all(isinstance(it, dict) for it in items):
+        raise ValueError('"items" debe ser una lista de objetos {"CODT": ..., "CANT": ...}.')
+    cantidades = {}
+    for it in items:
+        codt = str(it.get("CODT") or "").strip()
+        try:
+            cant = int(it.get("CANT") or 0)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f"Cantidad inválida para {codt!r}.")
+        if cant <= 0:
+            raise ValueError(f"Cantidad inválida para {codt!r}.")
+        if codt not in precios:
+            raise ValueError(f"Producto {codt!r} no existe.")
+        # El detalle tiene PK (NFAC, CODT): se acumulan líneas repetidas
+        cantidades[codt] = cantidades.get(codt, 0) + cant
+    if not cantidades:
+        raise ValueError("Debe tener al menos un producto.")
+
+    subtot = 0.0
+    lineas = []
+    for codt, cant in cantidades.items():
+        precli = round(float(precios[codt]) * cant, 2)
+        subtot += precli
+        lineas.append((nfac, codt, cant, precli))
+    desc_v, igv, tot = calcular_totales(subtot, des_pct, igv_tasa)
+    return (nfac, fecem, fecven, desc_v, igv, tot, codi, "E0001", codv), lineas
+
+
+def _insertar(db, cabeceras, detalles):
+    db.executemany("""INSERT INTO FACTURA
+                (NFAC,FECEM,FECVEN,"DESC",IGV,TOTFAC,CODI,EMPR,CODV)
+                VALUES (?,?,?,?,?,?,?,?,?)""", cabeceras)
+    db.executemany("""INSERT INTO DETALLE_FACTURA (NFAC,CODT,CANT,PRECLI)
+                    VALUES (?,?,?,?)""", detalles)
+
+
+def _procesar_lote(db, lote, igv_tasa, resultado):
+    regs = [r for _, r in lote if "_error" not in r]
+    nfacs = {str(r.get("NFAC") or "").strip() for r in regs}
+    codts = {str(it.get("CODT") or "").strip()
+             for r in regs if isinstance(r.get("items"), list) for it in r["items"] if isinstance(it, dict)}
+
+    # Una consulta por tabla para todo el lote (en vez de una por línea)
+    precios = {k: r[1] for k, r in _existentes(
+        db, "SELECT CODT, PREC FROM PRODUCTO WHERE CODT IN (SELECT value FROM json_each(?))", codts).items()}
+    clientes = _existentes(
+        db, "SELECT CODI FROM CLIENTE WHERE CODI IN (SELECT value FROM json_each(?))",
+        {str(r.get("CODI") or "").strip() for r in regs})
+    vendedores = _existentes(
+        db, "SELECT CODV FROM VENDEDOR WHERE CODV IN (SELECT value FROM json_each(?))",
+        {str(r.get("CODV") or "").strip() for r in regs})
+    ya_existen = _existentes(
+        db, "SELECT NFAC FROM FACTURA WHERE NFAC IN (SELECT value FROM json_each(?))", nfacs)
+
+    validas = []  # (nro_linea, cabecera, lineas)
+    vistos = set()
+    for n, reg in lote:
+        try:
+            cab, lineas = _validar(reg, precios, clientes, vendedores, ya_existen, vistos, igv_tasa)
+        except ValueError as e:
+            resultado["errores"].append({"linea": n, "NFAC": reg.get("NFAC"), "error": str(e)})
+            continue
+        vistos.add(cab[0])
+        validas.append((n, cab, lineas))
+
+    if not validas:
+        return
+    try:
+        _insertar(db, [v[1] for v in validas], [l for v in validas for l in v[2]])
+        db.commit()
+        resultado["insertadas"] += len(validas)
+    except sqlite3.IntegrityError:
+        # Otro proceso insertó algo en paralelo: se reintenta factura por factura
+        db.rollback()
+        for n, cab, lineas in validas:
+            try:
+                db.execute("SAVEPOINT fac")
+                _insertar(db, [cab], lineas)
+                db.execute("RELEASE fac")
+                resultado["insertadas"] += 1
+            except sqlite3.IntegrityError as e:
+                db.execute("ROLLBACK TO fac")
+                db.execute("RELEASE fac")
+                resultado["errores"].append({"linea": n, "NFAC": cab[0], "error": f"Error: {e}"})
+        db.commit()
+
+
+def importar_facturas(db, registros, igv_tasa, tam_lote=TAM_LOTE):
+    """Valida e inserta facturas en transacciones de `tam_lote` facturas.
+
+    `registros` es un iterable de (nro_linea, dict) como el que devuelven
+    los lectores. Las filas con error no detienen la carga: se informan en
+    `errores` con su número de línea.
+    """
+    resultado = {"insertadas": 0, "errores": []}
+    it = iter(registros)
+    while True:
+        lote = list(islice(it, tam_lote))
+        if not lote:
+            break
+        _procesar_lote(db, lote, igv_tasa, resultado)
+    resultado["rechazadas"] = len(resultado["errores"])
+    return resultado
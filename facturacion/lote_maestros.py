@@ -0,0 +1,177 @@
+"""Carga masiva de clientes, productos y vendedores (CSV o JSON lines).
+
+Aplica las mismas reglas que los formularios de alta, pero por lotes: los
+duplicados se buscan en memoria (dentro del archivo) y contra la BD con una
+consulta por clave y lote, y se inserta con executemany en una transacción
+por lote. Las filas rechazadas se informan con su número de línea.
+"""
+import csv
+import io
+import json
+import sqlite3
+from itertools import islice
+
+from lote_facturas import leer_jsonl
+from validaciones import _not_empty, valid_dni, valid_telf, valid_email, valid_precio, valid_unidad
+
+TAM_LOTE = 10000
+
+
+def _lower(s):
+    """Igual que lower() de SQLite: solo pliega ASCII (así cuadra con el índice)."""
+    return "".join(c.lower() if c.isascii() else c for c in s)
+
+
+def _texto(reg, campo):
+    return str(reg.get(campo) or "").strip()
+
+
+# ---------- Reglas por entidad ----------
+def _cliente(reg):
+    CODI, DNI, NOMB, APEL, TELF, EMAIL, CALLE, DIST, CIUD = (
+        _texto(reg, k) for k in ("CODI", "DNI", "NOMB", "APEL", "TELF", "EMAIL", "CALLE", "DIST", "CIUD"))
+    if not _not_empty(CODI, DNI, NOMB, APEL):
+        raise ValueError("CODI, DNI, NOMB y APEL son obligatorios.")
+    if not valid_dni(DNI):
+        raise ValueError("DNI inválido (8 dígitos).")
+    if TELF and not valid_telf(TELF):
+        raise ValueError("Teléfono inválido (6–15 dígitos).")
+    if EMAIL and not valid_email(EMAIL):
+        raise ValueError("Email inválido.")
+    # Vacíos como NULL: con UNIQUE, dos '' chocarían entre sí
+    return (CODI, DNI, NOMB, APEL, TELF or None, EMAIL or None, CALLE, DIST, CIUD)
+
+
+def _producto(reg):
+    CODT, NOMB, UNID, PREC = (_texto(reg, k) for k in ("CODT", "NOMB", "UNID", "PREC"))
+    if not _not_empty(CODT, NOMB, UNID, PREC):
+        raise ValueError("CODT, NOMB, UNID y PREC son obligatorios.")
+    if not valid_unidad(UNID):
+        raise ValueError("UNID inválida (1–10 caracteres).")
+    if not valid_precio(PREC):
+        raise ValueError("PREC inválido (número ≥ 0).")
+    return (CODT, NOMB, UNID, float(PREC))
+
+
+def _vendedor(reg):
+    CODV, NOMB, APEL = (_texto(reg, k) for k in ("CODV", "NOMB", "APEL"))
+    if not _not_empty(CODV, NOMB, APEL):
+        raise ValueError("CODV, NOMB y APEL son obligatorios.")
+    return (CODV, NOMB, APEL)
+
+
+# Cada clave única: (etiqueta, función sobre la fila validada, consulta por conjunto).
+# La consulta recibe un arreglo JSON con los valores del lote y devuelve los que ya existen.
+ENTIDADES = {
+    "clientes": {
+        "clave": "CODI",
+        "validar": _cliente,
+        "insert": """INSERT INTO CLIENTE (CODI,DNI,NOMB,APEL,TELF,EMAIL,CALLE,DIST,CIUD)
+                     VALUES (?,?,?,?,?,?,?,?,?)""",
+        "unicos": [
+            ("CODI", lambda f: f[0],
+             "SELECT CODI FROM CLIENTE WHERE CODI IN (SELECT value FROM json_each(?))"),
+            ("DNI", lambda f: f[1],
+             "SELECT DNI FROM CLIENTE WHERE DNI IN (SELECT value FROM json_each(?))"),
+            ("Teléfono", lambda f: f[4],
+             "SELECT TELF FROM CLIENTE WHERE TELF IN (SELECT value FROM json_each(?))"),
+            ("Email", lambda f: f[5],
+             "SELECT EMAIL FROM CLIENTE WHERE EMAIL IN (SELECT value FROM json_each(?))"),
+        ],
+    },
+    "productos": {
+        "clave": "CODT",
+        "validar": _producto,
+        "insert": "INSERT INTO PRODUCTO (CODT,NOMB,UNID,PREC) VALUES (?,?,?,?)",
+        "unicos": [
+            ("CODT", lambda f: f[0],
+             "SELECT CODT FROM PRODUCTO WHERE CODT IN (SELECT value FROM json_each(?))"),
+            # Usa el índice de expresión I_PROD_NOMB_LOWER
+            ("Nombre de producto", lambda f: _lower(f[1]),
+             "SELECT lower(NOMB) FROM PRODUCTO WHERE lower(NOMB) IN (SELECT value FROM json_each(?))"),
+        ],
+    },
+    "vendedores": {
+        "clave": "CODV",
+        "validar": _vendedor,
+        "insert": "INSERT INTO VENDEDOR (CODV,NOMB,APEL) VALUES (?,?,?)",
+        "unicos": [
+            ("CODV", lambda f: f[0],
+             "SELECT CODV FROM VENDEDOR WHERE CODV IN (SELECT value FROM json_each(?))"),
+        ],
+    },
+}
+
+
+def leer_archivo(stream, formato):
+    """Genera (nro_linea, registro) desde CSV o JSON lines (stream binario o de texto)."""
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if formato == "csv":
+        return ((n, {k.strip(): v for k, v in fila.items() if k})
+                for n, fila in enumerate(csv.DictReader(stream), start=2))
+    return leer_jsonl(stream)
+
+
+def _procesar_lote(db, ent, lote, resultado):
+    validas = []  # (nro_linea, fila)
+    for n, reg in lote:
+        try:
+            if "_error" in reg:
+                raise ValueError(reg["_error"])
+            validas.append((n, ent["validar"](reg)))
+        except ValueError as e:
+            resultado["errores"].append({"linea": n, "clave": reg.get(ent["clave"]), "error": str(e)})
+
+    # Duplicados: primero contra la BD (una consulta por clave), luego dentro del archivo
+    for etiqueta, clave, sql in ent["unicos"]:
+        valores = {clave(f) for _, f in validas if clave(f) is not None}
+        en_bd = {r[0] for r in db.execute(sql, (json.dumps(list(valores)),))} if valores else set()
+        vistos = set()
+        quedan = []
+        for n, f in validas:
+            k = clave(f)
+            if k is not None and (k in en_bd or k in vistos):
+                motivo = "ya registrado" if k in en_bd else "repetido en el archivo"
+                resultado["errores"].append({"linea": n, "clave": f[0], "error": f"{etiqueta} {motivo}."})
+                continue
+            if k is not None:
+                vistos.add(k)
+            quedan.append((n, f))
+        validas = quedan
+
+    if not validas:
+        return
+    try:
+        db.executemany(ent["insert"], [f for _, f in validas])
+        db.commit()
+        resultado["insertados"] += len(validas)
+    except sqlite3.IntegrityError:
+        # Carrera con otra carga o restricción no prevista: fila por fila
+        db.rollback()
+        for n, f in validas:
+            try:
+                db.execute("SAVEPOINT fila")
+                db.execute(ent["insert"], f)
+                db.execute("RELEASE fila")
+                resultado["insertados"] += 1
+            except sqlite3.IntegrityError as e:
+                db.execute("ROLLBACK TO fila")
+                db.execute("RELEASE fila")
+                resultado["errores"].append({"linea": n, "clave": f[0], "error": f"Violación de unicidad: {e}"})
+        db.commit()
+
+
+def importar(db, entidad, registros, tam_lote=TAM_LOTE):
+    """Carga `registros` ((nro_linea, dict) iterable) en la tabla de `entidad`."""
+    ent = ENTIDADES[entidad]
+    resultado = {"insertados": 0, "errores": []}
+    it = iter(registros)
+    while True:
+        lote = list(islice(it, tam_lote))
+        if not lote:
+            break
+        _procesar_lote(db, ent, lote, resultado)
+    resultado["errores"].sort(key=lambda e: e["linea"])
+    resultado["rechazados"] = len(resultado["errores"])
+    return resultado
@@ -0,0 +1,177 @@
+"""Métricas en formato de texto de Prometheus y medición de SQL por petición.
+
+Son métricas por proceso: con varios workers, Prometheus debe raspar cada uno
+(o sumar por instancia), como con cualquier exportador en proceso.
+"""
+import re
+import threading
+import time
+from collections import defaultdict
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONTEO = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _esc(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas(nombres, valores, extra=""):
+    partes = [f'{n}="{_esc(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _num(v):
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+
+    def cabecera(self):
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self._valores = defaultdict(float)
+
+    def inc(self, *etiquetas, n=1):
+        with self._lock:
+            self._valores[etiquetas] += n
+
+    def texto(self):
+        with self._lock:
+            items = sorted(self._valores.items())
+        return self.cabecera() + [f"{self.nombre}{_etiquetas(self.etiquetas, k)} {_num(v)}"
+                                  for k, v in items]
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(buckets)
+        self._series = {}  # etiquetas -> [conteos por bucket, suma, total]
+
+    def observar(self, valor, *etiquetas):
+        with self._lock:
+            s = self._series.get(etiquetas)
+            if s is None:
+                s = self._series[etiquetas] = [[0] * len(self.buckets), 0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if valor <= b:
+                    s[0][i] += 1
+            s[1] += valor
+            s[2] += 1
+
+    def texto(self):
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        lineas = self.cabecera()
+        for k, (conteos, suma, total) in items:
+            for b, c in zip(self.buckets, conteos):
+                le = 'le="%s"' % b
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, k, le)} {c}")
+            le = 'le="+Inf"'
+            lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, k, le)} {total}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, k)} {_num(suma)}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, k)} {total}")
+        return lineas
+
+
+class Indicador(_Metrica):
+    """Gauge cuyo valor se lee al exportar: `leer()` devuelve {etiquetas: valor}."""
+    tipo = "gauge"
+
+    def __init__(self, nombre, ayuda, leer, etiquetas=()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self._leer = leer
+
+    def texto(self):
+        return self.cabecera() + [f"{self.nombre}{_etiquetas(self.etiquetas, k)} {_num(v)}"
+                                  for k, v in sorted(self._leer().items())]
+
+
+class Registro:
+    def __init__(self):
+        self._metricas = []
+
+    def agregar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def texto(self):
+        lineas = []
+        for m in self._metricas:
+            lineas.extend(m.texto())
+        return "\n".join(lineas) + "\n"
+
+
+# ---------- SQL ----------
+_ESPACIOS = re.compile(r"\s+")
+
+
+def normalizar_sql(sql):
+    return _ESPACIOS.sub(" ", sql).strip()
+
+
+class ConexionMedida:
+    """Envuelve una conexión sqlite3 y anota cada sentencia en `registro`.
+
+    `registro` es una lista de [sql, segundos, params]; los params solo se
+    guardan si `con_params` (los usa el log de peticiones lentas). El tiempo
+    es el de execute(): incluye el primer paso de la consulta, no el resto
+    del fetch.
+    """
+
+    def __init__(self, conexion, registro, con_params=False):
+        self.conexion = conexion
+        self._registro = registro
+        self._con_params = con_params
+
+    def _medir(self, metodo, sql, *args):
+        t0 = time.perf_counter()
+        try:
+            return metodo(sql, *args)
+        finally:
+            params = args[0] if (self._con_params and args and metodo.__name__ == "execute") else None
+            self._registro.append([sql, time.perf_counter() - t0, params])
+
+    def execute(self, sql, *args):
+        return self._medir(self.conexion.execute, sql, *args)
+
+    def executemany(self, sql, *args):
+        return self._medir(self.conexion.executemany, sql, *args)
+
+    def executescript(self, sql):
+        return self._medir(self.conexion.executescript, sql)
+
+    def __getattr__(self, nombre):
+        return getattr(self.conexion, nombre)
+
+    def __setattr__(self, nombre, valor):
+        if nombre in ("conexion", "_registro", "_con_params"):
+            object.__setattr__(self, nombre, valor)
+        else:
+            setattr(self.conexion, nombre, valor)
+
+
+def repetidas(registro, umbral):
+    """Sentencias ejecutadas `umbral` o más veces en la misma petición (patrón N+1)."""
+    conteo = defaultdict(int)
+    for sql, _, _ in registro:
+        conteo[normalizar_sql(sql)] += 1
+    return {sql: n for sql, n in conteo.items() if n >= umbral}
@@ -0,0 +1,160 @@
+"""Numeración de facturas en el servidor y transacciones de escritura con reintento.
+
+Cada serie (tabla SERIE) lleva su último número emitido. Por defecto el
+número se toma dentro de la misma transacción BEGIN IMMEDIATE que inserta la
+factura: SQLite ya serializa a los escritores, así que el contador no añade
+espera, y si la factura falla el rollback devuelve el número (serie
+correlativa, sin huecos).
+
+Con `tam_bloque` > 1 cada proceso reserva bloques de números en una
+transacción corta aparte y los reparte desde memoria; los números que no
+llegan a usarse se reciclan dentro del proceso, pero los que quedan en el
+bloque al terminar el proceso se pierden (huecos). Los números que ya tienen
+factura (p. ej. importadas con NFAC propio) se saltan al reservar y, si
+aparecen después, al emitir; esos no se reciclan nunca.
+"""
+import heapq
+import random
+import sqlite3
+import threading
+import time
+
+_OCUPADA = {getattr(sqlite3, "SQLITE_BUSY", 5), getattr(sqlite3, "SQLITE_LOCKED", 6)}
+
+
+def _ocupada(e):
+    codigo = getattr(e, "sqlite_errorcode", None)
+    if codigo is not None:
+        return codigo & 0xFF in _OCUPADA
+    return "locked" in str(e) or "busy" in str(e)
+
+
+def transaccion_inmediata(db, funcion, intentos=5, espera=0.05):
+    """Corre `funcion(db)` en BEGIN IMMEDIATE y hace commit; devuelve su resultado.
+
+    BEGIN IMMEDIATE toma el candado de escritura al empezar, así que otra
+    escritura no puede invalidar la transacción a medio camino. Si la BD
+    sigue ocupada tras el busy_timeout de la conexión se reintenta hasta
+    `intentos` veces con espera exponencial (con azar, para no chocar en
+    sincronía); cualquier otro error se propaga tras el rollback.
+    """
+    for intento in range(1, intentos + 1):
+        if db.in_transaction:
+            db.commit()  # lo pendiente de antes no debe quedar dentro (ni perderse)
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            resultado = funcion(db)
+            db.commit()
+            return resultado
+        except sqlite3.OperationalError as e:
+            db.rollback()
+            if not _ocupada(e) or intento == intentos:
+                raise
+            time.sleep(espera * 2 ** (intento - 1) * (0.5 + random.random()))
+        except BaseException:
+            db.rollback()
+            raise
+
+
+class Numerador:
+    def __init__(self, conexion, tam_bloque=1):
+        """`conexion()`: context manager con una conexión propia (solo para reservar bloques)."""
+        self.conexion = conexion
+        self.tam_bloque = tam_bloque
+        self._bloques = {}   # serie -> números libres reservados, del último al siguiente
+        self._libres = {}    # serie -> heap de números devueltos
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def formatear(db, serie, numero):
+        ancho = db.execute("SELECT ANCHO FROM SERIE WHERE SERIE = ?", (serie,)).fetchone()[0]
+        return f"{serie}{numero:0{ancho - len(serie)}d}"
+
+    def _en_transaccion(self, db, serie):
+        # Salta números ya usados (p. ej. facturas importadas con esta serie)
+        while True:
+            fila = db.execute("UPDATE SERIE SET ULTIMO = ULTIMO + 1 WHERE SERIE = ? RETURNING ULTIMO, ANCHO",
+                              (serie,)).fetchone()
+            if fila is None:
+                raise ValueError(f"Serie desconocida: {serie}")
+            nfac = f"{serie}{fila[0]:0{fila[1] - len(serie)}d}"
+            if not db.execute("SELECT 1 FROM FACTURA WHERE NFAC = ?", (nfac,)).fetchone():
+                return nfac
+
+    def _reservar(self, serie):
+        """Reserva el siguiente bloque de `serie`; devuelve sus números libres en orden."""
+        def tx(db):
+            while True:
+                fila = db.execute("UPDATE SERIE SET ULTIMO = ULTIMO + ? WHERE SERIE = ? RETURNING ULTIMO, ANCHO",
+                                  (self.tam_bloque, serie)).fetchone()
+                if fila is None:
+                    raise ValueError(f"Serie desconocida: {serie}")
+                ultimo, ancho = fila
+                nfacs = {f"{serie}{n:0{ancho - len(serie)}d}": n
+                         for n in range(ultimo - self.tam_bloque + 1, ultimo + 1)}
+                # Mismo ancho con ceros: el orden de texto coincide con el numérico
+                usados = {r[0] for r in db.execute("SELECT NFAC FROM FACTURA WHERE NFAC BETWEEN ? AND ?",
+                                                   (min(nfacs), max(nfacs)))}
+                libres = [n for nfac, n in nfacs.items() if nfac not in usados]
+                if libres:
+                    return libres
+
+        with self.conexion() as db:
+            libres = transaccion_inmediata(db, tx)
+        libres.reverse()  # se reparten con pop() desde el final
+        return libres
+
+    def _del_bloque(self, serie):
+        with self._lock:
+            libres = self._libres.get(serie)
+            if libres:
+                return heapq.heappop(libres)
+            bloque = self._bloques.get(serie)
+            if not bloque:
+                bloque = self._bloques[serie] = self._reservar(serie)
+            return bloque.pop()
+
+    def _devolver(self, serie, numero):
+        with self._lock:
+            heapq.heappush(self._libres.setdefault(serie, []), numero)
+
+    def emitir(self, db, serie, insertar, intentos=5):
+        """Asigna el número de `serie` y corre `insertar(db, nfac)` en una sola transacción.
+
+        Devuelve el NFAC emitido. Si algo falla no se consume ningún número,
+        salvo en modo bloque cuando el fallo es de integridad: ese número se
+        descarta en lugar de volver a repartirse.
+        """
+        if self.tam_bloque <= 1:
+            def tx(db):
+                nfac = self._en_transaccion(db, serie)
+                insertar(db, nfac)
+                return nfac
+            return transaccion_inmediata(db, tx, intentos)
+
+        while True:
+            previo = self._del_bloque(serie)
+
+            def tx(db):
+                nfac = self.formatear(db, serie, previo)
+                if db.execute("SELECT 1 FROM FACTURA WHERE NFAC = ?", (nfac,)).fetchone():
+                    return None  # lo ocupó otro camino tras la reserva: se salta
+                insertar(db, nfac)
+                return nfac
+
+            try:
+                nfac = transaccion_inmediata(db, tx, intentos)
+            except sqlite3.IntegrityError:
+                raise  # el número se descarta: repartirlo otra vez volvería a fallar
+            except BaseException:
+                self._devolver(serie, previo)
+                raise
+            if nfac is not None:
+                return nfac
+
+    def resumen(self):
+        with self._lock:
+            return {"tam_bloque": self.tam_bloque,
+                    "bloques": {s: {"siguiente": b[-1], "hasta": b[0], "pendientes": len(b)}
+                                for s, b in self._bloques.items() if b},
+                    "devueltos": {s: len(h) for s, h in self._libres.items() if h}}
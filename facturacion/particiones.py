@@ -0,0 +1,233 @@
+"""Archivo de años cerrados: FACTURA y DETALLE_FACTURA por año en BD aparte.
+
+`archivar` copia las facturas de un año a `facturas_<año>.db` en el
+directorio de archivo y las borra de la BD activa, que queda con los años
+abiertos. Las BD históricas no vuelven a cambiar: se adjuntan en solo lectura
+(ATTACH ... mode=ro) a la conexión que las necesita, la primera vez que una
+consulta cae en su rango de fechas, con el esquema `hist_<año>`.
+
+Los años se archivan del más antiguo al más nuevo, así todo lo archivado es
+anterior a todo lo activo y recorrer las particiones en orden equivale a
+recorrer las facturas por fecha: el listado lee la BD activa y solo baja a
+los años archivados si la página no se llenó; las exportaciones y los
+resúmenes concatenan partición por partición.
+
+Los triggers de schema.sql rechazan altas, cambios y bajas en años cerrados
+(y números ya archivados), y no descuentan de RES_* lo que se archiva: los
+reportes conservan la historia completa. Lo mismo la búsqueda: el documento
+FTS de cada factura archivada se conserva (ver busqueda.py).
+"""
+import os
+import time
+import urllib.parse
+
+import busqueda
+from numeracion import transaccion_inmediata
+
+PREFIJO = "hist_"
+
+# Mismas columnas que en schema.sql, sin claves foráneas (los maestros están en la BD activa)
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS {s}.FACTURA (
+  NFAC    CHAR(10)      PRIMARY KEY,
+  FECEM   DATE,
+  FECVEN  DATE,
+  "DESC"  DECIMAL(10,2) NOT NULL DEFAULT 0,
+  IGV     DECIMAL(10,2) NOT NULL DEFAULT 0,
+  TOTFAC  DECIMAL(10,2) NOT NULL DEFAULT 0,
+  CODI    CHAR(6)  NOT NULL,
+  EMPR    CHAR(5)  NOT NULL,
+  CODV    CHAR(5)  NOT NULL
+);
+CREATE TABLE IF NOT EXISTS {s}.DETALLE_FACTURA (
+  NFAC    CHAR(10) NOT NULL,
+  CODT    CHAR(6)  NOT NULL,
+  CANT    INTEGER  NOT NULL,
+  PRECLI  DECIMAL(10,2) NOT NULL,
+  PRIMARY KEY (NFAC, CODT)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS {s}.I_FAC_FECEM_NFAC ON FACTURA(FECEM, NFAC);
+CREATE INDEX IF NOT EXISTS {s}.I_FAC_CODI_FECEM ON FACTURA(CODI, FECEM, NFAC);
+CREATE INDEX IF NOT EXISTS {s}.I_FAC_CODV_FECEM ON FACTURA(CODV, FECEM, NFAC);
+"""
+
+COLS_FACTURA = 'NFAC, FECEM, FECVEN, "DESC", IGV, TOTFAC, CODI, EMPR, CODV'
+COLS_DETALLE = "NFAC, CODT, CANT, PRECLI"
+
+SQL_CUADRE = """
+SELECT (SELECT COUNT(*) FROM {s}.FACTURA WHERE FECEM BETWEEN :desde AND :hasta),
+       (SELECT ROUND(COALESCE(SUM(TOTFAC), 0), 2) FROM {s}.FACTURA WHERE FECEM BETWEEN :desde AND :hasta),
+       (SELECT COUNT(*) FROM {s}.DETALLE_FACTURA D JOIN {s}.FACTURA F ON F.NFAC = D.NFAC
+         WHERE F.FECEM BETWEEN :desde AND :hasta),
+       (SELECT ROUND(COALESCE(SUM(D.PRECLI), 0), 2) FROM {s}.DETALLE_FACTURA D JOIN {s}.FACTURA F ON F.NFAC = D.NFAC
+         WHERE F.FECEM BETWEEN :desde AND :hasta)
+"""
+
+
+def _rango(anio):
+    return f"{anio:04d}-01-01", f"{anio:04d}-12-31"
+
+
+def _fsync(ruta):
+    fd = os.open(ruta, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Particiones:
+    def __init__(self, directorio, max_adjuntas=8):
+        """`max_adjuntas`: BD históricas adjuntas a la vez por conexión (SQLite admite 10)."""
+        self.directorio = directorio
+        self.max_adjuntas = max_adjuntas
+
+    def ruta(self, archivo):
+        return os.path.join(self.directorio, archivo)
+
+    # ---------- Consulta ----------
+    def archivadas(self, db):
+        """Años archivados [(ANIO, ARCHIVO, DESDE, HASTA)], del más antiguo al más nuevo."""
+        return db.execute("SELECT ANIO, ARCHIVO, DESDE, HASTA FROM PARTICION "
+                          "WHERE ESTADO = 'archivada' ORDER BY ANIO").fetchall()
+
+    def adjuntar(self, db, anio, archivo):
+        """Adjunta la BD del año en solo lectura (si no lo estaba) y devuelve su esquema."""
+        esquema = f"{PREFIJO}{anio}"
+        adjuntas = [r[1] for r in db.execute("PRAGMA database_list")]
+        if esquema in adjuntas:
+            return esquema
+        historicas = [a for a in adjuntas if a.startswith(PREFIJO)]
+        if len(historicas) >= self.max_adjuntas:
+            db.execute(f"DETACH DATABASE {historicas[0]}")
+        ruta = os.path.abspath(self.ruta(archivo))
+        if not os.path.exists(ruta):
+            raise FileNotFoundError(f"Falta el archivo del año {anio}: {ruta}")
+        db.execute(f"ATTACH DATABASE ? AS {esquema}", ("file:" + urllib.parse.quote(ruta) + "?mode=ro",))
+        return esquema
+
+    def recorrer(self, db, desde=None, hasta=None, descendente=False):
+        """Genera los esquemas ("main" o "hist_<año>") que pueden tener facturas entre
+        `desde` y `hasta`, en orden de fecha; cada histórico se adjunta al llegar a él.
+        """
+        anios = [p for p in self.archivadas(db)
+                 if (not desde or p["HASTA"] >= desde) and (not hasta or p["DESDE"] <= hasta)]
+        ultimo = db.execute("SELECT MAX(HASTA) FROM PARTICION WHERE ESTADO = 'archivada'").fetchone()[0]
+        activa = not (hasta and ultimo and hasta <= ultimo)
+        if descendente:
+            if activa:
+                yield "main"
+            for p in reversed(anios):
+                yield self.adjuntar(db, p["ANIO"], p["ARCHIVO"])
+        else:
+            for p in anios:
+                yield self.adjuntar(db, p["ANIO"], p["ARCHIVO"])
+            if activa:
+                yield "main"
+
+    def ubicar(self, db, nfac):
+        """Esquema donde está la factura `nfac`, o None si no existe."""
+        if db.execute("SELECT 1 FROM FACTURA WHERE NFAC = ?", (nfac,)).fetchone():
+            return "main"
+        p = db.execute("SELECT P.ANIO, P.ARCHIVO FROM FACTURA_ARCHIVADA A JOIN PARTICION P ON P.ANIO = A.ANIO "
+                       "WHERE A.NFAC = ? AND P.ESTADO = 'archivada'", (nfac,)).fetchone()
+        return self.adjuntar(db, p["ANIO"], p["ARCHIVO"]) if p else None
+
+    def resumen(self, db):
+        filas = []
+        for p in db.execute("SELECT ANIO, DESDE, HASTA, ARCHIVO, ESTADO, FACTURAS, LINEAS, TOTAL, ARCHIVADO "
+                            "FROM PARTICION ORDER BY ANIO"):
+            d = {k.lower(): p[k] for k in p.keys()}
+            ruta = self.ruta(p["ARCHIVO"])
+            d["bytes"] = os.path.getsize(ruta) if os.path.exists(ruta) else None
+            filas.append(d)
+        return filas
+
+    # ---------- Archivado ----------
+    def archivar(self, db, anio, avance=None):
+        """Mueve las facturas de `anio` a su BD histórica. Devuelve el cuadre (facturas, total, líneas, subtotal).
+
+        Lanza ValueError si el año ya está archivado, no tiene facturas o
+        quedan facturas de años anteriores sin archivar. Si se interrumpe, se
+        puede volver a correr: el año queda cerrado ('archivando') y la copia
+        se rehace desde cero.
+        """
+        avance = avance or (lambda msg: None)
+        desde, hasta = _rango(anio)
+        estado = db.execute("SELECT ESTADO FROM PARTICION WHERE ANIO = ?", (anio,)).fetchone()
+        if estado and estado[0] == "archivada":
+            raise ValueError(f"El año {anio} ya está archivado.")
+        ultimo = db.execute("SELECT MAX(ANIO) FROM PARTICION WHERE ESTADO = 'archivada'").fetchone()[0]
+        if ultimo is not None and anio < ultimo:
+            raise ValueError(f"El año {anio} es anterior al último archivado ({ultimo}).")
+        previo = db.execute("SELECT MIN(FECEM) FROM FACTURA").fetchone()[0]
+        if previo and previo < desde:
+            raise ValueError(f"Hay facturas de {previo[:4]} sin archivar: archive primero ese año.")
+        cuadre = tuple(db.execute(SQL_CUADRE.format(s="main"), {"desde": desde, "hasta": hasta}).fetchone())
+        if not cuadre[0]:
+            raise ValueError(f"No hay facturas de {anio} en la BD activa.")
+
+        # 1. Cerrar el año: desde aquí los triggers rechazan cambios en él
+        archivo = f"facturas_{anio}.db"
+        transaccion_inmediata(db, lambda db: db.execute(
+            "INSERT INTO PARTICION (ANIO, DESDE, HASTA, ARCHIVO) VALUES (?,?,?,?) ON CONFLICT (ANIO) DO NOTHING",
+            (anio, desde, hasta, archivo)))
+
+        # 2. Copiar a un archivo temporal; solo se renombra cuando está completo y en disco
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta = self.ruta(archivo)
+        tmp = ruta + ".tmp"
+        for r in (tmp, tmp + "-journal"):
+            if os.path.exists(r):
+                os.remove(r)
+        if db.in_transaction:
+            db.commit()
+        db.execute("ATTACH DATABASE ? AS nuevo", (tmp,))
+        try:
+            db.executescript(ESQUEMA.format(s="nuevo"))
+            db.execute(f"INSERT INTO nuevo.FACTURA ({COLS_FACTURA}) SELECT {COLS_FACTURA} FROM main.FACTURA "
+                       "WHERE FECEM BETWEEN ? AND ? ORDER BY FECEM, NFAC", (desde, hasta))
+            db.execute(f"INSERT INTO nuevo.DETALLE_FACTURA ({COLS_DETALLE}) "
+                       f"SELECT {', '.join('D.' + c for c in COLS_DETALLE.split(', '))} "
+                       "FROM main.DETALLE_FACTURA D JOIN nuevo.FACTURA F ON F.NFAC = D.NFAC ORDER BY D.NFAC, D.CODT")
+            db.commit()
+            copia = tuple(db.execute(SQL_CUADRE.format(s="nuevo"), {"desde": desde, "hasta": hasta}).fetchone())
+            if copia != cuadre:
+                raise RuntimeError(f"La copia de {anio} no cuadra: {copia} != {cuadre}")
+            db.execute("ANALYZE nuevo")
+            db.commit()
+        finally:
+            db.execute("DETACH DATABASE nuevo")
+        _fsync(tmp)
+        os.replace(tmp, ruta)
+        try:
+            _fsync(self.directorio)  # que el renombre también quede en disco
+        except OSError:
+            pass  # Windows no abre directorios
+        avance(f"{anio}: {cuadre[0]} facturas y {cuadre[2]} líneas copiadas a {ruta}")
+
+        # 3. Marcar como archivado y borrar de la BD activa, en una sola transacción
+        def mover(db):
+            actual = tuple(db.execute(SQL_CUADRE.format(s="main"), {"desde": desde, "hasta": hasta}).fetchone())
+            if actual != cuadre:
+                raise RuntimeError(f"Las facturas de {anio} cambiaron durante la copia; vuelva a archivar.")
+            # Con ESTADO = 'archivada' los triggers dejan pasar el borrado sin tocar RES_*
+            db.execute("UPDATE PARTICION SET ESTADO = 'archivada', FACTURAS = ?, TOTAL = ?, LINEAS = ?, "
+                       "ARCHIVADO = ? WHERE ANIO = ?", (cuadre[0], cuadre[1], cuadre[2], time.time(), anio))
+            db.execute("INSERT INTO FACTURA_ARCHIVADA (NFAC, ANIO) SELECT NFAC, ? FROM FACTURA "
+                       "WHERE FECEM BETWEEN ? AND ?", (anio, desde, hasta))
+            # Siguen en la búsqueda; el borrado quita solo sus documentos de la BD activa
+            busqueda.indexar_archivadas(db, "main", "WHERE F.FECEM BETWEEN ? AND ?", (desde, hasta))
+            db.execute("DELETE FROM FACTURA WHERE FECEM BETWEEN ? AND ?", (desde, hasta))
+
+        transaccion_inmediata(db, mover)
+        avance(f"{anio}: archivado")
+        return cuadre
+
+
+def migrar(db):
+    """Quita el trigger de baja de resúmenes anterior al archivo (schema.sql lo recrea)."""
+    fila = db.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'TR_FACTURA_RES_DEL'").fetchone()
+    if fila and "PARTICION" not in fila[0]:
+        db.execute("DROP TRIGGER TR_FACTURA_RES_DEL")
+        db.commit()
@@ -0,0 +1,218 @@
+"""Diseño de página de las facturas en PDF (ReportLab).
+
+Lo que no cambia de una factura a otra (bloque de la empresa, cabecera de la
+tabla y marco de totales) se dibuja una sola vez por documento como form
+XObject y cada página solo lo referencia: en un documento con muchas
+facturas queda un único objeto en el archivo en lugar de una copia por
+página. Las filas del detalle se escriben por tandas, todas las que caben en
+la página en un solo objeto de texto; al saltar de página se repiten el
+título de la factura y la cabecera de la tabla.
+
+Solo lo importa pdf_factura al dibujar: importar este módulo carga ReportLab.
+"""
+import io
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+W, H = A4
+X_M = 20*mm                    # margen izquierdo
+Y_TOP = H - 20*mm              # primera línea de la página
+FILA = 6*mm                    # alto de una fila del detalle
+Y_MIN_FILA = 45*mm             # última fila posible: debajo siempre caben los totales
+
+# === Guías de columnas ===
+TABLE_L = X_M                  # borde izquierdo del cuadro
+TABLE_R = W - X_M              # borde derecho del cuadro
+PAD     = 4*mm                 # padding interno
+X_COD   = TABLE_L + PAD
+X_PROD  = TABLE_L + 30*mm
+X_CANT  = TABLE_R - 62*mm      # columna numérica 1 (derecha)
+X_PUNIT = TABLE_R - 36*mm      # columna numérica 2 (derecha)
+X_SUBT  = TABLE_R - PAD        # columna final (derecha absoluta)
+LBL_X   = X_PUNIT - 10*mm      # etiquetas de totales
+VAL_X   = X_SUBT               # importes de totales (misma X que Subtotal de la tabla)
+
+NORMAL, NEGRITA = "Helvetica", "Helvetica-Bold"
+
+
+def money(v):  # S/ con 2 decimales
+    return f"S/ {float(v):,.2f}".replace(",", "_").replace(".", ",").replace("_",".")
+
+
+class _Texto:
+    """Un objeto de texto (BT ... ET) para muchas cadenas: cambia de fuente solo cuando hace falta."""
+
+    def __init__(self, c):
+        self.c = c
+        self.t = c.beginText()
+        self._fuente = None
+
+    def _usar(self, size, bold):
+        fuente = (NEGRITA if bold else NORMAL, size)
+        if fuente != self._fuente:
+            self.t.setFont(*fuente)
+            self._fuente = fuente
+        return fuente
+
+    def izq(self, s, x, y, size=10, bold=False):
+        self._usar(size, bold)
+        self.t.setTextOrigin(x, y)
+        self.t.textOut(s)
+
+    def der(self, s, x, y, size=10, bold=False):
+        fuente = self._usar(size, bold)
+        self.t.setTextOrigin(x - stringWidth(s, *fuente), y)
+        self.t.textOut(s)
+
+    def cerrar(self):
+        self.c.drawText(self.t)
+
+
+# ---------- Partes fijas (coordenadas locales; se ubican con translate) ----------
+def _empresa(c, cab):
+    t = _Texto(c)
+    t.izq(cab["RAZS"], X_M, Y_TOP, 14, True)
+    t.izq(f"RUC: {cab['RUC']}", X_M, Y_TOP - 6*mm)
+    t.izq(f"Dirección: {cab['e_calle']}, {cab['e_dist']} - {cab['e_ciud']}", X_M, Y_TOP - 11*mm)
+    t.cerrar()
+
+
+def _tabla(c):
+    # Origen en el borde inferior del recuadro
+    c.rect(TABLE_L, 0, TABLE_R - TABLE_L, 8*mm, stroke=1, fill=0)
+    t = _Texto(c)
+    t.izq("Código", X_COD, 4*mm, 10, True)
+    t.izq("Producto", X_PROD, 4*mm, 10, True)
+    t.der("Cant.", X_CANT, 4*mm, 10, True)
+    t.der("P. Unit", X_PUNIT, 4*mm, 10, True)
+    t.der("Subtotal", X_SUBT, 4*mm, 10, True)
+    t.cerrar()
+
+
+def _totales(c, igv_tasa):
+    # Origen en la línea de "Subtotal:"; la raya va por encima y "TOTAL:" 21 mm por debajo
+    c.setLineWidth(0.6)   # línea más delgada
+    c.line(LBL_X, 3.5*mm, X_SUBT, 3.5*mm)  # no cruza el texto
+    t = _Texto(c)
+    for i, etiqueta in enumerate(("Subtotal:", "Descuento:", "Base:")):
+        t.izq(etiqueta, LBL_X, -5*mm * i)
+    t.izq(f"IGV ({int(igv_tasa*100)}%):", LBL_X, -15*mm)
+    t.izq("TOTAL:", LBL_X, -21*mm, 12, True)
+    t.cerrar()
+
+
+class DocumentoFacturas:
+    """PDF con una o muchas facturas; cada una empieza en página nueva.
+
+    `destino`: ruta o archivo abierto; si se omite, cerrar() devuelve los bytes.
+    `forms`: las partes fijas como form XObject. Conviene desde unas pocas
+    facturas por documento; en un PDF de una sola factura los objetos extra
+    pesan más de lo que ahorran, y se dibujan directo.
+    """
+
+    def __init__(self, destino=None, igv_tasa=0.18, forms=True):
+        self._buffer = io.BytesIO() if destino is None else None
+        self.c = canvas.Canvas(destino if destino is not None else self._buffer, pagesize=A4)
+        self.igv_tasa = igv_tasa
+        self.forms = forms
+        self._definidos = set()  # forms ya escritos en este documento
+        self._empresas = {}      # datos de la empresa -> nombre de su form
+        self.facturas = 0
+        self.paginas = 0
+
+    def _poner(self, nombre, dibujar, y=0, bbox=()):
+        """Dibuja una parte fija con su origen en `y`: referencia al form (definido la primera vez) o directo."""
+        c = self.c
+        if self.forms and nombre not in self._definidos:
+            c.beginForm(nombre, *bbox)
+            dibujar(c)
+            c.endForm()
+            self._definidos.add(nombre)
+        if y:
+            c.saveState()
+            c.translate(0, y)
+        if self.forms:
+            c.doForm(nombre)
+        else:
+            dibujar(c)
+        if y:
+            c.restoreState()
+
+    # ---------- Páginas ----------
+    def _pagina_nueva(self):
+        if self.paginas:
+            self.c.showPage()
+        self.paginas += 1
+
+    def _cabecera(self, cab, t):
+        """Primera página de la factura: empresa, datos de la factura, cliente y vendedor."""
+        datos = (cab["RAZS"], cab["RUC"], cab["e_calle"], cab["e_dist"], cab["e_ciud"])
+        nombre = self._empresas.setdefault(datos, f"empresa{len(self._empresas)}")
+        self._poner(nombre, lambda c: _empresa(c, cab))
+        y = Y_TOP - 21*mm
+        t.izq(f"FACTURA N° {cab['NFAC']}", X_M, y, 13, True); y -= 6*mm
+        t.izq(f"Fecha de emisión: {cab['FECEM'] or ''}", X_M, y); y -= 5*mm
+        if cab["FECVEN"]:
+            t.izq(f"Fecha de vencimiento: {cab['FECVEN']}", X_M, y); y -= 6*mm
+        else:
+            y -= 3*mm
+        t.izq("Cliente:", X_M, y, 10, True); y -= 5*mm
+        t.izq(f"{cab['cliente']}  (DNI: {cab['DNI']})", X_M, y); y -= 5*mm
+        t.izq(f"Dirección: {cab['c_calle']}, {cab['c_dist']} - {cab['c_ciud']}", X_M, y); y -= 8*mm
+        t.izq("Vendedor:", X_M, y, 10, True); y -= 5*mm
+        t.izq(f"{cab['vendedor']}  (Código: {cab['CODV']})", X_M, y); y -= 8*mm
+        return y
+
+    def _continuacion(self, cab, pagina, t):
+        t.izq(f"{cab['RAZS']} - FACTURA N° {cab['NFAC']} (continuación, página {pagina})", X_M, Y_TOP, 11, True)
+        return Y_TOP - 8*mm
+
+    def agregar(self, cab, det):
+        """Dibuja una factura (`cab` y `det` como los entrega pdf_factura.cargar_factura)."""
+        subtot = sum(float(r["PRECLI"]) for r in det)
+        desc_m = float(cab["DESC_M"])  # monto de descuento guardado
+        base = max(0.0, round(subtot - desc_m, 2))   # descuento sobre subtotal, IGV sobre base
+
+        i, pagina = 0, 1
+        while True:
+            self._pagina_nueva()
+            t = _Texto(self.c)
+            y = self._cabecera(cab, t) if pagina == 1 else self._continuacion(cab, pagina, t)
+            self._poner("tabla", _tabla, y - 6*mm, (TABLE_L, 0, TABLE_R, 8*mm))
+            y -= 10*mm
+            # Tanda: todas las filas que caben en esta página
+            cabe = max(1, int((y - Y_MIN_FILA) // FILA) + 1)
+            for r in det[i:i + cabe]:
+                cant = int(r["CANT"])
+                precli = float(r["PRECLI"])
+                t.izq(r["CODT"], X_COD, y)
+                t.izq((r["producto"] or "")[:60], X_PROD, y)
+                t.der(str(cant), X_CANT, y)
+                t.der(money((precli / cant) if cant else 0.0), X_PUNIT, y)
+                t.der(money(precli), X_SUBT, y)
+                y -= FILA
+            i += cabe
+            if i >= len(det):
+                break
+            t.cerrar()
+            pagina += 1
+
+        # --- Totales: el marco es un form; aquí solo los importes ---
+        y -= 2*mm
+        self._poner(f"totales{int(self.igv_tasa * 100)}", lambda c: _totales(c, self.igv_tasa), y,
+                    (LBL_X, -25*mm, X_SUBT, 5*mm))
+        for k, v in enumerate((subtot, desc_m, base)):
+            t.der(money(v), VAL_X, y - 5*mm * k)
+        t.der(money(cab["IGV"]), VAL_X, y - 15*mm)
+        t.der(money(cab["TOTFAC"]), VAL_X, y - 21*mm, 12, True)
+        t.cerrar()
+        self.facturas += 1
+
+    def cerrar(self):
+        """Termina el PDF; devuelve sus bytes si no se dio `destino`."""
+        self.c.showPage()
+        self.c.save()
+        return self._buffer.getvalue() if self._buffer is not None else None
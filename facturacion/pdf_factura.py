@@ -0,0 +1,93 @@
+"""Dibujo del PDF de una factura (ReportLab).
+
+Separado de las rutas para poder llamarlo desde la exportación por lotes,
+incluso en otros procesos: recibe diccionarios simples, no filas de sqlite3.
+ReportLab (vía pdf_diseno) se importa al dibujar, no al importar el módulo:
+las consultas de aquí se usan también donde no se dibuja nada.
+"""
+import json
+
+SQL_CABECERA = """
+        SELECT F.NFAC, F.FECEM, F.FECVEN, F."DESC" AS DESC_M, F.IGV, F.TOTFAC,
+               C.CODI, C.NOMB||' '||C.APEL AS cliente, C.DNI, C.CALLE AS c_calle, C.DIST AS c_dist, C.CIUD AS c_ciud,
+               E.EMPR, E.RAZS, E.RUC, E.CALLE AS e_calle, E.DIST AS e_dist, E.CIUD AS e_ciud,
+               V.CODV, V.NOMB||' '||V.APEL AS vendedor
+        FROM {s}.FACTURA F
+        JOIN CLIENTE  C ON C.CODI=F.CODI
+        JOIN VENDEDOR V ON V.CODV=F.CODV
+        JOIN EMPRESA  E ON E.EMPR=F.EMPR
+"""
+
+SQL_DETALLE = """
+        SELECT D.NFAC, D.CODT, P.NOMB AS producto, D.CANT, D.PRECLI
+        FROM {s}.DETALLE_FACTURA D
+        JOIN PRODUCTO P ON P.CODT = D.CODT
+"""
+
+
+def cargar_factura(db, nfac, esquema="main"):
+    """(cabecera, detalle) como dict / lista de dict, o (None, []) si no existe.
+
+    `esquema`: "main" o la BD histórica adjunta donde está la factura (particiones.py).
+    """
+    # Cabecera de factura: FACTURA + CLIENTE + EMPRESA + VENDEDOR
+    cab = db.execute(SQL_CABECERA.format(s=esquema) + "        WHERE F.NFAC=?", (nfac,)).fetchone()
+    if not cab:
+        return None, []
+    # Detalle de líneas
+    det = db.execute(SQL_DETALLE.format(s=esquema) + "        WHERE D.NFAC=?\n        ORDER BY P.NOMB",
+                     (nfac,)).fetchall()
+    return dict(cab), [dict(r) for r in det]
+
+
+def iterar_facturas(db, where="", params=(), tam=200, esquemas=("main",)):
+    """Genera (cabecera, detalle) para las facturas del filtro, en bloques de `tam`.
+
+    El detalle de cada bloque sale de una sola consulta, no de una por factura.
+    Las particiones de `esquemas` se recorren una tras otra.
+    """
+    for s in esquemas:
+        cur = db.execute(SQL_CABECERA.format(s=s) + f"        {where}\n        ORDER BY F.FECEM, F.NFAC",
+                         tuple(params))
+        while True:
+            cabs = [dict(r) for r in cur.fetchmany(tam)]
+            if not cabs:
+                break
+            dets = {c["NFAC"]: [] for c in cabs}
+            for r in db.execute(SQL_DETALLE.format(s=s) + "        WHERE D.NFAC IN (SELECT value FROM json_each(?))\n"
+                                "        ORDER BY D.NFAC, P.NOMB", (json.dumps(list(dets)),)):
+                dets[r["NFAC"]].append(dict(r))
+            for c in cabs:
+                yield c, dets[c["NFAC"]]
+
+
+def dibujar_factura(cab, det, igv_tasa):
+    """Devuelve los bytes del PDF de una factura (el diseño está en pdf_diseno)."""
+    from pdf_diseno import DocumentoFacturas
+    doc = DocumentoFacturas(igv_tasa=igv_tasa, forms=False)
+    doc.agregar(cab, det)
+    return doc.cerrar()
+
+
+def dibujar_facturas(facturas, igv_tasa, destino=None, avance=None):
+    """Un solo PDF con todas las facturas de `facturas` ((cab, det) iterable), una tras otra.
+
+    Para tiradas grandes: los forms de empresa, tabla y totales se escriben
+    una sola vez para todo el documento. Devuelve los bytes si no hay
+    `destino` (ruta o archivo); `avance(n)` se llama tras cada factura.
+    """
+    from pdf_diseno import DocumentoFacturas
+    doc = DocumentoFacturas(destino, igv_tasa=igv_tasa)
+    for cab, det in facturas:
+        doc.agregar(cab, det)
+        if avance:
+            avance(doc.facturas)
+    return doc.cerrar()
+
+
+def precargar():
+    """Importa ReportLab y dibuja una factura de prueba (carga fuentes y métricas) para calentar el proceso."""
+    cab = {"NFAC": "F0000000", "FECEM": "2000-01-01", "FECVEN": None, "DESC_M": 0, "IGV": 0.18, "TOTFAC": 1.18,
+           "cliente": "-", "DNI": "-", "c_calle": "-", "c_dist": "-", "c_ciud": "-",
+           "RAZS": "-", "RUC": "-", "e_calle": "-", "e_dist": "-", "e_ciud": "-", "vendedor": "-", "CODV": "-"}
+    dibujar_factura(cab, [{"CODT": "-", "producto": "-", "CANT": 1, "PRECLI": 1.0}], 0.18)
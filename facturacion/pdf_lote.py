@@ -0,0 +1,101 @@
+"""Exportación por lotes: muchas facturas en PDF dentro de un ZIP que se
+va enviando mientras se genera.
+
+El dibujo corre en un pool de procesos; como mucho hay `workers * 4`
+facturas en vuelo, así que la memoria no crece con el tamaño del periodo.
+"""
+import os
+import time
+import zipfile
+from collections import deque
+
+from pdf_factura import dibujar_factura
+
+
+class _Salida:
+    """Destino de escritura sin seek: zipfile usa descriptores de datos."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b"".join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def _dibujar(args):
+    cab, det, igv_tasa = args
+    return cab["NFAC"], dibujar_factura(cab, det, igv_tasa)
+
+
+def renderizar(facturas, igv_tasa, workers=None, buscar=None, guardar=None):
+    """Genera (nfac, pdf) en el mismo orden de `facturas` ((cab, det) iterable).
+
+    `buscar(cab, det)` puede devolver bytes ya cacheados para saltarse el
+    dibujo; `guardar(cab, det, pdf)` recibe cada PDF recién dibujado.
+    """
+    workers = os.cpu_count() if workers is None else workers
+    if workers <= 1:
+        for cab, det in facturas:
+            pdf = buscar(cab, det) if buscar else None
+            if pdf is None:
+                pdf = dibujar_factura(cab, det, igv_tasa)
+                if guardar:
+                    guardar(cab, det, pdf)
+            yield cab["NFAC"], pdf
+        return
+
+    import multiprocessing  # solo para lotes con varios procesos
+    from concurrent.futures import ProcessPoolExecutor
+
+    # spawn: el proceso web tiene hilos, no conviene hacer fork de él
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        pendientes = deque()
+
+        def entregar():
+            cab, det, listo = pendientes.popleft()
+            if isinstance(listo, bytes):
+                return cab["NFAC"], listo
+            nfac, pdf = listo.result()
+            if guardar:
+                guardar(cab, det, pdf)
+            return nfac, pdf
+
+        for cab, det in facturas:
+            pdf = buscar(cab, det) if buscar else None
+            pendientes.append((cab, det, pdf if pdf is not None
+                               else pool.submit(_dibujar, (cab, det, igv_tasa))))
+            if len(pendientes) >= workers * 4:
+                yield entregar()
+        while pendientes:
+            yield entregar()
+
+
+def zip_stream(pdfs, stats=None):
+    """Empaqueta (nfac, pdf) en un ZIP y va generando sus bytes.
+
+    Si se pasa `stats` (dict), al terminar contiene facturas, segundos y
+    facturas_por_segundo.
+    """
+    t0 = time.perf_counter()
+    n = 0
+    salida = _Salida()
+    with zipfile.ZipFile(salida, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for nfac, pdf in pdfs:
+            zf.writestr(f"Factura_{nfac}.pdf", pdf)
+            n += 1
+            yield salida.vaciar()
+    yield salida.vaciar()  # directorio central
+    if stats is not None:
+        seg = time.perf_counter() - t0
+        stats.update(facturas=n, segundos=round(seg, 3),
+                     facturas_por_segundo=round(n / seg, 1) if seg else 0.0)
@@ -0,0 +1,149 @@
+"""Pool de conexiones SQLite.
+
+Cada petición toma una conexión ya abierta y configurada y la devuelve al
+terminar, en lugar de abrir y cerrar una por petición. La BD queda en modo
+WAL (lectores y un escritor a la vez) y cada conexión espera `busy_timeout`
+antes de fallar con "database is locked".
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA synchronous = NORMAL",    # seguro con WAL; fsync solo en checkpoint
+    "PRAGMA cache_size = -65536",     # 64 MiB de páginas por conexión
+    "PRAGMA mmap_size = 268435456",   # 256 MiB mapeados en memoria
+    "PRAGMA busy_timeout = 5000",     # ms
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+class PoolConexiones:
+    def __init__(self, ruta, max_conexiones=16, espera=10.0, sentencias_cache=256, al_crear=None):
+        """`al_crear(conn, nueva_bd)` corre una sola vez, con la primera conexión."""
+        self.ruta = ruta
+        self.max_conexiones = max_conexiones
+        self.espera = espera
+        self.sentencias_cache = sentencias_cache
+        self._al_crear = al_crear
+        self._libres = queue.LifoQueue()  # LIFO: se reusa la conexión con la caché más caliente
+        self._lock = threading.Lock()
+        self._hay = threading.Condition(self._lock)  # avisa cuando se libera una conexión o un cupo
+        self._init_lock = threading.Lock()
+        self._pid = os.getpid()
+        self._creadas = 0
+        self._en_uso = 0
+        self._pico = 0
+        self._prestamos = 0
+        self._esperas = 0
+        self._seg_espera = 0.0
+        self._iniciada = False
+
+    def _conectar(self):
+        nueva_bd = not os.path.exists(self.ruta)
+        conn = sqlite3.connect(self.ruta, check_same_thread=False,
+                               cached_statements=self.sentencias_cache)
+        try:
+            conn.row_factory = sqlite3.Row
+            for p in PRAGMAS:
+                conn.execute(p)
+            with self._init_lock:  # las demás conexiones esperan a que exista el schema
+                if not self._iniciada:
+                    # journal_mode es persistente en el archivo: basta con fijarlo una vez
+                    conn.execute("PRAGMA journal_mode = WAL")
+                    if self._al_crear:
+                        self._al_crear(conn, nueva_bd)
+                    self._iniciada = True
+        except BaseException:
+            conn.close()  # quien llama descuenta el cupo
+            raise
+        return conn
+
+    def _tras_fork(self):
+        # Las conexiones no deben cruzar un fork: el hijo arranca con pool vacío
+        if os.getpid() != self._pid:
+            self.__init__(self.ruta, self.max_conexiones, self.espera,
+                          self.sentencias_cache, self._al_crear)
+            self._iniciada = True
+
+    def obtener(self):
+        self._tras_fork()
+        t0 = time.perf_counter()
+        espero = False
+        with self._hay:
+            while True:
+                try:
+                    conn = self._libres.get_nowait()
+                    break
+                except queue.Empty:
+                    pass
+                if self._creadas < self.max_conexiones:
+                    self._creadas += 1
+                    conn = None
+                    break
+                restante = t0 + self.espera - time.perf_counter()
+                if restante <= 0:
+                    raise sqlite3.OperationalError("Pool de conexiones agotado")
+                espero = True
+                self._hay.wait(restante)
+        if conn is None:
+            try:
+                conn = self._conectar()
+            except BaseException:
+                with self._hay:
+                    self._creadas -= 1
+                    self._hay.notify()  # el cupo vuelve a estar libre
+                raise
+        with self._lock:
+            if espero:
+                self._esperas += 1
+                self._seg_espera += time.perf_counter() - t0
+            self._prestamos += 1
+            self._en_uso += 1
+            self._pico = max(self._pico, self._en_uso)
+        return conn
+
+    def devolver(self, conn):
+        if os.getpid() != self._pid:
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()  # nada a medias pasa a la siguiente petición
+        except sqlite3.Error:
+            conn.close()
+            with self._hay:
+                self._creadas -= 1
+                self._en_uso -= 1
+                self._hay.notify()  # quien espera puede abrir otra en su lugar
+            return
+        with self._hay:
+            self._en_uso -= 1
+            self._libres.put(conn)
+            self._hay.notify()
+
+    def cerrar(self):
+        while True:
+            try:
+                self._libres.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._hay:
+                self._creadas -= 1
+                self._hay.notify()
+
+    def resumen(self):
+        with self._lock:
+            return {
+                "max_conexiones": self.max_conexiones,
+                "creadas": self._creadas,
+                "en_uso": self._en_uso,
+                "libres": self._creadas - self._en_uso,
+                "pico_en_uso": self._pico,
+                "utilizacion": round(self._en_uso / self.max_conexiones, 3),
+                "prestamos": self._prestamos,
+                "esperas": self._esperas,
+                "seg_espera": round(self._seg_espera, 4),
+            }
@@ -0,0 +1,148 @@
+"""Reportes de ventas sobre las tablas de resumen (RES_*).
+
+Las tablas las mantienen los triggers de schema.sql; aquí están las
+consultas de lectura y la reconstrucción/conciliación contra las tablas base.
+Como los resúmenes guardan también los años archivados (particiones.py), la
+reconstrucción y la conciliación recorren cada partición (`esquemas`); las
+fechas de dos particiones nunca se cruzan, así que sus grupos tampoco.
+"""
+
+# Prorrateo de descuento / IGV / total de la factura a cada línea según su PRECLI
+_SUB = '(F."DESC" + F.TOTFAC - F.IGV)'
+_R = "CASE WHEN {sub} > 0 THEN D.PRECLI * {col} / {sub} ELSE 0 END"
+
+COLUMNAS = ("FACTURAS", "UNIDADES", "SUBTOTAL", "DESCUENTO", "IGV", "TOTAL")
+
+DIMENSIONES = {
+    # dim: (tabla, clave, consulta con los valores esperados, nombre a mostrar)
+    "vendedor": ("RES_VENDEDOR_DIA", "CODV", """
+        SELECT COALESCE(F.FECEM, '') AS FECHA, F.CODV, COUNT(*) AS FACTURAS,
+               COALESCE(SUM(D.U), 0) AS UNIDADES, COALESCE(SUM(D.S), 0) AS SUBTOTAL,
+               SUM(F."DESC") AS DESCUENTO, SUM(F.IGV) AS IGV, SUM(F.TOTFAC) AS TOTAL
+        FROM {s}.FACTURA F
+        LEFT JOIN (SELECT NFAC, SUM(CANT) AS U, SUM(PRECLI) AS S
+                   FROM {s}.DETALLE_FACTURA GROUP BY NFAC) D ON D.NFAC = F.NFAC
+        GROUP BY 1, 2""",
+        "SELECT CODV AS clave, NOMB||' '||APEL AS nombre FROM VENDEDOR"),
+    "cliente": ("RES_CLIENTE_DIA", "CODI", """
+        SELECT COALESCE(F.FECEM, '') AS FECHA, F.CODI, COUNT(*) AS FACTURAS,
+               COALESCE(SUM(D.U), 0) AS UNIDADES, COALESCE(SUM(D.S), 0) AS SUBTOTAL,
+               SUM(F."DESC") AS DESCUENTO, SUM(F.IGV) AS IGV, SUM(F.TOTFAC) AS TOTAL
+        FROM {s}.FACTURA F
+        LEFT JOIN (SELECT NFAC, SUM(CANT) AS U, SUM(PRECLI) AS S
+                   FROM {s}.DETALLE_FACTURA GROUP BY NFAC) D ON D.NFAC = F.NFAC
+        GROUP BY 1, 2""",
+        "SELECT CODI AS clave, NOMB||' '||APEL AS nombre FROM CLIENTE"),
+    "producto": ("RES_PRODUCTO_DIA", "CODT", f"""
+        SELECT COALESCE(F.FECEM, '') AS FECHA, D.CODT, COUNT(*) AS LINEAS,
+               SUM(D.CANT) AS UNIDADES, SUM(D.PRECLI) AS SUBTOTAL,
+               SUM({_R.format(sub=_SUB, col='F."DESC"')}) AS DESCUENTO,
+               SUM({_R.format(sub=_SUB, col="F.IGV")}) AS IGV,
+               SUM({_R.format(sub=_SUB, col="F.TOTFAC")}) AS TOTAL
+        FROM {{s}}.DETALLE_FACTURA D
+        JOIN {{s}}.FACTURA F ON F.NFAC = D.NFAC
+        GROUP BY 1, 2""",
+        "SELECT CODT AS clave, NOMB AS nombre FROM PRODUCTO"),
+}
+
+TOLERANCIA = 0.005  # los montos se acumulan como REAL
+
+
+def _columnas(dim):
+    return ("LINEAS",) + COLUMNAS[1:] if dim == "producto" else COLUMNAS
+
+
+def reconstruir(db, esquemas=("main",)):
+    """Vuelve a calcular todas las tablas de resumen desde FACTURA y DETALLE_FACTURA.
+
+    `esquemas` se recorre una sola vez (puede adjuntar cada partición al pedirla).
+    """
+    for tabla, _, _, _ in DIMENSIONES.values():
+        db.execute(f"DELETE FROM {tabla}")
+    facturas = 0
+    for s in esquemas:
+        for dim, (tabla, clave, esperado, _) in DIMENSIONES.items():
+            cols = ", ".join(("FECHA", clave) + _columnas(dim))
+            db.execute(f"INSERT INTO {tabla} ({cols}) {esperado.format(s=s)}")
+        facturas += db.execute(f"SELECT COUNT(*) FROM {s}.FACTURA").fetchone()[0]
+    db.execute("DELETE FROM RES_TOTALES")
+    db.execute("""INSERT INTO RES_TOTALES (TABLA, FILAS)
+                  SELECT 'CLIENTE',  COUNT(*) FROM CLIENTE  UNION ALL
+                  SELECT 'PRODUCTO', COUNT(*) FROM PRODUCTO UNION ALL
+                  SELECT 'FACTURA',  ?""", (facturas,))
+    db.commit()
+
+
+def asegurar_resumenes(db, esquemas=("main",)):
+    """En una BD que recién recibe las tablas RES_*, las llena por primera vez."""
+    if not db.execute("SELECT 1 FROM RES_TOTALES LIMIT 1").fetchone():
+        reconstruir(db, esquemas)
+
+
+def conciliar(db, limite=100, esquemas=("main",)):
+    """Compara resúmenes con tablas base. Devuelve {dim: [diferencias]} (vacío si cuadra)."""
+    # Lo esperado de todas las particiones, juntado en tablas temporales
+    for dim, (_, _, esperado, _) in DIMENSIONES.items():
+        db.execute(f"DROP TABLE IF EXISTS temp.ESPERADO_{dim}")
+        db.execute(f"CREATE TEMP TABLE ESPERADO_{dim} AS SELECT * FROM ({esperado.format(s='main')}) LIMIT 0")
+    for s in esquemas:
+        for dim, (_, _, esperado, _) in DIMENSIONES.items():
+            db.execute(f"INSERT INTO temp.ESPERADO_{dim} {esperado.format(s=s)}")
+    difs = {}
+    for dim, (tabla, clave, _, _) in DIMENSIONES.items():
+        cols = _columnas(dim)
+        distinto = " OR ".join(f"ABS(E.{c} - R.{c}) > {TOLERANCIA}" for c in cols)
+        no_cero = " OR ".join(f"ABS(R.{c}) > {TOLERANCIA}" for c in cols)
+        sel_e = ", ".join(f"E.{c} AS esperado_{c}, R.{c} AS actual_{c}" for c in cols)
+        sel_r = ", ".join(f"NULL AS esperado_{c}, R.{c} AS actual_{c}" for c in cols)
+        q = f"""
+            WITH E AS (SELECT * FROM temp.ESPERADO_{dim})
+            SELECT E.FECHA, E.{clave} AS clave, {sel_e}
+            FROM E LEFT JOIN {tabla} R ON R.FECHA = E.FECHA AND R.{clave} = E.{clave}
+            WHERE R.FECHA IS NULL OR {distinto}
+            UNION ALL
+            SELECT R.FECHA, R.{clave} AS clave, {sel_r}
+            FROM {tabla} R LEFT JOIN E ON E.FECHA = R.FECHA AND E.{clave} = R.{clave}
+            WHERE E.FECHA IS NULL AND ({no_cero})
+            LIMIT ?"""
+        filas = [dict(r) for r in db.execute(q, (limite,))]
+        db.execute(f"DROP TABLE temp.ESPERADO_{dim}")
+        if filas:
+            difs[dim] = filas
+    return difs
+
+
+def totales(db):
+    return {r["TABLA"]: r["FILAS"] for r in db.execute("SELECT TABLA, FILAS FROM RES_TOTALES")}
+
+
+def _rango(desde, hasta):
+    conds, params = [], []
+    if desde:
+        conds.append("R.FECHA >= ?"); params.append(desde)
+    if hasta:
+        conds.append("R.FECHA <= ?"); params.append(hasta)
+    return ("WHERE " + " AND ".join(conds)) if conds else "", params
+
+
+def ventas_por(db, dim, desde=None, hasta=None, limite=50):
+    """Totales del periodo agrupados por vendedor, cliente o producto (mayor total primero)."""
+    tabla, clave, _, nombres = DIMENSIONES[dim]
+    where, params = _rango(desde, hasta)
+    sumas = ", ".join(f"SUM(R.{c}) AS {c}" for c in _columnas(dim))
+    q = f"""
+        SELECT R.{clave} AS clave, N.nombre, {sumas}
+        FROM {tabla} R
+        LEFT JOIN ({nombres}) N ON N.clave = R.{clave}
+        {where}
+        GROUP BY R.{clave}
+        ORDER BY TOTAL DESC
+        LIMIT ?"""
+    return [dict(r) for r in db.execute(q, params + [limite])]
+
+
+def ventas_diarias(db, desde=None, hasta=None):
+    where, params = _rango(desde, hasta)
+    sumas = ", ".join(f"SUM(R.{c}) AS {c}" for c in COLUMNAS)
+    q = f"SELECT R.FECHA, {sumas} FROM RES_VENDEDOR_DIA R {where} GROUP BY R.FECHA ORDER BY R.FECHA"
+    return [dict(r) for r in db.execute(q, params)]
@@ -14,6 +14,7 @@ CREATE TABLE IF NOT EXISTS CLIENTE (
   UNIQUE (DNI),
   UNIQUE (EMAIL),
   UNIQUE (TELF)
+);
 
 -- EMPRESA
 CREATE TABLE IF NOT EXISTS EMPRESA (
@@ -58,6 +59,18 @@ CREATE TABLE IF NOT EXISTS FACTURA (
   FOREIGN KEY (CODV) REFERENCES VENDEDOR(CODV)
 );
 
+-- Series de numeración: el servidor asigna NFAC = SERIE + ULTIMO con ceros
+-- a la izquierda hasta ANCHO caracteres (F000000001). La serie F arranca
+-- después de la mayor factura existente con ese formato.
+CREATE TABLE IF NOT EXISTS SERIE (
+  SERIE   VARCHAR(4) PRIMARY KEY,
+  ULTIMO  INTEGER    NOT NULL DEFAULT 0 CHECK (ULTIMO >= 0),
+  ANCHO   INTEGER    NOT NULL DEFAULT 10 CHECK (ANCHO > length(SERIE) AND ANCHO <= 10)
+);
+INSERT OR IGNORE INTO SERIE (SERIE, ULTIMO)
+SELECT 'F', COALESCE(MAX(CAST(substr(NFAC, 2) AS INTEGER)), 0)
+  FROM FACTURA WHERE NFAC GLOB 'F[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]';
+
 -- DETALLE_FACTURA
 CREATE TABLE IF NOT EXISTS DETALLE_FACTURA (
   NFAC    CHAR(10) NOT NULL,
@@ -69,6 +82,26 @@ CREATE TABLE IF NOT EXISTS DETALLE_FACTURA (
   FOREIGN KEY (CODT) REFERENCES PRODUCTO(CODT)
 );
 
+-- Años cerrados y archivados en BD aparte (particiones.py). ESTADO:
+-- 'archivando' mientras se copia (el año ya no admite cambios) y 'archivada'
+-- cuando sus facturas están solo en ARCHIVO (relativo al directorio de archivo).
+CREATE TABLE IF NOT EXISTS PARTICION (
+  ANIO       INTEGER PRIMARY KEY,
+  DESDE      DATE    NOT NULL,
+  HASTA      DATE    NOT NULL,
+  ARCHIVO    TEXT    NOT NULL,
+  ESTADO     TEXT    NOT NULL DEFAULT 'archivando',
+  FACTURAS   INTEGER,
+  LINEAS     INTEGER,
+  TOTAL      REAL,
+  ARCHIVADO  REAL                    -- epoch (s)
+);
+-- Números ya archivados: ubican el PDF de una factura vieja y evitan reutilizarlos
+CREATE TABLE IF NOT EXISTS FACTURA_ARCHIVADA (
+  NFAC  CHAR(10) PRIMARY KEY,
+  ANIO  INTEGER  NOT NULL
+) WITHOUT ROWID;
+
 -- Indices sugeridos
 CREATE INDEX IF NOT EXISTS I_CODI  ON CLIENTE(CODI);
 CREATE UNIQUE INDEX IF NOT EXISTS I_DNI_UNQ   ON CLIENTE(DNI);
@@ -82,5 +115,458 @@ CREATE INDEX IF NOT EXISTS I_CODV  ON VENDEDOR(CODV);
 
 CREATE INDEX IF NOT EXISTS I_CODT  ON PRODUCTO(CODT);
 CREATE UNIQUE INDEX IF NOT EXISTS I_PROD_NOMB_UNID ON PRODUCTO(NOMB, UNID);
+-- Unicidad de nombre sin distinguir mayúsculas (WHERE lower(NOMB) = lower(?))
+CREATE INDEX IF NOT EXISTS I_PROD_NOMB_LOWER ON PRODUCTO(lower(NOMB));
+
+CREATE INDEX IF NOT EXISTS I_NFAC  ON FACTURA(NFAC);
+
+-- Listado de facturas: paginación por (FECEM, NFAC) y filtros por cliente/vendedor
+CREATE INDEX IF NOT EXISTS I_FAC_FECEM_NFAC ON FACTURA(FECEM, NFAC);
+CREATE INDEX IF NOT EXISTS I_FAC_CODI_FECEM ON FACTURA(CODI, FECEM, NFAC);
+CREATE INDEX IF NOT EXISTS I_FAC_CODV_FECEM ON FACTURA(CODV, FECEM, NFAC);
+CREATE INDEX IF NOT EXISTS I_FAC_EMPR       ON FACTURA(EMPR);
+CREATE INDEX IF NOT EXISTS I_DET_CODT       ON DETALLE_FACTURA(CODT);
+
+-- ---------- Resúmenes de ventas (mantenidos por triggers) ----------
+-- Totales diarios por vendedor, cliente y producto. Los reportes leen estas
+-- tablas (una fila por día y clave) en lugar de recorrer DETALLE_FACTURA.
+-- Para producto, descuento/IGV/total se prorratean según PRECLI sobre el
+-- subtotal de la factura (DESC + TOTFAC - IGV).
+CREATE TABLE IF NOT EXISTS RES_VENDEDOR_DIA (
+  FECHA     DATE     NOT NULL,
+  CODV      CHAR(5)  NOT NULL,
+  FACTURAS  INTEGER  NOT NULL DEFAULT 0,
+  UNIDADES  INTEGER  NOT NULL DEFAULT 0,
+  SUBTOTAL  REAL     NOT NULL DEFAULT 0,
+  DESCUENTO REAL     NOT NULL DEFAULT 0,
+  IGV       REAL     NOT NULL DEFAULT 0,
+  TOTAL     REAL     NOT NULL DEFAULT 0,
+  PRIMARY KEY (FECHA, CODV)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS RES_CLIENTE_DIA (
+  FECHA     DATE     NOT NULL,
+  CODI      CHAR(6)  NOT NULL,
+  FACTURAS  INTEGER  NOT NULL DEFAULT 0,
+  UNIDADES  INTEGER  NOT NULL DEFAULT 0,
+  SUBTOTAL  REAL     NOT NULL DEFAULT 0,
+  DESCUENTO REAL     NOT NULL DEFAULT 0,
+  IGV       REAL     NOT NULL DEFAULT 0,
+  TOTAL     REAL     NOT NULL DEFAULT 0,
+  PRIMARY KEY (FECHA, CODI)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS RES_PRODUCTO_DIA (
+  FECHA     DATE     NOT NULL,
+  CODT      CHAR(6)  NOT NULL,
+  LINEAS    INTEGER  NOT NULL DEFAULT 0,
+  UNIDADES  INTEGER  NOT NULL DEFAULT 0,
+  SUBTOTAL  REAL     NOT NULL DEFAULT 0,
+  DESCUENTO REAL     NOT NULL DEFAULT 0,
+  IGV       REAL     NOT NULL DEFAULT 0,
+  TOTAL     REAL     NOT NULL DEFAULT 0,
+  PRIMARY KEY (FECHA, CODT)
+) WITHOUT ROWID;
+
+-- Conteo de filas para el panel principal (evita COUNT(*) por petición)
+CREATE TABLE IF NOT EXISTS RES_TOTALES (
+  TABLA  VARCHAR(20) PRIMARY KEY,
+  FILAS  INTEGER     NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS TR_CLIENTE_CNT_INS AFTER INSERT ON CLIENTE
+BEGIN UPDATE RES_TOTALES SET FILAS = FILAS + 1 WHERE TABLA = 'CLIENTE'; END;
+CREATE TRIGGER IF NOT EXISTS TR_CLIENTE_CNT_DEL AFTER DELETE ON CLIENTE
+BEGIN UPDATE RES_TOTALES SET FILAS = FILAS - 1 WHERE TABLA = 'CLIENTE'; END;
+CREATE TRIGGER IF NOT EXISTS TR_PRODUCTO_CNT_INS AFTER INSERT ON PRODUCTO
+BEGIN UPDATE RES_TOTALES SET FILAS = FILAS + 1 WHERE TABLA = 'PRODUCTO'; END;
+CREATE TRIGGER IF NOT EXISTS TR_PRODUCTO_CNT_DEL AFTER DELETE ON PRODUCTO
+BEGIN UPDATE RES_TOTALES SET FILAS = FILAS - 1 WHERE TABLA = 'PRODUCTO'; END;
+
+-- Alta de factura: cabecera (cantidad de facturas, descuento, IGV, total)
+CREATE TRIGGER IF NOT EXISTS TR_FACTURA_RES_INS AFTER INSERT ON FACTURA
+BEGIN
+  INSERT INTO RES_VENDEDOR_DIA (FECHA, CODV, FACTURAS, DESCUENTO, IGV, TOTAL)
+  VALUES (COALESCE(NEW.FECEM, ''), NEW.CODV, 1, NEW."DESC", NEW.IGV, NEW.TOTFAC)
+  ON CONFLICT (FECHA, CODV) DO UPDATE SET
+    FACTURAS = FACTURAS + 1, DESCUENTO = DESCUENTO + excluded.DESCUENTO,
+    IGV = IGV + excluded.IGV, TOTAL = TOTAL + excluded.TOTAL;
+  INSERT INTO RES_CLIENTE_DIA (FECHA, CODI, FACTURAS, DESCUENTO, IGV, TOTAL)
+  VALUES (COALESCE(NEW.FECEM, ''), NEW.CODI, 1, NEW."DESC", NEW.IGV, NEW.TOTFAC)
+  ON CONFLICT (FECHA, CODI) DO UPDATE SET
+    FACTURAS = FACTURAS + 1, DESCUENTO = DESCUENTO + excluded.DESCUENTO,
+    IGV = IGV + excluded.IGV, TOTAL = TOTAL + excluded.TOTAL;
+  UPDATE RES_TOTALES SET FILAS = FILAS + 1 WHERE TABLA = 'FACTURA';
+END;
+
+-- Alta de línea: unidades y subtotal (la cabecera ya existe por la FK)
+CREATE TRIGGER IF NOT EXISTS TR_DETALLE_RES_INS AFTER INSERT ON DETALLE_FACTURA
+BEGIN
+  INSERT INTO RES_VENDEDOR_DIA (FECHA, CODV, UNIDADES, SUBTOTAL)
+  SELECT COALESCE(F.FECEM, ''), F.CODV, NEW.CANT, NEW.PRECLI FROM FACTURA F WHERE F.NFAC = NEW.NFAC
+  ON CONFLICT (FECHA, CODV) DO UPDATE SET
+    UNIDADES = UNIDADES + excluded.UNIDADES, SUBTOTAL = SUBTOTAL + excluded.SUBTOTAL;
+  INSERT INTO RES_CLIENTE_DIA (FECHA, CODI, UNIDADES, SUBTOTAL)
+  SELECT COALESCE(F.FECEM, ''), F.CODI, NEW.CANT, NEW.PRECLI FROM FACTURA F WHERE F.NFAC = NEW.NFAC
+  ON CONFLICT (FECHA, CODI) DO UPDATE SET
+    UNIDADES = UNIDADES + excluded.UNIDADES, SUBTOTAL = SUBTOTAL + excluded.SUBTOTAL;
+  INSERT INTO RES_PRODUCTO_DIA (FECHA, CODT, LINEAS, UNIDADES, SUBTOTAL, DESCUENTO, IGV, TOTAL)
+  SELECT COALESCE(F.FECEM, ''), NEW.CODT, 1, NEW.CANT, NEW.PRECLI,
+         CASE WHEN F."DESC" + F.TOTFAC - F.IGV > 0 THEN NEW.PRECLI * F."DESC" / (F."DESC" + F.TOTFAC - F.IGV) ELSE 0 END,
+         CASE WHEN F."DESC" + F.TOTFAC - F.IGV > 0 THEN NEW.PRECLI * F.IGV    / (F."DESC" + F.TOTFAC - F.IGV) ELSE 0 END,
+         CASE WHEN F."DESC" + F.TOTFAC - F.IGV > 0 THEN NEW.PRECLI * F.TOTFAC / (F."DESC" + F.TOTFAC - F.IGV) ELSE 0 END
+  FROM FACTURA F WHERE F.NFAC = NEW.NFAC
+  ON CONFLICT (FECHA, CODT) DO UPDATE SET
+    LINEAS = LINEAS + 1, UNIDADES = UNIDADES + excluded.UNIDADES, SUBTOTAL = SUBTOTAL + excluded.SUBTOTAL,
+    DESCUENTO = DESCUENTO + excluded.DESCUENTO, IGV = IGV + excluded.IGV, TOTAL = TOTAL + excluded.TOTAL;
+END;
+
+-- Baja de factura: se descuenta la cabecera y todas sus líneas antes de que
+-- el ON DELETE CASCADE borre el detalle
+-- (salvo al archivar: lo archivado sigue contando en los reportes)
+CREATE TRIGGER IF NOT EXISTS TR_FACTURA_RES_DEL BEFORE DELETE ON FACTURA
+WHEN NOT ((OLD.FECEM <= (SELECT MAX(HASTA) FROM PARTICION WHERE ESTADO = 'archivada')) IS TRUE)
+BEGIN
+  UPDATE RES_VENDEDOR_DIA SET
+    FACTURAS = FACTURAS - 1, DESCUENTO = DESCUENTO - OLD."DESC", IGV = IGV - OLD.IGV, TOTAL = TOTAL - OLD.TOTFAC,
+    UNIDADES = UNIDADES - (SELECT COALESCE(SUM(CANT), 0)   FROM DETALLE_FACTURA WHERE NFAC = OLD.NFAC),
+    SUBTOTAL = SUBTOTAL - (SELECT COALESCE(SUM(PRECLI), 0) FROM DETALLE_FACTURA WHERE NFAC = OLD.NFAC)
+  WHERE FECHA = COALESCE(OLD.FECEM, '') AND CODV = OLD.CODV;
+  UPDATE RES_CLIENTE_DIA SET
+    FACTURAS = FACTURAS - 1, DESCUENTO = DESCUENTO - OLD."DESC", IGV = IGV - OLD.IGV, TOTAL = TOTAL - OLD.TOTFAC,
+    UNIDADES = UNIDADES - (SELECT COALESCE(SUM(CANT), 0)   FROM DETALLE_FACTURA WHERE NFAC = OLD.NFAC),
+    SUBTOTAL = SUBTOTAL - (SELECT COALESCE(SUM(PRECLI), 0) FROM DETALLE_FACTURA WHERE NFAC = OLD.NFAC)
+  WHERE FECHA = COALESCE(OLD.FECEM, '') AND CODI = OLD.CODI;
+  UPDATE RES_PRODUCTO_DIA SET
+    LINEAS = LINEAS - 1, UNIDADES = UNIDADES - D.CANT, SUBTOTAL = SUBTOTAL - D.PRECLI,
+    DESCUENTO = DESCUENTO - D.PRECLI * D.R_DESC, IGV = IGV - D.PRECLI * D.R_IGV, TOTAL = TOTAL - D.PRECLI * D.R_TOT
+  FROM (SELECT CODT, CANT, PRECLI,
+               CASE WHEN OLD."DESC" + OLD.TOTFAC - OLD.IGV > 0 THEN OLD."DESC" / (OLD."DESC" + OLD.TOTFAC - OLD.IGV) ELSE 0 END AS R_DESC,
+               CASE WHEN OLD."DESC" + OLD.TOTFAC - OLD.IGV > 0 THEN OLD.IGV    / (OLD."DESC" + OLD.TOTFAC - OLD.IGV) ELSE 0 END AS R_IGV,
+               CASE WHEN OLD."DESC" + OLD.TOTFAC - OLD.IGV > 0 THEN OLD.TOTFAC / (OLD."DESC" + OLD.TOTFAC - OLD.IGV) ELSE 0 END AS R_TOT
+        FROM DETALLE_FACTURA WHERE NFAC = OLD.NFAC) AS D
+  WHERE RES_PRODUCTO_DIA.FECHA = COALESCE(OLD.FECEM, '') AND RES_PRODUCTO_DIA.CODT = D.CODT;
+  UPDATE RES_TOTALES SET FILAS = FILAS - 1 WHERE TABLA = 'FACTURA';
+END;
+
+-- Baja de una línea suelta (si la cabecera ya no existe, lo hizo el trigger anterior)
+CREATE TRIGGER IF NOT EXISTS TR_DETALLE_RES_DEL AFTER DELETE ON DETALLE_FACTURA
+WHEN EXISTS (SELECT 1 FROM FACTURA WHERE NFAC = OLD.NFAC)
+BEGIN
+  UPDATE RES_VENDEDOR_DIA SET UNIDADES = UNIDADES - OLD.CANT, SUBTOTAL = SUBTOTAL - OLD.PRECLI
+  WHERE (FECHA, CODV) = (SELECT COALESCE(FECEM, ''), CODV FROM FACTURA WHERE NFAC = OLD.NFAC);
+  UPDATE RES_CLIENTE_DIA SET UNIDADES = UNIDADES - OLD.CANT, SUBTOTAL = SUBTOTAL - OLD.PRECLI
+  WHERE (FECHA, CODI) = (SELECT COALESCE(FECEM, ''), CODI FROM FACTURA WHERE NFAC = OLD.NFAC);
+  UPDATE RES_PRODUCTO_DIA SET
+    LINEAS = LINEAS - 1, UNIDADES = UNIDADES - OLD.CANT, SUBTOTAL = SUBTOTAL - OLD.PRECLI,
+    DESCUENTO = DESCUENTO            - CASE WHEN F."DESC" + F.TOTFAC - F.IGV > 0 THEN OLD.PRECLI * F."DESC" / (F."DESC" + F.TOTFAC - F.IGV) ELSE 0 END,
+    IGV       = RES_PRODUCTO_DIA.IGV - CASE WHEN F."DESC" + F.TOTFAC - F.IGV > 0 THEN OLD.PRECLI * F.IGV    / (F."DESC" + F.TOTFAC - F.IGV) ELSE 0 END,
+    TOTAL     = TOTAL                - CASE WHEN F."DESC" + F.TOTFAC - F.IGV > 0 THEN OLD.PRECLI * F.TOTFAC / (F."DESC" + F.TOTFAC - F.IGV) ELSE 0 END
+  FROM FACTURA F
+  WHERE F.NFAC = OLD.NFAC AND RES_PRODUCTO_DIA.FECHA = COALESCE(F.FECEM, '') AND RES_PRODUCTO_DIA.CODT = OLD.CODT;
+END;
+
+-- Cambio de cabecera (fecha, cliente, vendedor o importes): sale todo lo que
+-- la factura y sus líneas aportaban con los valores anteriores y entra con
+-- los nuevos
+CREATE TRIGGER IF NOT EXISTS TR_FACTURA_RES_UPD AFTER UPDATE OF FECEM, CODI, CODV, "DESC", IGV, TOTFAC ON FACTURA
+WHEN OLD.FECEM IS NOT NEW.FECEM OR OLD.CODI IS NOT NEW.CODI OR OLD.CODV IS NOT NEW.CODV
+  OR OLD."DESC" IS NOT NEW."DESC" OR OLD.IGV IS NOT NEW.IGV OR OLD.TOTFAC IS NOT NEW.TOTFAC
+BEGIN
+  UPDATE RES_VENDEDOR_DIA SET
+    FACTURAS = FACTURAS - 1, DESCUENTO = DESCUENTO - OLD."DESC", IGV = IGV - OLD.IGV, TOTAL = TOTAL - OLD.TOTFAC,
+    UNIDADES = UNIDADES - (SELECT COALESCE(SUM(CANT), 0)   FROM DETALLE_FACTURA WHERE NFAC = NEW.NFAC),
+    SUBTOTAL = SUBTOTAL - (SELECT COALESCE(SUM(PRECLI), 0) FROM DETALLE_FACTURA WHERE NFAC = NEW.NFAC)
+  WHERE FECHA = COALESCE(OLD.FECEM, '') AND CODV = OLD.CODV;
+  UPDATE RES_CLIENTE_DIA SET
+    FACTURAS = FACTURAS - 1, DESCUENTO = DESCUENTO - OLD."DESC", IGV = IGV - OLD.IGV, TOTAL = TOTAL - OLD.TOTFAC,
+    UNIDADES = UNIDADES - (SELECT COALESCE(SUM(CANT), 0)   FROM DETALLE_FACTURA WHERE NFAC = NEW.NFAC),
+    SUBTOTAL = SUBTOTAL - (SELECT COALESCE(SUM(PRECLI), 0) FROM DETALLE_FACTURA WHERE NFAC = NEW.NFAC)
+  WHERE FECHA = COALESCE(OLD.FECEM, '') AND CODI = OLD.CODI;
+  UPDATE RES_PRODUCTO_DIA SET
+    LINEAS = LINEAS - 1, UNIDADES = UNIDADES - D.CANT, SUBTOTAL = SUBTOTAL - D.PRECLI,
+    DESCUENTO = DESCUENTO - D.PRECLI * D.R_DESC, IGV = IGV - D.PRECLI * D.R_IGV, TOTAL = TOTAL - D.PRECLI * D.R_TOT
+  FROM (SELECT CODT, CANT, PRECLI,
+               CASE WHEN OLD."DESC" + OLD.TOTFAC - OLD.IGV > 0 THEN OLD."DESC" / (OLD."DESC" + OLD.TOTFAC - OLD.IGV) ELSE 0 END AS R_DESC,
+               CASE WHEN OLD."DESC" + OLD.TOTFAC - OLD.IGV > 0 THEN OLD.IGV    / (OLD."DESC" + OLD.TOTFAC - OLD.IGV) ELSE 0 END AS R_IGV,
+               CASE WHEN OLD."DESC" + OLD.TOTFAC - OLD.IGV > 0 THEN OLD.TOTFAC / (OLD."DESC" + OLD.TOTFAC - OLD.IGV) ELSE 0 END AS R_TOT
+        FROM DETALLE_FACTURA WHERE NFAC = NEW.NFAC) AS D
+  WHERE RES_PRODUCTO_DIA.FECHA = COALESCE(OLD.FECEM, '') AND RES_PRODUCTO_DIA.CODT = D.CODT;
+
+  INSERT INTO RES_VENDEDOR_DIA (FECHA, CODV, FACTURAS, UNIDADES, SUBTOTAL, DESCUENTO, IGV, TOTAL)
+  SELECT COALESCE(NEW.FECEM, ''), NEW.CODV, 1, COALESCE(SUM(CANT), 0), COALESCE(SUM(PRECLI), 0),
+         NEW."DESC", NEW.IGV, NEW.TOTFAC
+  FROM DETALLE_FACTURA WHERE NFAC = NEW.NFAC
+  ON CONFLICT (FECHA, CODV) DO UPDATE SET
+    FACTURAS = FACTURAS + 1, UNIDADES = UNIDADES + excluded.UNIDADES, SUBTOTAL = SUBTOTAL + excluded.SUBTOTAL,
+    DESCUENTO = DESCUENTO + excluded.DESCUENTO, IGV = IGV + excluded.IGV, TOTAL = TOTAL + excluded.TOTAL;
+  INSERT INTO RES_CLIENTE_DIA (FECHA, CODI, FACTURAS, UNIDADES, SUBTOTAL, DESCUENTO, IGV, TOTAL)
+  SELECT COALESCE(NEW.FECEM, ''), NEW.CODI, 1, COALESCE(SUM(CANT), 0), COALESCE(SUM(PRECLI), 0),
+         NEW."DESC", NEW.IGV, NEW.TOTFAC
+  FROM DETALLE_FACTURA WHERE NFAC = NEW.NFAC
+  ON CONFLICT (FECHA, CODI) DO UPDATE SET
+    FACTURAS = FACTURAS + 1, UNIDADES = UNIDADES + excluded.UNIDADES, SUBTOTAL = SUBTOTAL + excluded.SUBTOTAL,
+    DESCUENTO = DESCUENTO + excluded.DESCUENTO, IGV = IGV + excluded.IGV, TOTAL = TOTAL + excluded.TOTAL;
+  INSERT INTO RES_PRODUCTO_DIA (FECHA, CODT, LINEAS, UNIDADES, SUBTOTAL, DESCUENTO, IGV, TOTAL)
+  SELECT COALESCE(NEW.FECEM, ''), CODT, 1, CANT, PRECLI,
+         CASE WHEN NEW."DESC" + NEW.TOTFAC - NEW.IGV > 0 THEN PRECLI * NEW."DESC" / (NEW."DESC" + NEW.TOTFAC - NEW.IGV) ELSE 0 END,
+         CASE WHEN NEW."DESC" + NEW.TOTFAC - NEW.IGV > 0 THEN PRECLI * NEW.IGV    / (NEW."DESC" + NEW.TOTFAC - NEW.IGV) ELSE 0 END,
+         CASE WHEN NEW."DESC" + NEW.TOTFAC - NEW.IGV > 0 THEN PRECLI * NEW.TOTFAC / (NEW."DESC" + NEW.TOTFAC - NEW.IGV) ELSE 0 END
+  FROM DETALLE_FACTURA WHERE NFAC = NEW.NFAC
+  ON CONFLICT (FECHA, CODT) DO UPDATE SET
+    LINEAS = LINEAS + 1, UNIDADES = UNIDADES + excluded.UNIDADES, SUBTOTAL = SUBTOTAL + excluded.SUBTOTAL,
+    DESCUENTO = DESCUENTO + excluded.DESCUENTO, IGV = IGV + excluded.IGV, TOTAL = TOTAL + excluded.TOTAL;
+END;
+
+-- Cambio de una línea (cantidad, importe, producto o factura): se resta la
+-- línea anterior como en la baja y se suma la nueva como en el alta
+CREATE TRIGGER IF NOT EXISTS TR_DETALLE_RES_UPD AFTER UPDATE OF NFAC, CODT, CANT, PRECLI ON DETALLE_FACTURA
+WHEN OLD.NFAC IS NOT NEW.NFAC OR OLD.CODT IS NOT NEW.CODT OR OLD.CANT IS NOT NEW.CANT OR OLD.PRECLI IS NOT NEW.PRECLI
+BEGIN
+  UPDATE RES_VENDEDOR_DIA SET UNIDADES = UNIDADES - OLD.CANT, SUBTOTAL = SUBTOTAL - OLD.PRECLI
+  WHERE (FECHA, CODV) = (SELECT COALESCE(FECEM, ''), CODV FROM FACTURA WHERE NFAC = OLD.NFAC);
+  UPDATE RES_CLIENTE_DIA SET UNIDADES = UNIDADES - OLD.CANT, SUBTOTAL = SUBTOTAL - OLD.PRECLI
+  WHERE (FECHA, CODI) = (SELECT COALESCE(FECEM, ''), CODI FROM FACTURA WHERE NFAC = OLD.NFAC);
+  UPDATE RES_PRODUCTO_DIA SET
+    LINEAS = LINEAS - 1, UNIDADES = UNIDADES - OLD.CANT, SUBTOTAL = SUBTOTAL - OLD.PRECLI,
+    DESCUENTO = DESCUENTO            - CASE WHEN F."DESC" + F.TOTFAC - F.IGV > 0 THEN OLD.PRECLI * F."DESC" / (F."DESC" + F.TOTFAC - F.IGV) ELSE 0 END,
+    IGV       = RES_PRODUCTO_DIA.IGV - CASE WHEN F."DESC" + F.TOTFAC - F.IGV > 0 THEN OLD.PRECLI * F.IGV    / (F."DESC" + F.TOTFAC - F.IGV) ELSE 0 END,
+    TOTAL     = TOTAL                - CASE WHEN F."DESC" + F.TOTFAC - F.IGV > 0 THEN OLD.PRECLI * F.TOTFAC / (F."DESC" + F.TOTFAC - F.IGV) ELSE 0 END
+  FROM FACTURA F
+  WHERE F.NFAC = OLD.NFAC AND RES_PRODUCTO_DIA.FECHA = COALESCE(F.FECEM, '') AND RES_PRODUCTO_DIA.CODT = OLD.CODT;
+
+  INSERT INTO RES_VENDEDOR_DIA (FECHA, CODV, UNIDADES, SUBTOTAL)
+  SELECT COALESCE(F.FECEM, ''), F.CODV, NEW.CANT, NEW.PRECLI FROM FACTURA F WHERE F.NFAC = NEW.NFAC
+  ON CONFLICT (FECHA, CODV) DO UPDATE SET
+    UNIDADES = UNIDADES + excluded.UNIDADES, SUBTOTAL = SUBTOTAL + excluded.SUBTOTAL;
+  INSERT INTO RES_CLIENTE_DIA (FECHA, CODI, UNIDADES, SUBTOTAL)
+  SELECT COALESCE(F.FECEM, ''), F.CODI, NEW.CANT, NEW.PRECLI FROM FACTURA F WHERE F.NFAC = NEW.NFAC
+  ON CONFLICT (FECHA, CODI) DO UPDATE SET
+    UNIDADES = UNIDADES + excluded.UNIDADES, SUBTOTAL = SUBTOTAL + excluded.SUBTOTAL;
+  INSERT INTO RES_PRODUCTO_DIA (FECHA, CODT, LINEAS, UNIDADES, SUBTOTAL, DESCUENTO, IGV, TOTAL)
+  SELECT COALESCE(F.FECEM, ''), NEW.CODT, 1, NEW.CANT, NEW.PRECLI,
+         CASE WHEN F."DESC" + F.TOTFAC - F.IGV > 0 THEN NEW.PRECLI * F."DESC" / (F."DESC" + F.TOTFAC - F.IGV) ELSE 0 END,
+         CASE WHEN F."DESC" + F.TOTFAC - F.IGV > 0 THEN NEW.PRECLI * F.IGV    / (F."DESC" + F.TOTFAC - F.IGV) ELSE 0 END,
+         CASE WHEN F."DESC" + F.TOTFAC - F.IGV > 0 THEN NEW.PRECLI * F.TOTFAC / (F."DESC" + F.TOTFAC - F.IGV) ELSE 0 END
+  FROM FACTURA F WHERE F.NFAC = NEW.NFAC
+  ON CONFLICT (FECHA, CODT) DO UPDATE SET
+    LINEAS = LINEAS + 1, UNIDADES = UNIDADES + excluded.UNIDADES, SUBTOTAL = SUBTOTAL + excluded.SUBTOTAL,
+    DESCUENTO = DESCUENTO + excluded.DESCUENTO, IGV = IGV + excluded.IGV, TOTAL = TOTAL + excluded.TOTAL;
+END;
+
+-- ---------- Años cerrados ----------
+-- Nada se agrega ni cambia con fecha de un año cerrado; mientras se
+-- archiva ('archivando') tampoco se borra. El borrado del propio archivado
+-- ocurre con el año ya 'archivada', en la misma transacción.
+CREATE TRIGGER IF NOT EXISTS TR_FACTURA_CERRADA_INS BEFORE INSERT ON FACTURA
+WHEN NEW.FECEM <= (SELECT MAX(HASTA) FROM PARTICION)
+  OR EXISTS (SELECT 1 FROM FACTURA_ARCHIVADA WHERE NFAC = NEW.NFAC)
+BEGIN SELECT RAISE(ABORT, 'Año cerrado o número de factura ya archivado'); END;
+CREATE TRIGGER IF NOT EXISTS TR_FACTURA_CERRADA_UPD BEFORE UPDATE ON FACTURA
+WHEN OLD.FECEM <= (SELECT MAX(HASTA) FROM PARTICION) OR NEW.FECEM <= (SELECT MAX(HASTA) FROM PARTICION)
+BEGIN SELECT RAISE(ABORT, 'Año cerrado: la factura no se puede modificar'); END;
+CREATE TRIGGER IF NOT EXISTS TR_FACTURA_CERRADA_DEL BEFORE DELETE ON FACTURA
+WHEN OLD.FECEM <= (SELECT MAX(HASTA) FROM PARTICION WHERE ESTADO = 'archivando')
+BEGIN SELECT RAISE(ABORT, 'Año en proceso de archivo: la factura no se puede borrar'); END;
+-- Una línea nueva para una factura de un año cerrado no pasa la FK (la cabecera
+-- ya no está aquí) o, mientras se copia, la detecta el cuadre final de
+-- particiones.archivar: no se paga un trigger más por cada línea importada.
+CREATE TRIGGER IF NOT EXISTS TR_DETALLE_CERRADA_UPD BEFORE UPDATE ON DETALLE_FACTURA
+WHEN (SELECT FECEM FROM FACTURA WHERE NFAC = OLD.NFAC) <= (SELECT MAX(HASTA) FROM PARTICION)
+  OR (SELECT FECEM FROM FACTURA WHERE NFAC = NEW.NFAC) <= (SELECT MAX(HASTA) FROM PARTICION)
+BEGIN SELECT RAISE(ABORT, 'Año cerrado: la factura no se puede modificar'); END;
+CREATE TRIGGER IF NOT EXISTS TR_DETALLE_CERRADA_DEL BEFORE DELETE ON DETALLE_FACTURA
+WHEN (SELECT FECEM FROM FACTURA WHERE NFAC = OLD.NFAC) <= (SELECT MAX(HASTA) FROM PARTICION WHERE ESTADO = 'archivando')
+BEGIN SELECT RAISE(ABORT, 'Año cerrado: la factura no se puede modificar'); END;
+
+-- ---------- Búsqueda (FTS5) ----------
+-- Índices de texto con contenido externo: guardan solo el índice, los datos
+-- siguen en la tabla base. Se sincronizan con triggers.
+CREATE VIRTUAL TABLE IF NOT EXISTS PRODUCTO_FTS USING fts5(
+  CODT, NOMB, content='PRODUCTO', tokenize='unicode61 remove_diacritics 2', prefix='2 3');
+CREATE VIRTUAL TABLE IF NOT EXISTS CLIENTE_FTS USING fts5(
+  CODI, DNI, NOMB, APEL, EMAIL, CALLE, DIST, content='CLIENTE', tokenize='unicode61 remove_diacritics 2', prefix='2 3');
+CREATE VIRTUAL TABLE IF NOT EXISTS VENDEDOR_FTS USING fts5(
+  CODV, NOMB, APEL, content='VENDEDOR', tokenize='unicode61 remove_diacritics 2', prefix='2 3');
+
+CREATE TRIGGER IF NOT EXISTS TR_PRODUCTO_FTS_INS AFTER INSERT ON PRODUCTO BEGIN
+  INSERT INTO PRODUCTO_FTS (rowid, CODT, NOMB) VALUES (NEW.rowid, NEW.CODT, NEW.NOMB);
+END;
+CREATE TRIGGER IF NOT EXISTS TR_PRODUCTO_FTS_DEL AFTER DELETE ON PRODUCTO BEGIN
+  INSERT INTO PRODUCTO_FTS (PRODUCTO_FTS, rowid, CODT, NOMB) VALUES ('delete', OLD.rowid, OLD.CODT, OLD.NOMB);
+END;
+CREATE TRIGGER IF NOT EXISTS TR_PRODUCTO_FTS_UPD AFTER UPDATE ON PRODUCTO BEGIN
+  INSERT INTO PRODUCTO_FTS (PRODUCTO_FTS, rowid, CODT, NOMB) VALUES ('delete', OLD.rowid, OLD.CODT, OLD.NOMB);
+  INSERT INTO PRODUCTO_FTS (rowid, CODT, NOMB) VALUES (NEW.rowid, NEW.CODT, NEW.NOMB);
+END;
+
+CREATE TRIGGER IF NOT EXISTS TR_CLIENTE_FTS_INS AFTER INSERT ON CLIENTE BEGIN
+  INSERT INTO CLIENTE_FTS (rowid, CODI, DNI, NOMB, APEL, EMAIL, CALLE, DIST)
+  VALUES (NEW.rowid, NEW.CODI, NEW.DNI, NEW.NOMB, NEW.APEL, NEW.EMAIL, NEW.CALLE, NEW.DIST);
+END;
+CREATE TRIGGER IF NOT EXISTS TR_CLIENTE_FTS_DEL AFTER DELETE ON CLIENTE BEGIN
+  INSERT INTO CLIENTE_FTS (CLIENTE_FTS, rowid, CODI, DNI, NOMB, APEL, EMAIL, CALLE, DIST)
+  VALUES ('delete', OLD.rowid, OLD.CODI, OLD.DNI, OLD.NOMB, OLD.APEL, OLD.EMAIL, OLD.CALLE, OLD.DIST);
+END;
+CREATE TRIGGER IF NOT EXISTS TR_CLIENTE_FTS_UPD AFTER UPDATE ON CLIENTE BEGIN
+  INSERT INTO CLIENTE_FTS (CLIENTE_FTS, rowid, CODI, DNI, NOMB, APEL, EMAIL, CALLE, DIST)
+  VALUES ('delete', OLD.rowid, OLD.CODI, OLD.DNI, OLD.NOMB, OLD.APEL, OLD.EMAIL, OLD.CALLE, OLD.DIST);
+  INSERT INTO CLIENTE_FTS (rowid, CODI, DNI, NOMB, APEL, EMAIL, CALLE, DIST)
+  VALUES (NEW.rowid, NEW.CODI, NEW.DNI, NEW.NOMB, NEW.APEL, NEW.EMAIL, NEW.CALLE, NEW.DIST);
+END;
+
+CREATE TRIGGER IF NOT EXISTS TR_VENDEDOR_FTS_INS AFTER INSERT ON VENDEDOR BEGIN
+  INSERT INTO VENDEDOR_FTS (rowid, CODV, NOMB, APEL) VALUES (NEW.rowid, NEW.CODV, NEW.NOMB, NEW.APEL);
+END;
+CREATE TRIGGER IF NOT EXISTS TR_VENDEDOR_FTS_DEL AFTER DELETE ON VENDEDOR BEGIN
+  INSERT INTO VENDEDOR_FTS (VENDEDOR_FTS, rowid, CODV, NOMB, APEL) VALUES ('delete', OLD.rowid, OLD.CODV, OLD.NOMB, OLD.APEL);
+END;
+CREATE TRIGGER IF NOT EXISTS TR_VENDEDOR_FTS_UPD AFTER UPDATE ON VENDEDOR BEGIN
+  INSERT INTO VENDEDOR_FTS (VENDEDOR_FTS, rowid, CODV, NOMB, APEL) VALUES ('delete', OLD.rowid, OLD.CODV, OLD.NOMB, OLD.APEL);
+  INSERT INTO VENDEDOR_FTS (rowid, CODV, NOMB, APEL) VALUES (NEW.rowid, NEW.CODV, NEW.NOMB, NEW.APEL);
+END;
+
+-- Documento de factura para buscar por cliente (nombre, DNI, email, dirección),
+-- vendedor o productos de sus líneas. Guarda su propio texto (no es de
+-- contenido externo), así cada documento se reemplaza por rowid sin tener que
+-- reconstruir el texto anterior. rowid = FACTURA.rowid.
+CREATE VIRTUAL TABLE IF NOT EXISTS FACTURA_FTS USING fts5(
+  NFAC, CLIENTE, VENDEDOR, PRODUCTOS, tokenize='unicode61 remove_diacritics 2', prefix='2 3');
+-- Reindexar el documento en cada línea insertada triplicaba el costo de un
+-- alta masiva: los triggers solo anotan qué facturas cambiaron y
+-- busqueda.sincronizar_facturas arma esos documentos de una vez (antes de
+-- cada búsqueda de facturas, o con `flask reindexar-busqueda`).
+CREATE TABLE IF NOT EXISTS FACTURA_FTS_PEND (
+  NFAC  CHAR(10) PRIMARY KEY
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS TR_FACTURA_FTS_INS AFTER INSERT ON FACTURA BEGIN
+  INSERT OR IGNORE INTO FACTURA_FTS_PEND (NFAC) VALUES (NEW.NFAC);
+END;
+CREATE TRIGGER IF NOT EXISTS TR_FACTURA_FTS_DEL AFTER DELETE ON FACTURA BEGIN
+  DELETE FROM FACTURA_FTS WHERE rowid = OLD.rowid;
+  DELETE FROM FACTURA_FTS_PEND WHERE NFAC = OLD.NFAC;
+END;
+CREATE TRIGGER IF NOT EXISTS TR_FACTURA_FTS_UPD AFTER UPDATE OF NFAC, CODI, CODV ON FACTURA BEGIN
+  DELETE FROM FACTURA_FTS WHERE rowid = OLD.rowid;
+  DELETE FROM FACTURA_FTS_PEND WHERE NFAC = OLD.NFAC;
+  INSERT OR IGNORE INTO FACTURA_FTS_PEND (NFAC) VALUES (NEW.NFAC);
+END;
+-- Líneas (en una baja en cascada la factura ya no existe: no se anota)
+CREATE TRIGGER IF NOT EXISTS TR_DETALLE_FTS_INS AFTER INSERT ON DETALLE_FACTURA BEGIN
+  INSERT OR IGNORE INTO FACTURA_FTS_PEND (NFAC) VALUES (NEW.NFAC);
+END;
+CREATE TRIGGER IF NOT EXISTS TR_DETALLE_FTS_DEL AFTER DELETE ON DETALLE_FACTURA
+WHEN EXISTS (SELECT 1 FROM FACTURA WHERE NFAC = OLD.NFAC) BEGIN
+  INSERT OR IGNORE INTO FACTURA_FTS_PEND (NFAC) VALUES (OLD.NFAC);
+END;
+CREATE TRIGGER IF NOT EXISTS TR_DETALLE_FTS_UPD AFTER UPDATE OF NFAC, CODT ON DETALLE_FACTURA BEGIN
+  INSERT OR IGNORE INTO FACTURA_FTS_PEND (NFAC) VALUES (OLD.NFAC), (NEW.NFAC);
+END;
+-- Cambios en maestros: se anotan las facturas que los muestran
+CREATE TRIGGER IF NOT EXISTS TR_CLIENTE_FACFTS_UPD AFTER UPDATE OF NOMB, APEL, DNI, EMAIL, CALLE, DIST ON CLIENTE BEGIN
+  INSERT OR IGNORE INTO FACTURA_FTS_PEND (NFAC) SELECT NFAC FROM FACTURA WHERE CODI = NEW.CODI;
+END;
+CREATE TRIGGER IF NOT EXISTS TR_VENDEDOR_FACFTS_UPD AFTER UPDATE OF NOMB, APEL ON VENDEDOR BEGIN
+  INSERT OR IGNORE INTO FACTURA_FTS_PEND (NFAC) SELECT NFAC FROM FACTURA WHERE CODV = NEW.CODV;
+END;
+CREATE TRIGGER IF NOT EXISTS TR_PRODUCTO_FACFTS_UPD AFTER UPDATE OF NOMB ON PRODUCTO BEGIN
+  INSERT OR IGNORE INTO FACTURA_FTS_PEND (NFAC) SELECT DISTINCT NFAC FROM DETALLE_FACTURA WHERE CODT = NEW.CODT;
+END;
+
+-- ---------- Trabajos en segundo plano ----------
+-- Cola persistente: PDF, exportaciones y reconstrucciones corren fuera de la
+-- petición. ESTADO: pendiente | ejecutando | hecho | error. Un trabajo
+-- 'ejecutando' cuyo LEASE_HASTA venció (proceso caído) vuelve a 'pendiente'.
+CREATE TABLE IF NOT EXISTS TRABAJO (
+  ID            INTEGER PRIMARY KEY,
+  TIPO          TEXT NOT NULL,
+  PARAMS        TEXT NOT NULL DEFAULT '{}',   -- JSON
+  PRIORIDAD     INTEGER NOT NULL DEFAULT 0,   -- mayor = antes
+  ESTADO        TEXT NOT NULL DEFAULT 'pendiente',
+  INTENTOS      INTEGER NOT NULL DEFAULT 0,
+  MAX_INTENTOS  INTEGER NOT NULL DEFAULT 3,
+  AVANCE        REAL NOT NULL DEFAULT 0,      -- 0..1
+  MENSAJE       TEXT,
+  RESULTADO     TEXT,                         -- ruta del archivo generado
+  CREADO        REAL NOT NULL,                -- epoch (s)
+  DISPONIBLE    REAL NOT NULL,                -- no antes de (reintentos con espera)
+  INICIADO      REAL,
+  TERMINADO     REAL,
+  LEASE_HASTA   REAL
+);
+-- Siguiente trabajo: solo se indexan los pendientes
+CREATE INDEX IF NOT EXISTS I_TRABAJO_COLA ON TRABAJO(TIPO, PRIORIDAD DESC, ID) WHERE ESTADO = 'pendiente';
+CREATE INDEX IF NOT EXISTS I_TRABAJO_ESTADO ON TRABAJO(ESTADO, TERMINADO);
+
+-- ---------- Versión de datos por tabla (ETag / 304) ----------
+-- Cada alta, baja o cambio sube VERSION y MODIFICADO (epoch en s) de su tabla;
+-- las páginas que dependen de ella se revalidan con una sola lectura aquí.
+CREATE TABLE IF NOT EXISTS VERSION_TABLA (
+  TABLA       TEXT    PRIMARY KEY,
+  VERSION     INTEGER NOT NULL DEFAULT 0,
+  MODIFICADO  REAL    NOT NULL
+) WITHOUT ROWID;
+INSERT OR IGNORE INTO VERSION_TABLA (TABLA, MODIFICADO)
+SELECT value, (julianday('now') - 2440587.5) * 86400.0
+  FROM json_each('["CLIENTE","PRODUCTO","VENDEDOR","EMPRESA","FACTURA","DETALLE_FACTURA"]');
+
+CREATE TRIGGER IF NOT EXISTS TR_CLIENTE_VER_INS AFTER INSERT ON CLIENTE BEGIN
+  UPDATE VERSION_TABLA SET VERSION = VERSION + 1, MODIFICADO = (julianday('now') - 2440587.5) * 86400.0 WHERE TABLA = 'CLIENTE';
+END;
+CREATE TRIGGER IF NOT EXISTS TR_CLIENTE_VER_UPD AFTER UPDATE ON CLIENTE BEGIN
+  UPDATE VERSION_TABLA SET VERSION = VERSION + 1, MODIFICADO = (julianday('now') - 2440587.5) * 86400.0 WHERE TABLA = 'CLIENTE';
+END;
+CREATE TRIGGER IF NOT EXISTS TR_CLIENTE_VER_DEL AFTER DELETE ON CLIENTE BEGIN
+  UPDATE VERSION_TABLA SET VERSION = VERSION + 1, MODIFICADO = (julianday('now') - 2440587.5) * 86400.0 WHERE TABLA = 'CLIENTE';
+END;
+
+CREATE TRIGGER IF NOT EXISTS TR_PRODUCTO_VER_INS AFTER INSERT ON PRODUCTO BEGIN
+  UPDATE VERSION_TABLA SET VERSION = VERSION + 1, MODIFICADO = (julianday('now') - 2440587.5) * 86400.0 WHERE TABLA = 'PRODUCTO';
+END;
+CREATE TRIGGER IF NOT EXISTS TR_PRODUCTO_VER_UPD AFTER UPDATE ON PRODUCTO BEGIN
+  UPDATE VERSION_TABLA SET VERSION = VERSION + 1, MODIFICADO = (julianday('now') - 2440587.5) * 86400.0 WHERE TABLA = 'PRODUCTO';
+END;
+CREATE TRIGGER IF NOT EXISTS TR_PRODUCTO_VER_DEL AFTER DELETE ON PRODUCTO BEGIN
+  UPDATE VERSION_TABLA SET VERSION = VERSION + 1, MODIFICADO = (julianday('now') - 2440587.5) * 86400.0 WHERE TABLA = 'PRODUCTO';
+END;
+
+CREATE TRIGGER IF NOT EXISTS TR_VENDEDOR_VER_INS AFTER INSERT ON VENDEDOR BEGIN
+  UPDATE VERSION_TABLA SET VERSION = VERSION + 1, MODIFICADO = (julianday('now') - 2440587.5) * 86400.0 WHERE TABLA = 'VENDEDOR';
+END;
+CREATE TRIGGER IF NOT EXISTS TR_VENDEDOR_VER_UPD AFTER UPDATE ON VENDEDOR BEGIN
+  UPDATE VERSION_TABLA SET VERSION = VERSION + 1, MODIFICADO = (julianday('now') - 2440587.5) * 86400.0 WHERE TABLA = 'VENDEDOR';
+END;
+CREATE TRIGGER IF NOT EXISTS TR_VENDEDOR_VER_DEL AFTER DELETE ON VENDEDOR BEGIN
+  UPDATE VERSION_TABLA SET VERSION = VERSION + 1, MODIFICADO = (julianday('now') - 2440587.5) * 86400.0 WHERE TABLA = 'VENDEDOR';
+END;
+
+CREATE TRIGGER IF NOT EXISTS TR_EMPRESA_VER_INS AFTER INSERT ON EMPRESA BEGIN
+  UPDATE VERSION_TABLA SET VERSION = VERSION + 1, MODIFICADO = (julianday('now') - 2440587.5) * 86400.0 WHERE TABLA = 'EMPRESA';
+END;
+CREATE TRIGGER IF NOT EXISTS TR_EMPRESA_VER_UPD AFTER UPDATE ON EMPRESA BEGIN
+  UPDATE VERSION_TABLA SET VERSION = VERSION + 1, MODIFICADO = (julianday('now') - 2440587.5) * 86400.0 WHERE TABLA = 'EMPRESA';
+END;
+CREATE TRIGGER IF NOT EXISTS TR_EMPRESA_VER_DEL AFTER DELETE ON EMPRESA BEGIN
+  UPDATE VERSION_TABLA SET VERSION = VERSION + 1, MODIFICADO = (julianday('now') - 2440587.5) * 86400.0 WHERE TABLA = 'EMPRESA';
+END;
+
+CREATE TRIGGER IF NOT EXISTS TR_FACTURA_VER_INS AFTER INSERT ON FACTURA BEGIN
+  UPDATE VERSION_TABLA SET VERSION = VERSION + 1, MODIFICADO = (julianday('now') - 2440587.5) * 86400.0 WHERE TABLA = 'FACTURA';
+END;
+CREATE TRIGGER IF NOT EXISTS TR_FACTURA_VER_UPD AFTER UPDATE ON FACTURA BEGIN
+  UPDATE VERSION_TABLA SET VERSION = VERSION + 1, MODIFICADO = (julianday('now') - 2440587.5) * 86400.0 WHERE TABLA = 'FACTURA';
+END;
+CREATE TRIGGER IF NOT EXISTS TR_FACTURA_VER_DEL AFTER DELETE ON FACTURA BEGIN
+  UPDATE VERSION_TABLA SET VERSION = VERSION + 1, MODIFICADO = (julianday('now') - 2440587.5) * 86400.0 WHERE TABLA = 'FACTURA';
+END;
 
-CREATE INDEX IF NOT EXISTS I_NFAC  ON FACTURA(NFAC);
\ No newline at end of file
+CREATE TRIGGER IF NOT EXISTS TR_DETALLE_FACTURA_VER_INS AFTER INSERT ON DETALLE_FACTURA BEGIN
+  UPDATE VERSION_TABLA SET VERSION = VERSION + 1, MODIFICADO = (julianday('now') - 2440587.5) * 86400.0 WHERE TABLA = 'DETALLE_FACTURA';
+END;
+CREATE TRIGGER IF NOT EXISTS TR_DETALLE_FACTURA_VER_UPD AFTER UPDATE ON DETALLE_FACTURA BEGIN
+  UPDATE VERSION_TABLA SET VERSION = VERSION + 1, MODIFICADO = (julianday('now') - 2440587.5) * 86400.0 WHERE TABLA = 'DETALLE_FACTURA';
+END;
+CREATE TRIGGER IF NOT EXISTS TR_DETALLE_FACTURA_VER_DEL AFTER DELETE ON DETALLE_FACTURA BEGIN
+  UPDATE VERSION_TABLA SET VERSION = VERSION + 1, MODIFICADO = (julianday('now') - 2440587.5) * 86400.0 WHERE TABLA = 'DETALLE_FACTURA';
+END;
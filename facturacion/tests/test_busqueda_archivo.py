@@ -0,0 +1,47 @@
+import sqlite3
+
+import pytest
+
+import busqueda
+from app import SCHEMA_PATH, seed
+from lote_facturas import importar_facturas
+from particiones import Particiones
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = sqlite3.connect(str(tmp_path / "activa.db"))
+    db.row_factory = sqlite3.Row
+    with open(SCHEMA_PATH, encoding="utf-8") as f:
+        db.executescript(f.read())
+    seed(db)
+    db.commit()
+    regs = [{"NFAC": nfac, "FECEM": fecem, "CODI": "C00001", "CODV": "V0001",
+             "items": [{"CODT": codt, "CANT": 1}]}
+            for nfac, fecem, codt in (("A1", "2020-05-10", "P00003"), ("A2", "2020-06-11", "P00001"),
+                                      ("B1", "2026-02-01", "P00003"))]
+    assert importar_facturas(db, enumerate(regs, start=1), 0.18)["insertadas"] == 3
+    return db
+
+
+def _nfacs(filas):
+    return sorted(f["NFAC"] for f in filas)
+
+
+def test_facturas_archivadas_siguen_en_la_busqueda(db, tmp_path):
+    part = Particiones(str(tmp_path / "archivo"))
+    part.archivar(db, 2020)
+
+    filas, _ = busqueda.buscar_facturas(db, "archivador", particiones=part)
+    assert _nfacs(filas) == ["A1", "B1"]
+    a1 = next(f for f in filas if f["NFAC"] == "A1")
+    assert a1["FECEM"] == "2020-05-10" and a1["TOTFAC"] > 0  # leída de la BD del año
+
+    # Sin particiones solo se busca en la BD activa
+    assert _nfacs(busqueda.buscar_facturas(db, "archivador")[0]) == ["B1"]
+
+    # Reconstruir (p. ej. tras un VACUUM) conserva los documentos archivados
+    busqueda.reconstruir(db, part.recorrer(db))
+    assert _nfacs(busqueda.buscar_facturas(db, "cuaderno", particiones=part)[0]) == ["A2"]
+    busqueda.asegurar_indices(db, part.recorrer(db))
+    assert _nfacs(busqueda.buscar_facturas(db, "archivador", particiones=part)[0]) == ["A1", "B1"]
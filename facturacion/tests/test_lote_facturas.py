@@ -0,0 +1,88 @@
+import io
+import json
+import sqlite3
+
+import pytest
+
+import lote_facturas
+from app import SCHEMA_PATH, seed
+from lote_facturas import importar_facturas, leer_archivo
+
+IGV = 0.18
+
+
+@pytest.fixture
+def db():
+    db = sqlite3.connect(":memory:")
+    db.row_factory = sqlite3.Row
+    with open(SCHEMA_PATH, encoding="utf-8") as f:
+        db.executescript(f.read())
+    seed(db)
+    db.commit()
+    return db
+
+
+def _factura(nfac, **extra):
+    reg = {"NFAC": nfac, "FECEM": "2026-09-15", "CODI": "C00001", "CODV": "V0001",
+           "items": [{"CODT": "P00001", "CANT": 2}]}
+    reg.update(extra)
+    return reg
+
+
+def _jsonl(*lineas):
+    texto = "\n".join(l if isinstance(l, str) else json.dumps(l) for l in lineas)
+    return leer_archivo(io.BytesIO(texto.encode("utf-8")), "jsonl")
+
+
+def _nfacs(db):
+    return {r[0] for r in db.execute("SELECT NFAC FROM FACTURA")}
+
+
+def test_filas_malformadas_no_detienen_la_carga(db):
+    res = importar_facturas(db, _jsonl(
+        _factura("X1", items=["P00001"]),
+        _factura("X2", items="P00001"),
+        _factura("X3", items={"CODT": "P00001", "CANT": 1}),
+        _factura("X4", DESCPCT="nan"),
+        _factura("X5", items=[{"CODT": "P00001", "CANT": "Infinity"}]),
+        "{no es json",
+        "[1, 2]",
+        _factura("X8", FECEM="20260915"),
+    ), IGV)
+
+    assert res["insertadas"] == 1
+    assert [e["linea"] for e in res["errores"]] == [1, 2, 3, 4, 5, 6, 7]
+    assert _nfacs(db) == {"X8"}
+    # La fecha se guarda en su forma canónica
+    assert db.execute("SELECT FECEM FROM FACTURA WHERE NFAC = 'X8'").fetchone()[0] == "2026-09-15"
+
+
+def test_nfac_repetido_en_el_archivo(db):
+    res = importar_facturas(db, _jsonl(_factura("X1"), _factura("X2"), _factura("X1")), IGV)
+
+    assert res["insertadas"] == 2
+    assert res["errores"] == [{"linea": 3, "NFAC": "X1", "error": "NFAC X1 repetido en el lote."}]
+
+
+def test_error_de_integridad_reintenta_por_factura(db, monkeypatch):
+    original = lote_facturas._insertar
+    llamadas = []
+
+    def insertar(db, cabeceras, detalles):
+        if not llamadas:
+            # Otro proceso registra X2 entre la validación y la inserción del lote
+            original(db, [c for c in cabeceras if c[0] == "X2"], [d for d in detalles if d[0] == "X2"])
+            db.commit()
+        llamadas.append(len(cabeceras))
+        original(db, cabeceras, detalles)
+
+    monkeypatch.setattr(lote_facturas, "_insertar", insertar)
+    res = importar_facturas(db, _jsonl(_factura("X1"), _factura("X2"), _factura("X3"), _factura("X4", CODI="NO")),
+                            IGV)
+
+    assert llamadas == [3, 1, 1, 1]  # el lote entero y, tras el IntegrityError, una por una
+    assert res["insertadas"] == 2
+    assert [(e["linea"], e["NFAC"]) for e in res["errores"]] == [(4, "X4"), (2, "X2")]
+    assert "UNIQUE" in res["errores"][1]["error"]
+    assert _nfacs(db) == {"X1", "X2", "X3"}
+    assert db.execute("SELECT COUNT(*) FROM DETALLE_FACTURA").fetchone()[0] == 3
@@ -0,0 +1,100 @@
+import contextlib
+import sqlite3
+import threading
+
+import pytest
+
+from numeracion import Numerador
+
+ESQUEMA = """
+CREATE TABLE SERIE (SERIE TEXT PRIMARY KEY, ULTIMO INTEGER NOT NULL DEFAULT 0, ANCHO INTEGER NOT NULL DEFAULT 10);
+CREATE TABLE FACTURA (NFAC TEXT PRIMARY KEY, HILO INTEGER);
+INSERT INTO SERIE (SERIE) VALUES ('F');
+"""
+
+
+@pytest.fixture
+def ruta(tmp_path):
+    ruta = str(tmp_path / "num.db")
+    db = sqlite3.connect(ruta)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.executescript(ESQUEMA)
+    # Facturas importadas con NFAC propio dentro del rango que se va a emitir
+    db.executemany("INSERT INTO FACTURA VALUES (?, NULL)", [("F000000003",), ("F000000010",), ("F000000011",)])
+    db.commit()
+    db.close()
+    return ruta
+
+
+def _conectar(ruta):
+    return sqlite3.connect(ruta, timeout=10, check_same_thread=False)
+
+
+def _conexion(ruta):
+    @contextlib.contextmanager
+    def conexion():
+        db = _conectar(ruta)
+        try:
+            yield db
+        finally:
+            db.close()
+    return conexion
+
+
+def _insertar(k):
+    return lambda db, nfac: db.execute("INSERT INTO FACTURA VALUES (?, ?)", (nfac, k))
+
+
+@pytest.mark.parametrize("tam_bloque", [1, 4])
+def test_hilos_concurrentes_sin_repetidos_ni_perdidos(ruta, tam_bloque):
+    numerador = Numerador(_conexion(ruta), tam_bloque=tam_bloque)
+    hilos, por_hilo = 8, 25
+    emitidas, errores = [], []
+
+    def trabajar(k):
+        db = _conectar(ruta)
+        try:
+            for _ in range(por_hilo):
+                try:
+                    emitidas.append(numerador.emitir(db, "F", _insertar(k)))
+                except sqlite3.Error as e:
+                    errores.append(e)
+        finally:
+            db.close()
+
+    ts = [threading.Thread(target=trabajar, args=(k,)) for k in range(hilos)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+
+    assert errores == []
+    assert len(emitidas) == len(set(emitidas)) == hilos * por_hilo
+    db = _conectar(ruta)
+    en_bd = {r[0] for r in db.execute("SELECT NFAC FROM FACTURA WHERE HILO IS NOT NULL")}
+    assert en_bd == set(emitidas)
+    if tam_bloque == 1:
+        ultimo = db.execute("SELECT ULTIMO FROM SERIE").fetchone()[0]
+        assert ultimo == hilos * por_hilo + 3  # sin huecos: solo se saltan las 3 importadas
+
+
+def test_bloque_salta_numero_ocupado_tras_reservar(ruta):
+    numerador = Numerador(_conexion(ruta), tam_bloque=4)
+    db = _conectar(ruta)
+    assert numerador.emitir(db, "F", _insertar(0)) == "F000000001"
+    # Otro camino ocupa el siguiente número del bloque ya reservado
+    db.execute("INSERT INTO FACTURA VALUES ('F000000002', NULL)")
+    db.commit()
+    assert numerador.emitir(db, "F", _insertar(0)) == "F000000004"
+
+
+def test_bloque_no_recicla_numero_con_error_de_integridad(ruta):
+    numerador = Numerador(_conexion(ruta), tam_bloque=4)
+    db = _conectar(ruta)
+
+    def falla(db, nfac):
+        raise sqlite3.IntegrityError("UNIQUE constraint failed: FACTURA.NFAC")
+
+    with pytest.raises(sqlite3.IntegrityError):
+        numerador.emitir(db, "F", falla)
+    assert numerador.emitir(db, "F", _insertar(0)) == "F000000002"
@@ -0,0 +1,269 @@
+"""Cola de trabajos en segundo plano persistida en la tabla TRABAJO.
+
+Las tareas pesadas (PDF, ZIP de PDF, exportaciones, reconstrucción de
+resúmenes) se encolan desde la petición, que responde de inmediato con el id;
+un grupo de hilos las ejecuta por prioridad y deja el archivo resultante en
+`directorio`. Cada tipo tiene su límite de trabajos simultáneos y sus
+reintentos (con espera creciente); los ValueError se consideran errores de
+datos y no se reintentan.
+
+Como la cola vive en la BD, los hilos pueden correr dentro del proceso web
+o en un proceso aparte (`flask trabajos`), y un trabajo que quedó a medias
+porque su proceso murió vuelve a la cola cuando vence su lease. Los límites
+por tipo se cuentan por proceso.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+SQL_TOMAR = """
+UPDATE TRABAJO
+   SET ESTADO = 'ejecutando', INTENTOS = INTENTOS + 1, INICIADO = :ahora,
+       LEASE_HASTA = :lease, AVANCE = 0
+ WHERE ID = (SELECT ID FROM TRABAJO
+              WHERE ESTADO = 'pendiente' AND DISPONIBLE <= :ahora
+                AND TIPO IN (SELECT value FROM json_each(:tipos))
+              ORDER BY PRIORIDAD DESC, ID
+              LIMIT 1)
+RETURNING ID, TIPO, PARAMS, INTENTOS, MAX_INTENTOS
+"""
+
+COLUMNAS = ("ID, TIPO, PARAMS, PRIORIDAD, ESTADO, INTENTOS, MAX_INTENTOS, AVANCE, MENSAJE, "
+            "RESULTADO, CREADO, INICIADO, TERMINADO")
+
+
+class Trabajo:
+    """Lo que recibe la función de cada tipo: parámetros, avance y archivo de salida."""
+
+    def __init__(self, cola, id, tipo, params, intento):
+        self.cola = cola
+        self.id = id
+        self.tipo = tipo
+        self.params = params
+        self.intento = intento
+        self._ultimo = 0.0
+
+    def avance(self, hecho, total=None, mensaje=None):
+        """Publica el avance (a lo más dos veces por segundo, salvo al completar)."""
+        ahora = time.monotonic()
+        completo = total is not None and hecho >= total
+        if not completo and ahora - self._ultimo < 0.5:
+            return
+        self._ultimo = ahora
+        fraccion = min(1.0, hecho / total) if total else None
+        with self.cola.conexion() as db:
+            db.execute("UPDATE TRABAJO SET AVANCE = COALESCE(?, AVANCE), MENSAJE = COALESCE(?, MENSAJE) "
+                       "WHERE ID = ?", (fraccion, mensaje, self.id))
+            db.commit()
+
+    def archivo(self, nombre):
+        """Ruta donde escribir el resultado; `nombre` es el que verá quien lo descargue."""
+        return os.path.join(self.cola.directorio, f"{self.id}-{nombre}")
+
+
+class ColaTrabajos:
+    def __init__(self, conexion, directorio, hilos=2, espera=1.0, lease=120.0, retencion=24 * 3600):
+        """`conexion()` debe devolver un context manager que entregue una conexión a la BD."""
+        self.conexion = conexion
+        self.directorio = directorio
+        self.hilos = hilos
+        self.espera = espera            # s entre consultas a la cola si nadie avisa
+        self.lease = lease              # s sin latido para dar por muerto un trabajo
+        self.retencion = retencion      # s que se guardan los trabajos terminados
+        self._tipos = {}
+        self._en_curso = {}             # tipo -> trabajos corriendo en este proceso
+        self._ids = set()
+        self._lock = threading.Lock()
+        self._aviso = threading.Condition(self._lock)
+        self._tomando = threading.Lock()  # serializa _tomar sin retener _lock durante la consulta
+        self._hilos = []
+        self._parar = threading.Event()
+        self._pid = None
+
+    # ---------- Registro y envío ----------
+    def registrar(self, tipo, funcion, concurrencia=1, reintentos=2, prioridad=0):
+        """`funcion(db, trabajo)` hace el trabajo y devuelve la ruta del resultado (o None).
+
+        `reintentos` cuenta los intentos después del primero.
+        """
+        self._tipos[tipo] = {"funcion": funcion, "concurrencia": concurrencia,
+                             "intentos": reintentos + 1, "prioridad": prioridad}
+        self._en_curso.setdefault(tipo, 0)
+
+    @property
+    def tipos(self):
+        return sorted(self._tipos)
+
+    def encolar(self, db, tipo, params=None, prioridad=None):
+        t = self._tipos.get(tipo)
+        if t is None:
+            raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+        ahora = time.time()
+        cur = db.execute("INSERT INTO TRABAJO (TIPO, PARAMS, PRIORIDAD, MAX_INTENTOS, CREADO, DISPONIBLE) "
+                         "VALUES (?,?,?,?,?,?)",
+                         (tipo, json.dumps(params or {}, ensure_ascii=False),
+                          t["prioridad"] if prioridad is None else int(prioridad), t["intentos"], ahora, ahora))
+        db.commit()
+        with self._aviso:
+            self._aviso.notify()
+        return cur.lastrowid
+
+    def estado(self, db, id):
+        fila = db.execute(f"SELECT {COLUMNAS} FROM TRABAJO WHERE ID = ?", (id,)).fetchone()
+        return _a_dict(fila) if fila else None
+
+    def listar(self, db, estado=None, limite=50):
+        where, params = ("WHERE ESTADO = ?", [estado]) if estado else ("", [])
+        filas = db.execute(f"SELECT {COLUMNAS} FROM TRABAJO {where} ORDER BY ID DESC LIMIT ?",
+                           params + [limite])
+        return [_a_dict(f) for f in filas]
+
+    # ---------- Hilos ----------
+    def iniciar(self):
+        """Arranca los hilos (una vez por proceso; tras un fork se vuelven a crear)."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._parar.clear()
+            self._en_curso = dict.fromkeys(self._tipos, 0)
+            self._ids = set()
+            os.makedirs(self.directorio, exist_ok=True)
+            self._hilos = [threading.Thread(target=self._bucle, name=f"trabajos-{i}", daemon=True)
+                           for i in range(self.hilos)]
+            self._hilos.append(threading.Thread(target=self._mantenimiento, name="trabajos-lease", daemon=True))
+        for h in self._hilos:
+            h.start()
+
+    def detener(self, esperar=True):
+        self._parar.set()
+        with self._aviso:
+            self._aviso.notify_all()
+        if esperar:
+            for h in self._hilos:
+                h.join()
+        self._pid = None
+
+    def resumen(self):
+        with self._lock:
+            return {"hilos": len(self._hilos) - 1 if self._hilos else 0,
+                    "en_curso": dict(self._en_curso),
+                    "limites": {t: v["concurrencia"] for t, v in self._tipos.items()}}
+
+    def _tomar(self):
+        # Bajo _tomando: dos hilos no pueden pasar a la vez el límite de un tipo
+        # (los cupos solo se ocupan aquí). La consulta va fuera de _lock para
+        # no hacer esperar a encolar() ni a los avisos. Entre procesos, el
+        # UPDATE ... RETURNING es atómico.
+        with self._tomando:
+            with self._lock:
+                libres = [t for t, v in self._tipos.items() if self._en_curso[t] < v["concurrencia"]]
+            if not libres:
+                return None
+            ahora = time.time()
+            with self.conexion() as db:
+                fila = db.execute(SQL_TOMAR, {"ahora": ahora, "lease": ahora + self.lease,
+                                              "tipos": json.dumps(libres)}).fetchone()
+                db.commit()
+            if fila is None:
+                return None
+            with self._lock:
+                self._en_curso[fila["TIPO"]] += 1
+                self._ids.add(fila["ID"])
+            return fila
+
+    def _bucle(self):
+        while not self._parar.is_set():
+            try:
+                fila = self._tomar()
+            except Exception:
+                log.exception("No se pudo leer la cola de trabajos")
+                fila = None
+            if fila is None:
+                with self._aviso:
+                    self._aviso.wait(self.espera)
+                continue
+            try:
+                self._ejecutar(fila)
+            finally:
+                with self._aviso:
+                    self._en_curso[fila["TIPO"]] -= 1
+                    self._ids.discard(fila["ID"])
+                    self._aviso.notify_all()  # quedó un cupo de ese tipo
+
+    def _ejecutar(self, fila):
+        id, tipo, intento = fila["ID"], fila["TIPO"], fila["INTENTOS"]
+        trabajo = Trabajo(self, id, tipo, json.loads(fila["PARAMS"]), intento)
+        t0 = time.perf_counter()
+        try:
+            with self.conexion() as db:
+                resultado = self._tipos[tipo]["funcion"](db, trabajo)
+        except Exception as e:
+            definitivo = isinstance(e, ValueError) or intento >= fila["MAX_INTENTOS"]
+            log.warning("Trabajo %s (%s) falló en el intento %s: %s", id, tipo, intento, e,
+                        exc_info=not isinstance(e, ValueError))
+            ahora = time.time()
+            with self.conexion() as db:
+                if definitivo:
+                    db.execute("UPDATE TRABAJO SET ESTADO='error', MENSAJE=?, TERMINADO=?, LEASE_HASTA=NULL "
+                               "WHERE ID=?", (str(e) or type(e).__name__, ahora, id))
+                else:
+                    espera = min(300, 2 ** intento)
+                    db.execute("UPDATE TRABAJO SET ESTADO='pendiente', MENSAJE=?, DISPONIBLE=?, LEASE_HASTA=NULL "
+                               "WHERE ID=?", (f"Intento {intento} falló: {e}", ahora + espera, id))
+                db.commit()
+            return
+        with self.conexion() as db:
+            db.execute("UPDATE TRABAJO SET ESTADO='hecho', AVANCE=1, RESULTADO=?, TERMINADO=?, LEASE_HASTA=NULL "
+                       "WHERE ID=?", (resultado, time.time(), id))
+            db.commit()
+        log.info("Trabajo %s (%s) terminado en %.2fs", id, tipo, time.perf_counter() - t0)
+
+    def _mantenimiento(self):
+        """Renueva el lease de lo que corre aquí, recupera trabajos huérfanos y purga los viejos."""
+        ultimo_purgado = 0.0
+        while not self._parar.wait(self.lease / 4):
+            try:
+                ahora = time.time()
+                with self._lock:
+                    ids = list(self._ids)
+                with self.conexion() as db:
+                    if ids:
+                        db.execute("UPDATE TRABAJO SET LEASE_HASTA=? WHERE ID IN (SELECT value FROM json_each(?))",
+                                   (ahora + self.lease, json.dumps(ids)))
+                    db.execute("""UPDATE TRABAJO
+                                     SET ESTADO = CASE WHEN INTENTOS >= MAX_INTENTOS THEN 'error' ELSE 'pendiente' END,
+                                         TERMINADO = CASE WHEN INTENTOS >= MAX_INTENTOS THEN ? END,
+                                         MENSAJE = 'Proceso interrumpido', LEASE_HASTA = NULL
+                                   WHERE ESTADO = 'ejecutando' AND LEASE_HASTA < ?""", (ahora, ahora))
+                    db.commit()
+                    if ahora - ultimo_purgado > 3600:
+                        self.purgar(db, ahora - self.retencion)
+                        ultimo_purgado = ahora
+            except Exception:
+                log.exception("Mantenimiento de la cola de trabajos")
+
+    def purgar(self, db, antes_de):
+        """Borra los trabajos terminados antes de `antes_de` (epoch) y sus archivos."""
+        filas = db.execute("SELECT ID, RESULTADO FROM TRABAJO WHERE ESTADO IN ('hecho','error') "
+                           "AND TERMINADO < ?", (antes_de,)).fetchall()
+        for f in filas:
+            if f["RESULTADO"]:
+                try:
+                    os.remove(f["RESULTADO"])
+                except FileNotFoundError:
+                    pass
+        db.execute("DELETE FROM TRABAJO WHERE ID IN (SELECT value FROM json_each(?))",
+                   (json.dumps([f["ID"] for f in filas]),))
+        db.commit()
+        return len(filas)
+
+
+def _a_dict(fila):
+    d = {k.lower(): fila[k] for k in fila.keys()}
+    d["params"] = json.loads(d["params"])
+    return d
@@ -0,0 +1,27 @@
+import re
+
+
+# --------- Validaciones comunes ----------
+def _not_empty(*vals):
+    return all(v is not None and str(v).strip() != "" for v in vals)
+
+def valid_dni(dni: str) -> bool:
+    return bool(re.fullmatch(r"\d{8}", dni or ""))
+
+def valid_telf(telf: str) -> bool:
+    return bool(re.fullmatch(r"\d{6,15}", telf or ""))  # ajusta rango si quieres
+
+def valid_email(email: str) -> bool:
+    return bool(re.fullmatch(r"[^@\s]+@[^@\s]+\.[^@\s]+", email or ""))
+
+def valid_ruc(ruc: str) -> bool:
+    return bool(re.fullmatch(r"\d{11}", ruc or ""))
+
+def valid_precio(precio: str) -> bool:
+    try:
+        return float(precio) >= 0
+    except:
+        return False
+
+def valid_unidad(unid: str) -> bool:
+    return len((unid or "").strip()) <= 10 and _not_empty(unid)
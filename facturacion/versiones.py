@@ -0,0 +1,79 @@
+"""Versión de datos por tabla para respuestas condicionales (ETag / 304).
+
+Los triggers de schema.sql suben VERSION_TABLA.VERSION y MODIFICADO en cada
+alta, baja o cambio. Una página que depende de ciertas tablas se identifica
+por sus versiones: si no cambiaron desde que el navegador la pidió, basta
+responder 304 sin consultar ni renderizar. Lo mismo sirve de clave para
+guardar el HTML ya renderizado (CachePaginas).
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+TABLAS = ("CLIENTE", "PRODUCTO", "VENDEDOR", "EMPRESA", "FACTURA", "DETALLE_FACTURA")
+
+
+def leer(db, tablas):
+    """Devuelve ({tabla: version}, última modificación como datetime UTC)."""
+    filas = db.execute("SELECT TABLA, VERSION, MODIFICADO FROM VERSION_TABLA "
+                       "WHERE TABLA IN (SELECT value FROM json_each(?))", (json.dumps(list(tablas)),)).fetchall()
+    versiones = {f[0]: f[1] for f in filas}
+    modificado = max((f[2] for f in filas), default=0.0)
+    return versiones, datetime.fromtimestamp(int(modificado), timezone.utc)
+
+
+def etag(*partes):
+    """ETag fuerte: hash corto de todo lo que determina la respuesta."""
+    h = hashlib.sha256()
+    for p in partes:
+        h.update(repr(p).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()[:32]
+
+
+def invalidar(db, tablas=TABLAS):
+    """Sube la versión a mano (cargas hechas sin triggers, p. ej. generar-datos)."""
+    db.execute("UPDATE VERSION_TABLA SET VERSION = VERSION + 1, "
+               "MODIFICADO = (julianday('now') - 2440587.5) * 86400.0 "
+               "WHERE TABLA IN (SELECT value FROM json_each(?))", (json.dumps(list(tablas)),))
+    db.commit()
+
+
+class CachePaginas:
+    """LRU en memoria de respuestas ya renderizadas, acotada en bytes y por ETag."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._datos = OrderedDict()  # etag -> bytes
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.aciertos = self.fallos = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            datos = self._datos.get(clave)
+            if datos is None:
+                self.fallos += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return datos
+
+    def guardar(self, clave, datos):
+        if len(datos) > self.max_bytes // 4:
+            return  # una página enorme desplazaría a todas las demás
+        with self._lock:
+            if clave in self._datos:
+                return
+            self._datos[clave] = datos
+            self._bytes += len(datos)
+            while self._bytes > self.max_bytes:
+                _, viejo = self._datos.popitem(last=False)
+                self._bytes -= len(viejo)
+
+    def resumen(self):
+        with self._lock:
+            return {"entradas": len(self._datos), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "aciertos": self.aciertos, "fallos": self.fallos}